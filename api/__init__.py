@@ -1,17 +1,33 @@
+import time
+_imports_started = time.perf_counter()
+
 from flask import Flask, abort
 from flask_restx import Api
 from .auth.views import auth_namespace
 from .orders.views import order_namespace
 from .config.config import config_dict
 from .utils import db
-from .models.orders import Order
-from .models.users import User
-from .models.blacklist import TokenBlocklist
-from flask_migrate import Migrate
+from .utils.database import configure_engines
+from .utils.blocklist import RevocationCache
+from .utils.hashing import PasswordHasher, HashingPoolSaturated
+from .utils.cache import ResponseCache
+from .utils.events import EventBus, EventStreamsSaturated
+from .utils.idempotency import idempotency_store_from_config
+from .utils.write_behind import OrderWriteBehind
+from .utils.metrics import init_metrics
+from .utils.ratelimit import init_rate_limiting
+from .utils.compression import init_compression, init_spec_revalidation
+from .utils.replicas import init_read_replicas, replica_keys
+from .utils.sharding import init_sharding, shard_keys
+from .utils.startup import StartupProfile
+from .commands import register_commands
 from flask_jwt_extended import JWTManager
 from werkzeug.exceptions import NotFound # For error message
 from http import HTTPStatus
 
+# How long importing the package (views, models, extensions) took in this process
+IMPORT_SECONDS = time.perf_counter() - _imports_started
+
 
 
 def create_app(config=config_dict['dev']):
@@ -20,22 +36,69 @@ def create_app(config=config_dict['dev']):
     # to configure our app to use dev/prod/test
     app.config.from_object(config)
 
+    # to log how long each step below takes (STARTUP_PROFILE=True)
+    startup = StartupProfile(app.config['STARTUP_PROFILE'], IMPORT_SECONDS)
+    app.extensions['startup_profile'] = startup
+    startup.mark('config')
+
     # to initialize our database
     db.init_app(app)
+    configure_engines(app)
+
+    # to serve read-only order endpoints from read replicas
+    if replica_keys(app.config):
+        init_read_replicas(app)
+
+    # to spread orders over several databases by customer
+    if shard_keys(app.config):
+        init_sharding(app)
+    startup.mark('database')
+
+    # to record latency and SQL counts per route
+    if app.config['METRICS_ENABLED']:
+        init_metrics(app)
+
+    # to stop one client from taking every worker
+    if app.config['RATELIMIT_ENABLED']:
+        init_rate_limiting(app)
+
+    # to send large JSON/CSV bodies compressed
+    if app.config['COMPRESSION_ENABLED']:
+        init_compression(app)
+
+    # to hash passwords off the request thread, with a per-worker limit
+    app.extensions['password_hasher'] = PasswordHasher.from_config(app.config)
+
+    # to cache order reads until an order changes
+    app.extensions['response_cache'] = ResponseCache.from_config(app.config)
+
+    # to push order status changes to clients instead of having them poll
+    app.extensions['event_bus'] = EventBus.from_config(app.config)
+
+    # to answer retried order creation with the first response
+    app.extensions['idempotency_store'] = idempotency_store_from_config(app.config)
+
+    # to accept orders faster than the database commits them (flushes what a crash left, too)
+    if app.config['ORDER_WRITE_BEHIND']:
+        order_queue = OrderWriteBehind.from_config(app.config)
+        app.extensions['order_queue'] = order_queue
+
+        if app.config['ORDER_QUEUE_WORKER']:
+            order_queue.start(app)
+    startup.mark('extensions')
 
     # to manage our JWT
     jwt = JWTManager(app)
 
+    # revoked tokens are checked in memory/Redis instead of the database
+    revocation_cache = RevocationCache.from_config(app.config)
+    app.extensions['revocation_cache'] = revocation_cache
+
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
         token_jti = jwt_payload['jti']
 
-        check = TokenBlocklist.query.filter_by(jti=token_jti).first()
-
-        if check:
-            return True
-        else:
-            return False
+        return revocation_cache.is_revoked(token_jti, jwt_payload['type'])
 
 
     @jwt.revoked_token_loader
@@ -44,8 +107,16 @@ def create_app(config=config_dict['dev']):
     
 
 
-    # to allow easy update of database
-    migrate = Migrate(app, db)
+    startup.mark('jwt')
+
+    # to allow easy update of database (imports alembic, web workers can skip it)
+    if app.config['MIGRATIONS_ENABLED']:
+        from flask_migrate import Migrate
+        migrate = Migrate(app, db)
+
+    # flask CLI maintenance commands
+    register_commands(app)
+    startup.mark('cli')
 
     
     # Create field to input JWT Required(Bearer Token)
@@ -59,16 +130,23 @@ def create_app(config=config_dict['dev']):
     }
 
     # Usually api=Api(app); other details are Swagger UI documentation
-    api = Api(app,
-              title= 'Pizza Delivery API',
+    # (SWAGGER_DOCS_ENABLED=False drops the Swagger UI and swagger.json)
+    api = Api(title= 'Pizza Delivery API',
               description= 'A Simple Pizza Delivery REST Api',
               authorizations=authorizations,
-              security='Bearer Auth'
+              security='Bearer Auth',
+              doc='/' if app.config['SWAGGER_DOCS_ENABLED'] else False
     )
+    api.init_app(app, add_specs=app.config['SWAGGER_DOCS_ENABLED'])
+
+    # swagger.json gets an ETag/Last-Modified, clients revalidate instead of downloading it again
+    if app.config['SWAGGER_DOCS_ENABLED']:
+        init_spec_revalidation(app)
 
     # Register namespaces
     api.add_namespace(order_namespace, path='/orders')
     api.add_namespace(auth_namespace, path='/auth')
+    startup.mark('routes')
 
 
     # To handle errors
@@ -76,16 +154,40 @@ def create_app(config=config_dict['dev']):
     def not_found(error):
         return {"error":"URL Not Found"}, 404
 
+    @api.errorhandler(HashingPoolSaturated)
+    def hashing_pool_saturated(error):
+        return {"error":"Server busy, try again shortly"}, 503, {"Retry-After": str(error.retry_after)}
+
+    @api.errorhandler(EventStreamsSaturated)
+    def event_streams_saturated(error):
+        return {"error":"Too many open event streams, try again shortly"}, 503, {"Retry-After": str(error.retry_after)}
+
     # to allow us connect to the database to create and do migration in the shell
-    @app.shell_context_processor
-    def make_shell_context():
-        return {
-            'db': db,
-            'User': User,
-            'Order': Order
-        }
+    if app.config['SHELL_CONTEXT_ENABLED']:
+        @app.shell_context_processor
+        def make_shell_context():
+            from .models.orders import Order
+            from .models.users import User
+
+            return {
+                'db': db,
+                'User': User,
+                'Order': Order
+            }
 
          # do flask shell after creating this in the terminal
          # do db.create_all()
 
-    return app
\ No newline at end of file
+    startup.report(app.logger)
+
+    return app
+
+
+
+# Function to create the app for ASGI servers (asgi.py), requests run in a thread pool (needs a2wsgi)
+def create_asgi_app(config=config_dict['dev']):
+    from a2wsgi import WSGIMiddleware
+
+    app = create_app(config)
+
+    return WSGIMiddleware(app, workers=app.config['ASGI_THREADS'])
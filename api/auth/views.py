@@ -2,12 +2,14 @@ from flask import request
 from flask_restx import Namespace, Resource, fields
 from ..models.users import User
 from ..models.blacklist import TokenBlocklist
-from werkzeug.security import check_password_hash, generate_password_hash
 from http import HTTPStatus  # for server response
 from ..utils import db
+from ..utils.blocklist import get_revocation_cache
+from ..utils.identity import user_claims
+from ..utils.hashing import get_password_hasher
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
-import redis # for logout
 from flask import jsonify
+from datetime import datetime
 
 # Resource allows to do something like methodview
 
@@ -67,7 +69,7 @@ class SignUp(Resource):
 
         new_user = User(
             username=data.get('username'), email=data.get('email'),
-            password_hash=generate_password_hash(data.get('password'))
+            password_hash=get_password_hasher().hash(data.get('password'))
         )
 
         # save is a function to add user to db created in user model 
@@ -98,10 +100,20 @@ class Login(Resource):
 
         user = User.query.filter_by(email=email).first()
 
+        hasher = get_password_hasher()
 
-        if (user is not None) and check_password_hash(user.password_hash, password):
-            access_token = create_access_token(identity=user.username)
-            refresh_token = create_refresh_token(identity=user.username)
+        if (user is not None) and hasher.verify(user.password_hash, password):
+
+            # upgrade hashes made with older settings while we have the password
+            if hasher.needs_rehash(user.password_hash):
+                user.password_hash = hasher.hash(password)
+                db.session.commit()
+
+            # user id and staff flag ride along so order endpoints need no user lookup
+            claims = user_claims(user)
+
+            access_token = create_access_token(identity=user.username, additional_claims=claims)
+            refresh_token = create_refresh_token(identity=user.username, additional_claims=claims)
 
             response = {
                 'access_token': access_token,
@@ -119,8 +131,11 @@ class Refresh(Resource):
     @jwt_required(refresh=True)
     def post(self):
         username = get_jwt_identity()
+        token = get_jwt()
+
+        claims = {key: token[key] for key in ('user_id', 'is_staff') if key in token}
 
-        access_token = create_access_token(identity=username)
+        access_token = create_access_token(identity=username, additional_claims=claims)
 
         return {'access_token': access_token}, HTTPStatus.OK
 
@@ -135,8 +150,12 @@ class Logout(Resource):
         token = get_jwt()
         jti = token["jti"]
         ttype = token["type"]
-        db.session.add(TokenBlocklist(jti=jti, type=ttype))
+        expires_at = datetime.utcfromtimestamp(token["exp"])
+        db.session.add(TokenBlocklist(jti=jti, type=ttype, expires_at=expires_at))
         db.session.commit()
 
+        # write through so the token is rejected without a database lookup
+        get_revocation_cache().revoke(jti, token["exp"], ttype)
+
         return jsonify(msg=f"{ttype.capitalize()} token successfully revoked")
  
\ No newline at end of file
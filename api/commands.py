@@ -0,0 +1,176 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .utils import db
+from .models.orders import Order
+from .models.reports import OrderSummary, REPORT_DIMENSIONS, merge_reports
+from .models.blacklist import TokenBlocklist
+from .models.idempotency import IdempotencyKey
+from .utils.cache import get_response_cache
+from .utils.sharding import ShardMoveError, create_shard_tables, each_shard, get_shard_router
+from .utils.write_behind import OrderWriteBehind
+
+
+reports_cli = AppGroup('reports', help='Manage materialized order reports.')
+
+blocklist_cli = AppGroup('blocklist', help='Manage revoked JWTs.')
+
+idempotency_cli = AppGroup('idempotency', help='Manage stored Idempotency-Key responses.')
+
+order_queue_cli = AppGroup('order-queue', help='Manage orders accepted in write-behind mode.')
+
+shards_cli = AppGroup('shards', help='Manage the order shards (SHARD_URLS).')
+
+
+
+@reports_cli.command('rebuild')
+def rebuild_reports():
+    """Recompute order_summaries from the orders table (of every shard)."""
+    OrderSummary.query.delete()
+
+    for dimension in REPORT_DIMENSIONS:
+        db.session.bulk_insert_mappings(OrderSummary, [
+            {'dimension': dimension, 'bucket': row['bucket'], 'order_count': row['orders'], 'quantity': row['quantity']}
+            for row in merge_reports([Order.report(dimension) for _ in each_shard()])
+        ])
+
+    db.session.commit()
+
+    get_response_cache().invalidate('orders')
+
+    click.echo(f"Rebuilt {OrderSummary.query.count()} report buckets")
+
+
+
+# Run from cron, e.g. hourly: flask blocklist compact
+@blocklist_cli.command('compact')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction.')
+def compact_blocklist(batch_size):
+    """Delete blocklist rows of tokens that have expired."""
+    deleted = TokenBlocklist.compact(batch_size=batch_size)
+
+    click.echo(f"Deleted {deleted} expired blocklist entries")
+
+
+
+# Run from cron, e.g. hourly: flask idempotency compact (database backend only)
+@idempotency_cli.command('compact')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction.')
+def compact_idempotency_keys(batch_size):
+    """Delete expired idempotency keys."""
+    deleted = IdempotencyKey.compact(batch_size=batch_size)
+
+    click.echo(f"Deleted {deleted} expired idempotency keys")
+
+
+
+# e.g. before a deploy, or when the web workers run with ORDER_QUEUE_WORKER off
+@order_queue_cli.command('drain')
+def drain_order_queue():
+    """Write every queued order to the database now."""
+    queue = OrderWriteBehind.from_config(current_app.config)
+
+    try:
+        flushed = queue.drain()
+        left = queue.journal.pending_count()
+        failed = queue.journal.failed_count()
+    finally:
+        queue.journal.close()
+
+    # entries leased by a running worker are left to it
+    click.echo(f"Flushed {flushed} queued orders, {left} left, {failed} failed")
+
+
+
+# once whatever made them fail is fixed (see GET /orders/queued/<ref> for the error)
+@order_queue_cli.command('retry-failed')
+def retry_failed_orders():
+    """Put dead-lettered queued orders back in the queue."""
+    queue = OrderWriteBehind.from_config(current_app.config)
+
+    try:
+        retried = queue.journal.retry_failed()
+    finally:
+        queue.journal.close()
+
+    click.echo(f"Requeued {retried} failed orders")
+
+
+
+# Function to get the shard router, or stop the command when orders are not sharded
+def require_shard_router():
+    router = get_shard_router()
+
+    if router is None:
+        raise click.ClickException("Orders are not sharded, set SHARD_URLS")
+
+    return router
+
+
+
+# Run once per new shard database, before it takes orders
+@shards_cli.command('create-tables')
+def create_tables_on_shards():
+    """Create the orders tables on every shard that lacks them."""
+    router = require_shard_router()
+
+    for shard in router.keys:
+        create_shard_tables(db.engines[shard])
+
+    click.echo(f"Order tables ready on {len(router.keys)} shards")
+
+
+
+# Run after adding a shard, or when one shard has grown hot (e.g. from cron)
+@shards_cli.command('rebalance')
+@click.option('--tolerance', default=0.1, show_default=True, help='Allowed gap between shards, as a share of the average.')
+@click.option('--dry-run', is_flag=True, help='Only print the planned moves.')
+def rebalance_shards(tolerance, dry_run):
+    """Move customers between shards until their order counts are even."""
+    router = require_shard_router()
+    moves = router.plan_rebalance(tolerance)
+
+    try:
+        for customer, source, target, count in moves:
+            click.echo(f"Customer {customer}: {count} orders {source} -> {target}")
+
+            if not dry_run:
+                router.move_customer(customer, target)
+    except ShardMoveError as error:
+        raise click.ClickException(str(error))
+    finally:
+        if moves and not dry_run:
+            get_response_cache().invalidate('orders')
+
+    click.echo(f"{'Planned' if dry_run else 'Made'} {len(moves)} moves")
+
+
+
+@shards_cli.command('move')
+@click.argument('customer', type=int)
+@click.argument('shard')
+def move_customer_to_shard(customer, shard):
+    """Move all orders of CUSTOMER to SHARD."""
+    router = require_shard_router()
+
+    if shard not in router.keys:
+        raise click.BadParameter(f"choose from {', '.join(router.keys)}", param_hint='SHARD')
+
+    try:
+        moved = router.move_customer(customer, shard)
+    except ShardMoveError as error:
+        raise click.ClickException(str(error))
+    finally:
+        get_response_cache().invalidate('orders')
+
+    click.echo(f"Moved {moved} orders of customer {customer} to {shard}")
+
+
+
+# Function to add the CLI command groups to the app (`flask reports ...`)
+def register_commands(app):
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(blocklist_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(order_queue_cli)
+    app.cli.add_command(shards_cli)
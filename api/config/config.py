@@ -6,32 +6,171 @@ from datetime import timedelta
 base_dir = os.path.dirname(os.path.realpath(__file__))
 
 
+
+# Function to read the database URL, accepting the postgres:// scheme some hosts hand out
+def database_url(default):
+    return database_url_scheme(config('DATABASE_URL', default))
+
+
+
+def database_url_scheme(url):
+    return re.sub(r'^postgres://', 'postgresql://', url)
+
+
+
+# Function to build SQLALCHEMY_ENGINE_OPTIONS for a database URL
+def engine_options(url):
+    if url.startswith('sqlite'):
+        # Seconds a connection waits on a locked database before raising
+        return {'connect_args': {'timeout': config('SQLITE_TIMEOUT', 15, cast=int)}}
+
+    options = {
+        'pool_size': config('DB_POOL_SIZE', 5, cast=int),
+        'max_overflow': config('DB_MAX_OVERFLOW', 10, cast=int),
+        'pool_recycle': config('DB_POOL_RECYCLE', 1800, cast=int),
+        'pool_pre_ping': config('DB_POOL_PRE_PING', True, cast=bool),
+    }
+
+    statement_timeout = config('DB_STATEMENT_TIMEOUT_MS', 30000, cast=int)
+
+    if url.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+
+    return options
+
+
+
+# Function to build SQLALCHEMY_BINDS entries (<prefix>_0, <prefix>_1, ...) from comma separated URLs
+def database_binds(prefix, urls, options=None):
+    urls = [database_url_scheme(url.strip()) for url in urls.split(',') if url.strip()]
+
+    return {f'{prefix}_{index}': dict(options(url) if options else {}, url=url) for index, url in enumerate(urls)}
+
+
+
 class Config:
     SECRET_KEY = config('SECRET_KEY', 'secret')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     JWT_SECRET_KEY = config('JWT_SECRET_KEY')
+    REDIS_URL = config('REDIS_URL', None)
+    REVOCATION_CACHE_SIZE = config('REVOCATION_CACHE_SIZE', 10000, cast=int)
+    REVOCATION_CACHE_SYNC_SECONDS = config('REVOCATION_CACHE_SYNC_SECONDS', 1, cast=int) # without Redis, a logout reaches other workers this late
+    PASSWORD_HASH_METHOD = config('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', 260000, cast=int)
+    PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', 2, cast=int)
+    PASSWORD_HASH_MAX_PENDING = config('PASSWORD_HASH_MAX_PENDING', 4, cast=int) # per worker, 503 beyond this, 0 for no cap
+    PASSWORD_HASH_RETRY_AFTER = config('PASSWORD_HASH_RETRY_AFTER', 1, cast=int)
+    # 'memory' is per process; use 'redis' when running more than one worker
+    RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', 'redis' if REDIS_URL else 'memory')
+    RESPONSE_CACHE_SIZE = config('RESPONSE_CACHE_SIZE', 1024, cast=int)
+    RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', 300, cast=int)
+    METRICS_ENABLED = config('METRICS_ENABLED', True, cast=bool) # Prometheus format on /metrics
+    METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', False, cast=bool)
+    METRICS_TOKEN = config('METRICS_TOKEN', None) # when set, /metrics needs 'Authorization: Bearer <token>'
+    # keep order_summaries up to date on every write (run `flask reports rebuild` after turning on)
+    REPORTS_MATERIALIZED = config('REPORTS_MATERIALIZED', False, cast=bool)
+    # order status events for /orders/events; 'memory' only reaches streams on the same worker
+    EVENTS_BACKEND = config('EVENTS_BACKEND', 'redis' if REDIS_URL else 'memory')
+    EVENTS_BUFFER_SIZE = config('EVENTS_BUFFER_SIZE', 1000, cast=int) # kept for Last-Event-ID resumes
+    EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', 15, cast=int)
+    EVENTS_STREAM_SECONDS = config('EVENTS_STREAM_SECONDS', 300, cast=int) # clients reconnect after this
+    # each open stream holds a worker thread (WEB_THREADS per worker), 503 beyond this; 0 for no cap (gevent)
+    EVENTS_MAX_STREAMS = config('EVENTS_MAX_STREAMS', 5, cast=int)
+    EVENTS_RETRY_AFTER = config('EVENTS_RETRY_AFTER', 5, cast=int)
+    # replayed responses for retried POSTs carrying an Idempotency-Key header
+    IDEMPOTENCY_BACKEND = config('IDEMPOTENCY_BACKEND', 'redis' if REDIS_URL else 'database')
+    IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', 86400, cast=int)
+    IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', 60, cast=int) # a crashed request frees its key after this
+    # accept single orders into a local journal (202) and write them to the database in batches;
+    # every worker of a host shares the journal file, don't fork after create_app (gunicorn --preload)
+    ORDER_WRITE_BEHIND = config('ORDER_WRITE_BEHIND', False, cast=bool)
+    ORDER_QUEUE_PATH = config('ORDER_QUEUE_PATH', os.path.join(base_dir, 'order_queue.sqlite3'))
+    ORDER_QUEUE_WORKER = config('ORDER_QUEUE_WORKER', True, cast=bool) # background flusher thread
+    ORDER_QUEUE_BATCH_SIZE = config('ORDER_QUEUE_BATCH_SIZE', 500, cast=int)
+    ORDER_QUEUE_FLUSH_SECONDS = config('ORDER_QUEUE_FLUSH_SECONDS', 0.2, cast=float)
+    ORDER_QUEUE_RETENTION_SECONDS = config('ORDER_QUEUE_RETENTION_SECONDS', 86400, cast=int)
+    ORDER_QUEUE_MAX_ATTEMPTS = config('ORDER_QUEUE_MAX_ATTEMPTS', 5, cast=int) # an entry failing alone this often is dead-lettered
+    # read replicas (comma separated URLs) for the read-only order endpoints, become SQLALCHEMY_BINDS replica_0, ...;
+    # order shards (SHARD_URLS) become shard_0, ... and hold the orders instead of the primary
+    SQLALCHEMY_BINDS = dict(
+        database_binds('replica', config('DATABASE_REPLICA_URLS', '')), **database_binds('shard', config('SHARD_URLS', ''))
+    )
+    # commit an order on its shard and in the directory on the primary with two-phase commit (PostgreSQL with
+    # max_prepared_transactions > 0); without it a crash between the two leaves an order the directory does not list
+    SHARD_TWO_PHASE = config('SHARD_TWO_PHASE', False, cast=bool)
+    REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', 5, cast=int) # a user reads from the primary this long after writing
+    REPLICA_RETRY_SECONDS = config('REPLICA_RETRY_SECONDS', 30, cast=int) # a failed replica is skipped this long
+    REPLICA_CACHE_TTL = config('REPLICA_CACHE_TTL', 5, cast=int) # cached responses read from a replica may lag, keep them briefly
+    # 'memory' is per process; use 'redis' when running more than one worker
+    REPLICA_STICKY_BACKEND = config('REPLICA_STICKY_BACKEND', 'redis' if REDIS_URL else 'memory')
+    REPLICA_STICKY_SIZE = config('REPLICA_STICKY_SIZE', 10000, cast=int)
+    # gzip, or br when the brotli package is installed, for responses the client accepts compressed
+    COMPRESSION_ENABLED = config('COMPRESSION_ENABLED', True, cast=bool)
+    COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', 1024, cast=int) # bytes, smaller bodies are sent as they are
+    COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', 6, cast=int)
+    COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', 4, cast=int)
+    COMPRESSION_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+    # threads per process running requests under an ASGI server (asgi.py); a request holds a database
+    # connection, so by default as many as the pool hands out
+    ASGI_THREADS = config('ASGI_THREADS', config('DB_POOL_SIZE', 5, cast=int) + config('DB_MAX_OVERFLOW', 10, cast=int), cast=int)
+    RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', True, cast=bool)
+    # web workers can turn these off to start faster; `flask db` needs MIGRATIONS_ENABLED
+    MIGRATIONS_ENABLED = config('MIGRATIONS_ENABLED', True, cast=bool)
+    SWAGGER_DOCS_ENABLED = config('SWAGGER_DOCS_ENABLED', True, cast=bool)
+    SHELL_CONTEXT_ENABLED = config('SHELL_CONTEXT_ENABLED', True, cast=bool)
+    STARTUP_PROFILE = config('STARTUP_PROFILE', False, cast=bool) # log create_app timings
+    # 'memory' is per process; use 'redis' when running more than one worker
+    RATELIMIT_BACKEND = config('RATELIMIT_BACKEND', 'redis' if REDIS_URL else 'memory')
+    # proxies in front of the app whose X-Forwarded-For/-Proto are trusted; 0 when clients connect directly
+    # (otherwise every client behind a load balancer shares its IP's rate limit)
+    TRUSTED_PROXY_HOPS = config('TRUSTED_PROXY_HOPS', 0, cast=int)
+    # token bucket per namespace, applied to each client IP and each user
+    RATELIMITS = {
+        'auth': config('RATELIMIT_AUTH', '10/minute'),
+        'orders': config('RATELIMIT_ORDERS', '300/minute')
+    }
 
 
 
 class DevConfig(Config):
     DEBUG = config('DEBUG', cast=bool)
     SQLALCHEMY_ECHO = True
+    METRICS_SERVER_TIMING = True
     SQLALCHEMY_TRACK_MODIFICATION = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(base_dir, 'db.sqlite3')
 
 class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_ECHO = True
+    RATELIMIT_ENABLED = False
+    MIGRATIONS_ENABLED = False
+    SQLALCHEMY_BINDS = {}
     SQLALCHEMY_TRACK_MODIFICATION = False
     SQLALCHEMY_DATABASE_URI = 'sqlite://' #Memory Database
 
 
 # For deployment
 class ProdConfig(Config):
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(base_dir, 'db.sqlite3') 
+    SQLALCHEMY_DATABASE_URI = database_url('sqlite:///' + os.path.join(base_dir, 'db.sqlite3'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = dict(
+        database_binds('replica', config('DATABASE_REPLICA_URLS', ''), engine_options),
+        **database_binds('shard', config('SHARD_URLS', ''), engine_options)
+    )
     SQLALCHEMY_TRACK_MODIFICATION = False
     DEBUG = config('DEBUG', False, cast=bool)
+    # deployed behind a load balancer or reverse proxy; set 0 if clients reach gunicorn directly
+    TRUSTED_PROXY_HOPS = config('TRUSTED_PROXY_HOPS', 1, cast=int)
+    # per-route traffic and SQL timings are not for everyone: opt in, ideally with METRICS_TOKEN
+    METRICS_ENABLED = config('METRICS_ENABLED', False, cast=bool)
+
+    # Only used when falling back to SQLite: lets readers run during writes
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': config('SQLITE_TIMEOUT', 15, cast=int) * 1000,
+        'synchronous': 'NORMAL'
+    }
     
 
 
@@ -1,8 +1,18 @@
 from ..utils import db
+from datetime import datetime
+from .expiring import ExpiringMixin
 
 
-class TokenBlocklist(db.Model):
+class TokenBlocklist(ExpiringMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, index=True)
     type = db.Column(db.String(16), nullable=False)
-    
\ No newline at end of file
+    # when the revoked token would have expired anyway, the row is useless after this
+    expires_at = db.Column(db.DateTime(), nullable=False, index=True)
+
+
+
+    # Function to get the rows of tokens that have not expired yet
+    @classmethod
+    def active(cls, now=None):
+        return cls.query.filter(cls.expires_at > (now or datetime.utcnow()))
@@ -0,0 +1,23 @@
+from ..utils import db
+from datetime import datetime
+
+
+# Mixin for models whose rows are useless after their expires_at column (needs id and expires_at)
+class ExpiringMixin:
+
+    # Function to delete expired rows in batches, returns how many were deleted
+    @classmethod
+    def compact(cls, batch_size=1000, now=None):
+        now = now or datetime.utcnow()
+        deleted = 0
+
+        while True:
+            ids = [row_id for row_id, in db.session.query(cls.id).filter(cls.expires_at <= now).limit(batch_size)]
+
+            if not ids:
+                return deleted
+
+            cls.query.filter(cls.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+            deleted += len(ids)
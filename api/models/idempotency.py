@@ -0,0 +1,27 @@
+from ..utils import db
+from datetime import datetime
+from .expiring import ExpiringMixin
+
+
+class IdempotencyKey(ExpiringMixin, db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # the row commits with the request's changes, a concurrent request with the same key fails on this index
+        db.Index('ix_idempotency_keys_owner_key', 'owner', 'key', unique=True),
+    )
+    id = db.Column(db.Integer(), primary_key=True)
+    owner = db.Column(db.String(255), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # empty until the first request's response is stored
+    status_code = db.Column(db.Integer(), nullable=True)
+    body = db.Column(db.Text(), nullable=True)
+    headers = db.Column(db.Text(), nullable=True)
+    created_at = db.Column(db.DateTime(), default=datetime.utcnow, nullable=False)
+    # the key can be used again after this
+    expires_at = db.Column(db.DateTime(), nullable=False, index=True)
+
+
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.owner} {self.key}>"
@@ -1,4 +1,8 @@
 from ..utils import db
+from ..utils.cache import get_response_cache
+from ..utils.events import get_event_bus
+from .reports import OrderSummary, bucket_name
+from sqlalchemy import func
 from enum import Enum
 from datetime import datetime
 
@@ -14,15 +18,35 @@ class OrderStatus(Enum):
     IN_TRANSIT = 'in_transit'
     DELIVERED = 'delivered'
 
+    # The status an order has to be in to move to this one, None for the starting status
+    @property
+    def previous(self):
+        return {target: source for source, target in ORDER_STATUS_TRANSITIONS.items()}.get(self)
+
+# Allowed status changes, an order only moves one step forward at a time
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: OrderStatus.IN_TRANSIT,
+    OrderStatus.IN_TRANSIT: OrderStatus.DELIVERED
+}
+
+
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # For a customer's orders within a date range
+        db.Index('ix_orders_customer_date_created', 'customer', 'date_created'),
+    )
     id = db.Column(db.Integer(), primary_key=True)
     size = db.Column(db.Enum(Sizes), default=Sizes.SMALL)
-    order_status = db.Column(db.Enum(OrderStatus), default=OrderStatus.PENDING)
+    order_status = db.Column(db.Enum(OrderStatus), default=OrderStatus.PENDING, index=True)
     flavour = db.Column(db.String(), nullable=False)
     quantity = db.Column(db.Integer(), nullable=False)
     date_created = db.Column(db.DateTime(), default=datetime.utcnow)
-    customer = db.Column(db.Integer(), db.ForeignKey('users.id'))
+    customer = db.Column(db.Integer(), db.ForeignKey('users.id'), index=True)
+    # Bumped by every write, so concurrent writers can detect each other
+    version = db.Column(db.Integer(), nullable=False, default=1, server_default='1')
+    # Journal reference of orders accepted in write-behind mode, makes replaying them safe
+    queue_ref = db.Column(db.String(32), nullable=True, unique=True, index=True)
 
     
 
@@ -31,12 +55,136 @@ class Order(db.Model):
 
 
 
+    # Function to get the values reports group this order by
+    def summary_row(self):
+        return {
+            'order_status': self.order_status,
+            'size': self.size,
+            'flavour': self.flavour,
+            'date_created': self.date_created,
+            'customer': self.customer,
+            'quantity': self.quantity
+        }
+
+
+
     # Function to create order
     def save(self):
         db.session.add(self)
+        db.session.flush()
+
+        OrderSummary.record_created([self.summary_row()])
+
         db.session.commit()
 
+        get_response_cache().invalidate_order(self.id, self.customer)
+
+        get_event_bus().publish_order(self.id, self.customer, self.order_status)
+
+    # Function to update an order only if nobody changed it since `version` was read,
+    # in a single UPDATE ... WHERE id = ? AND version = ?; returns False on conflict
+    @classmethod
+    def update_if_version(cls, id, version, **values):
+        table = cls.__table__
+
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == id, table.c.version == version)
+            .values(version=table.c.version + 1, **values)
+        )
+
+        return result.rowcount == 1
+
+    # Function to move an order to `new_status` in one UPDATE whose WHERE clause checks it is
+    # in the previous status (and, if given, at one of `versions`); returns False otherwise
+    @classmethod
+    def change_status(cls, id, new_status, versions=None):
+        if new_status.previous is None:
+            return False
+
+        table = cls.__table__
+
+        query = table.update().where(table.c.id == id, table.c.order_status == new_status.previous)
+
+        if versions is not None:
+            query = query.where(table.c.version.in_(versions))
+
+        result = db.session.execute(query.values(order_status=new_status, version=table.c.version + 1))
+
+        return result.rowcount == 1
+
     # Function to get by id or return 404 error
     @classmethod
     def get_by_id(cls, id):
-        return cls.query.get_or_404(id)
\ No newline at end of file
+        return cls.query.get_or_404(id)
+
+
+
+    # Function to get the SQL expression of a report dimension
+    @classmethod
+    def report_bucket(cls, dimension):
+        if dimension in ('day', 'hour'):
+            if db.session.get_bind().dialect.name == 'postgresql':
+                pattern = 'YYYY-MM-DD' if dimension == 'day' else 'YYYY-MM-DD"T"HH24:00'
+                return func.to_char(cls.date_created, pattern)
+
+            return func.strftime('%Y-%m-%d' if dimension == 'day' else '%Y-%m-%dT%H:00', cls.date_created)
+
+        return getattr(cls, dimension)
+
+
+
+    # Function to count orders and sum quantities per bucket with GROUP BY, largest buckets first
+    @classmethod
+    def report(cls, dimension, created_from=None, created_to=None):
+        bucket = cls.report_bucket(dimension)
+        orders = func.count(cls.id)
+
+        query = db.session.query(bucket, orders, func.coalesce(func.sum(cls.quantity), 0))
+
+        if created_from:
+            query = query.filter(cls.date_created >= created_from)
+
+        if created_to:
+            query = query.filter(cls.date_created < created_to)
+
+        rows = query.filter(bucket.isnot(None)).group_by(bucket).order_by(orders.desc(), bucket)
+
+        return [
+            {'bucket': bucket_name(value), 'orders': count, 'quantity': quantity}
+            for value, count, quantity in rows
+        ]
+
+
+
+class OrderStatusHistory(db.Model):
+    __tablename__ = 'order_status_history'
+    id = db.Column(db.Integer(), primary_key=True)
+    order_id = db.Column(db.Integer(), db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True)
+    from_status = db.Column(db.Enum(OrderStatus), nullable=False)
+    to_status = db.Column(db.Enum(OrderStatus), nullable=False)
+    changed_by = db.Column(db.Integer(), db.ForeignKey('users.id'), nullable=True)
+    changed_at = db.Column(db.DateTime(), default=datetime.utcnow, nullable=False)
+
+
+
+    def __repr__(self):
+        return f"<OrderStatusHistory {self.order_id} {self.from_status.name} -> {self.to_status.name}>"
+
+
+
+    # Function to record (order_id, from_status, to_status) changes in the current transaction
+    @classmethod
+    def record(cls, changes, changed_by=None):
+        if not changes:
+            return
+
+        changed_at = datetime.utcnow()
+
+        db.session.execute(cls.__table__.insert(), [
+            {
+                'order_id': order_id, 'from_status': from_status, 'to_status': to_status,
+                'changed_by': changed_by, 'changed_at': changed_at
+            }
+            for order_id, from_status, to_status in changes
+        ])
@@ -0,0 +1,151 @@
+from enum import Enum
+from flask import current_app
+from ..utils import db
+
+
+# Dimensions orders can be grouped by in reports
+REPORT_DIMENSIONS = ['order_status', 'size', 'flavour', 'day', 'hour', 'customer']
+
+
+
+def bucket_name(value):
+    if isinstance(value, Enum):
+        return value.name
+
+    return None if value is None else str(value)
+
+
+
+# Function to add up reports of one dimension (one per shard), largest buckets first
+def merge_reports(reports):
+    if len(reports) == 1:
+        return reports[0]
+
+    totals = {}
+
+    for report in reports:
+        for row in report:
+            total = totals.setdefault(row['bucket'], {'bucket': row['bucket'], 'orders': 0, 'quantity': 0})
+            total['orders'] += row['orders']
+            total['quantity'] += row['quantity']
+
+    return sorted(totals.values(), key=lambda row: (-row['orders'], row['bucket']))
+
+
+
+# Function to get the bucket an order falls in for every dimension
+def order_buckets(row):
+    date_created = row['date_created']
+
+    return {
+        'order_status': bucket_name(row['order_status']),
+        'size': bucket_name(row['size']),
+        'flavour': bucket_name(row['flavour']),
+        'day': date_created.strftime('%Y-%m-%d') if date_created else None,
+        'hour': date_created.strftime('%Y-%m-%dT%H:00') if date_created else None,
+        'customer': bucket_name(row['customer'])
+    }
+
+
+
+class OrderSummary(db.Model):
+    """
+    Running order counts and quantities per report bucket.
+
+    Only maintained when REPORTS_MATERIALIZED is on; each write that touches
+    orders adds its deltas here in the same transaction.
+
+    """
+    __tablename__ = 'order_summaries'
+    dimension = db.Column(db.String(16), primary_key=True)
+    # flavours have no length limit, and every flavour is a bucket
+    bucket = db.Column(db.Text(), primary_key=True)
+    order_count = db.Column(db.Integer(), nullable=False, default=0)
+    quantity = db.Column(db.Integer(), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<OrderSummary {self.dimension}={self.bucket}>"
+
+
+    @staticmethod
+    def enabled():
+        return current_app.config['REPORTS_MATERIALIZED']
+
+
+    # Function to add {(dimension, bucket): (orders, quantity)} deltas with one upsert
+    @classmethod
+    def apply(cls, deltas):
+        rows = [
+            {'dimension': dimension, 'bucket': bucket, 'order_count': count, 'quantity': quantity}
+            for (dimension, bucket), (count, quantity) in deltas.items()
+            if bucket is not None and (count or quantity)
+        ]
+
+        if not rows:
+            return
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        table = cls.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.bucket],
+            set_={
+                'order_count': table.c.order_count + statement.excluded.order_count,
+                'quantity': table.c.quantity + statement.excluded.quantity
+            }
+        )
+
+        db.session.execute(statement, rows)
+
+
+    # Function to count new orders (dicts with order_status, size, flavour, date_created, customer, quantity)
+    @classmethod
+    def record_created(cls, rows, sign=1):
+        if not cls.enabled():
+            return
+
+        deltas = {}
+
+        for row in rows:
+            for dimension, bucket in order_buckets(row).items():
+                count, quantity = deltas.get((dimension, bucket), (0, 0))
+                deltas[(dimension, bucket)] = (count + sign, quantity + sign * row['quantity'])
+
+        cls.apply(deltas)
+
+
+    @classmethod
+    def record_deleted(cls, rows):
+        cls.record_created(rows, sign=-1)
+
+
+    # Function to move orders between status buckets, changes are (old status, new status, quantity)
+    @classmethod
+    def record_status_changes(cls, changes):
+        if not cls.enabled():
+            return
+
+        deltas = {}
+
+        for old_status, new_status, quantity in changes:
+            for status, sign in ((old_status, -1), (new_status, 1)):
+                key = ('order_status', bucket_name(status))
+                count, total = deltas.get(key, (0, 0))
+                deltas[key] = (count + sign, total + sign * quantity)
+
+        cls.apply(deltas)
+
+
+    # Function to read a materialized report, largest buckets first
+    @classmethod
+    def report(cls, dimension):
+        rows = cls.query.filter_by(dimension=dimension).filter(cls.order_count > 0)
+
+        return [
+            {'bucket': row.bucket, 'orders': row.order_count, 'quantity': row.quantity}
+            for row in rows.order_by(cls.order_count.desc(), cls.bucket)
+        ]
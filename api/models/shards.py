@@ -0,0 +1,23 @@
+from ..utils import db
+
+
+# Which shard holds a customer's orders, written on their first order and by `flask shards move`
+class ShardCustomer(db.Model):
+    __tablename__ = 'shard_customers'
+    customer = db.Column(db.Integer(), primary_key=True, autoincrement=False)
+    shard = db.Column(db.String(32), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ShardCustomer {self.customer} on {self.shard}>"
+
+
+
+# Hands out order IDs (unique across shards) and records the shard of each order
+class ShardOrder(db.Model):
+    __tablename__ = 'shard_orders'
+    id = db.Column(db.Integer(), primary_key=True)
+    shard = db.Column(db.String(32), nullable=False)
+    customer = db.Column(db.Integer(), nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<ShardOrder {self.id} on {self.shard}>"
@@ -8,7 +8,8 @@ class User(db.Model):
     password_hash = db.Column(db.Text(45), nullable=False)
     is_staff = db.Column(db.Boolean(), default=False)
     is_active = db.Column(db.Boolean(), default=False)
-    orders = db.relationship('Order', backref='user', lazy=True)
+    # dynamic: user.orders is a query, so a user's orders are never all loaded at once
+    orders = db.relationship('Order', backref='user', lazy='dynamic')
 
     def __repr__(self):
         return f"<User {self.username}>"
@@ -1,9 +1,25 @@
-from flask_restx import Namespace, Resource, fields
-from ..models.orders import Order
+import csv
+import io
+import json
+import re
+from collections import defaultdict
+from flask import Response, current_app, request, stream_with_context, url_for
+from flask_restx import Namespace, Resource, fields, reqparse, inputs, marshal, abort
+from datetime import datetime
+from ..models.orders import Order, OrderStatus, OrderStatusHistory, Sizes
+from ..models.reports import OrderSummary, REPORT_DIMENSIONS, merge_reports
 from http import HTTPStatus
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models.users import User
+from flask_jwt_extended import jwt_required
 from ..utils import db
+from ..utils.database import insert_many
+from ..utils.pagination import keyset_page, next_page_headers
+from ..utils.identity import current_user_id
+from ..utils.cache import cached_response, get_response_cache, strip_weak
+from ..utils.serializers import EnumName, order_serializer, json_response
+from ..utils.events import get_event_bus
+from ..utils.idempotency import idempotent
+from ..utils.replicas import read_replica
+from ..utils.sharding import each_shard, forget_orders, get_shard_router, new_order_ids, route_customer, route_order, shard_groups
 
 
 # Resource allows to do something like methodview(smorest)
@@ -17,14 +33,15 @@ order_namespace = Namespace('orders', description='name space for orders')
 order_model = order_namespace.model(
     'Order', {
         'id': fields.Integer(),
-        'size': fields.String(
+        'size': EnumName(
             required=True, description='Size of order', enum= ['SMALL', 'MEDIUM', 'LARGE', 'EXTRA_LARGE']
         ),
-        'order_status': fields.String(
+        'order_status': EnumName(
             required=True, description='Status of order', enum= ['PENDING', 'IN_TRANSIT', 'DELIVERED',]
         ),
         'flavour': fields.String(required=True, description='Order flavour'),
-        'quantity': fields.Integer(required=True, description='Quantity of order')
+        'quantity': fields.Integer(required=True, description='Quantity of order'),
+        'version': fields.Integer(readonly=True, description='Bumped on every change, sent back as the ETag')
     }
 )
 
@@ -34,6 +51,18 @@ order_model = order_namespace.model(
 # For sterialization(OrderStatus)
 order_status_model = order_namespace.model(
     'OrderStatus', {
+        'order_status': EnumName(
+            required=True, description='Status of order', enum= ['PENDING', 'IN_TRANSIT', 'DELIVERED',]
+        )
+    }
+)
+
+
+
+# For sterialization(Bulk status update item)
+bulk_status_model = order_namespace.model(
+    'BulkOrderStatus', {
+        'id': fields.Integer(required=True, description='ID of order'),
         'order_status': fields.String(
             required=True, description='Status of order', enum= ['PENDING', 'IN_TRANSIT', 'DELIVERED',]
         )
@@ -42,6 +71,324 @@ order_status_model = order_namespace.model(
 
 
 
+# For sterialization(Per-item result of a bulk request)
+bulk_result_model = order_namespace.model(
+    'BulkResult', {
+        'index': fields.Integer(description='Position of the item in the request'),
+        'id': fields.Integer(description='ID of the order'),
+        'status': fields.Integer(description='HTTP status of this item'),
+        'error': fields.String(description='Why the item was rejected')
+    }
+)
+
+# For sterialization(Order accepted in write-behind mode)
+queued_order_model = order_namespace.model(
+    'QueuedOrder', {
+        'ref': fields.String(description='Provisional reference until the order is stored'),
+        'status': fields.String(description='queued, stored or failed (given up on)', enum=['queued', 'stored', 'failed']),
+        'id': fields.Integer(description='ID of the order once stored'),
+        'attempts': fields.Integer(description='Failed attempts to store the order'),
+        'error': fields.String(description='Why the last attempt failed'),
+        'status_url': fields.String(description='Where to check on the order'),
+        'order_url': fields.String(description='The stored order')
+    }
+)
+
+
+
+# Most items accepted by one bulk request
+MAX_BULK_ITEMS = 1000
+
+# Swagger docs of the header accepted by order creation
+IDEMPOTENCY_KEY_PARAM = {
+    'Idempotency-Key': {'in': 'header', 'description': 'Retries with the same key get the first response back'}
+}
+
+
+
+
+# Query parameters for order listings
+order_list_parser = reqparse.RequestParser()
+order_list_parser.add_argument(
+    'limit', type=inputs.int_range(1, 1000), default=100, location='args', help='Maximum number of orders to return'
+)
+order_list_parser.add_argument(
+    'after', type=int, location='args', help='Cursor: only return orders with an ID greater than this'
+)
+order_list_parser.add_argument(
+    'order_status', choices=[status.name for status in OrderStatus], location='args', help='Filter by status'
+)
+order_list_parser.add_argument(
+    'size', choices=[size.name for size in Sizes], location='args', help='Filter by size'
+)
+order_list_parser.add_argument(
+    'customer', type=int, location='args', help='Filter by customer (user ID)'
+)
+order_list_parser.add_argument(
+    'created_from', type=inputs.datetime_from_iso8601, location='args', help='Only orders created at or after this time'
+)
+order_list_parser.add_argument(
+    'created_to', type=inputs.datetime_from_iso8601, location='args', help='Only orders created before this time'
+)
+order_list_parser.add_argument(
+    'fields', location='args', help='Comma separated order fields to return, e.g. id,order_status'
+)
+
+# Same listing without the customer filter, for routes already scoped to a user
+user_order_list_parser = order_list_parser.copy().remove_argument('customer')
+
+
+
+# Query parameters for the order export
+order_export_parser = reqparse.RequestParser()
+order_export_parser.add_argument(
+    'format', choices=['ndjson', 'csv'], default='ndjson', location='args', help='Export format'
+)
+order_export_parser.add_argument(
+    'since', type=inputs.datetime_from_iso8601, location='args', help='Only orders created at or after this time'
+)
+order_export_parser.add_argument(
+    'after', type=int, location='args', help='Only orders with an ID greater than this (last ID of the previous export)'
+)
+
+# Query parameters for the order status event stream
+order_events_parser = reqparse.RequestParser()
+order_events_parser.add_argument(
+    'last_event_id', location='args', help='Resume after this event (the Last-Event-ID header takes precedence)'
+)
+
+# For sterialization(Report bucket)
+report_model = order_namespace.model(
+    'ReportBucket', {
+        'bucket': fields.String(description='Status, size, flavour, day, hour or customer ID'),
+        'orders': fields.Integer(description='Number of orders in the bucket'),
+        'quantity': fields.Integer(description='Total quantity ordered in the bucket')
+    }
+)
+
+
+
+# Query parameters for order reports
+report_parser = reqparse.RequestParser()
+report_parser.add_argument(
+    'source', choices=['live', 'summary'], location='args',
+    help='live: GROUP BY over orders; summary: materialized totals (default when REPORTS_MATERIALIZED is on)'
+)
+report_parser.add_argument(
+    'created_from', type=inputs.datetime_from_iso8601, location='args', help='Live reports only: orders created at or after this time'
+)
+report_parser.add_argument(
+    'created_to', type=inputs.datetime_from_iso8601, location='args', help='Live reports only: orders created before this time'
+)
+
+
+
+# Columns written by the order export, in order
+EXPORT_COLUMNS = ['id', 'size', 'order_status', 'flavour', 'quantity', 'customer', 'date_created']
+
+# Number of rows fetched from the database and written per chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+
+# Function to turn an exported row into plain values
+def export_values(row):
+    return [
+        row.id,
+        row.size.name if row.size else None,
+        row.order_status.name if row.order_status else None,
+        row.flavour,
+        row.quantity,
+        row.customer,
+        row.date_created.isoformat() if row.date_created else None
+    ]
+
+
+
+# Function to stream rows as newline delimited JSON, one chunk per batch
+def generate_ndjson(rows):
+    chunk = []
+
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_COLUMNS, export_values(row)))))
+
+        if len(chunk) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+
+# Function to stream rows as CSV with a header line, one chunk per batch
+def generate_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+
+    for row in rows:
+        writer.writerow(export_values(row))
+        count += 1
+
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+
+# Function to get the ETag of an order version
+def order_etag(version):
+    return f'"v{version}"'
+
+
+
+# Function to get the order versions named by the If-Match header, None when any version will do
+def if_match_versions():
+    header = request.headers.get('If-Match')
+
+    if not header:
+        return None
+
+    candidates = [candidate.strip() for candidate in header.split(',')]
+
+    if '*' in candidates:
+        return None
+
+    # compressed responses carry the weak form W/"v<n>" of the same version
+    return [int(strip_weak(candidate)[2:-1]) for candidate in candidates if re.fullmatch(r'(W/)?"v\d+"', candidate)]
+
+
+
+# Function to abort with 412 unless the If-Match header (if any) names the order's current version
+def check_if_match(order):
+    versions = if_match_versions()
+
+    if versions is not None and order.version not in versions:
+        abort(HTTPStatus.PRECONDITION_FAILED, "Order was changed by another request, fetch it again")
+
+
+
+# Function to abort after a conditional update matched no row: gone (404) or changed meanwhile (412)
+def abort_conflict(order_id):
+    db.session.rollback()
+
+    if Order.query.get(order_id) is None:
+        abort(HTTPStatus.NOT_FOUND, "Order not found")
+
+    abort(HTTPStatus.PRECONDITION_FAILED, "Order was changed by another request, fetch it again")
+
+
+
+# Function to abort after a status change matched no row: gone (404), changed meanwhile (412) or not allowed (409)
+def abort_status_conflict(order_id, new_status, versions):
+    db.session.rollback()
+
+    order = Order.query.get(order_id)
+
+    if order is None:
+        abort(HTTPStatus.NOT_FOUND, "Order not found")
+
+    if versions is not None and order.version not in versions:
+        abort(HTTPStatus.PRECONDITION_FAILED, "Order was changed by another request, fetch it again")
+
+    abort(HTTPStatus.CONFLICT, f"Cannot move an order from {order.order_status.name} to {new_status.name}")
+
+
+
+# Function to get the JSON array body of a bulk request or abort
+def bulk_payload():
+    data = order_namespace.payload
+
+    if not isinstance(data, list):
+        abort(HTTPStatus.BAD_REQUEST, "Expected a JSON array")
+
+    if len(data) > MAX_BULK_ITEMS:
+        abort(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BULK_ITEMS} items per request")
+
+    return data
+
+
+
+# Function to check a new order, returning an error message or None
+def validate_new_order(item):
+    if not isinstance(item, dict):
+        return "Expected an object"
+
+    if item.get('size') not in Sizes.__members__:
+        return "size must be one of " + ', '.join(Sizes.__members__)
+
+    quantity = item.get('quantity')
+
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        return "quantity must be a positive integer"
+
+    if not isinstance(item.get('flavour'), str) or not item['flavour']:
+        return "flavour is required"
+
+    return None
+
+
+
+# Function to check a status change, returning an error message or None
+def validate_status_change(item):
+    if not isinstance(item, dict):
+        return "Expected an object"
+
+    if not isinstance(item.get('id'), int) or isinstance(item['id'], bool):
+        return "id must be an integer"
+
+    if item.get('order_status') not in OrderStatus.__members__:
+        return "order_status must be one of " + ', '.join(OrderStatus.__members__)
+
+    return None
+
+
+
+# Function to filter, project and page an order query, returning the serialized page and its headers;
+# `gather` reads the page from every shard
+def list_orders(query, args, gather=None):
+    if args.get('order_status'):
+        query = query.filter(Order.order_status == OrderStatus[args['order_status']])
+
+    if args.get('size'):
+        query = query.filter(Order.size == Sizes[args['size']])
+
+    if args.get('customer') is not None:
+        query = query.filter(Order.customer == args['customer'])
+
+    if args.get('created_from'):
+        query = query.filter(Order.date_created >= args['created_from'])
+
+    if args.get('created_to'):
+        query = query.filter(Order.date_created < args['created_to'])
+
+    names = list(order_model)
+
+    if args.get('fields'):
+        names = [name.strip() for name in args['fields'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in order_model]
+
+        if not names:
+            abort(HTTPStatus.BAD_REQUEST, "fields must name at least one field")
+
+        if unknown:
+            abort(HTTPStatus.BAD_REQUEST, f"Unknown fields: {', '.join(unknown)}")
+
+    # Only select the requested columns (plus id for the cursor), as plain rows rather than ORM objects
+    columns = ['id'] + [name for name in names if name != 'id']
+    query = query.with_entities(*[getattr(Order, name) for name in columns])
+
+    orders, next_cursor = keyset_page(query, Order.id, args['limit'], args.get('after'), gather)
+
+    return order_serializer.many(orders, names), next_page_headers(next_cursor)
+
+
+
 
 
 @order_namespace.route('/orders')
@@ -49,49 +396,404 @@ class OrderGetCreate(Resource):
 
     # @order_namespace.doc is for Swagger UI Documentation for frontend guys
     @jwt_required()
-    @order_namespace.marshal_with(order_model)
+    @read_replica
+    @cached_response('orders')
+    @order_namespace.expect(order_list_parser)
+    @order_namespace.response(HTTPStatus.OK, 'Success', [order_model])
     @order_namespace.doc(
-        description="Get all orders",
+        description="Get all orders, a page at a time (follow X-Next-Cursor/Link for the next page)",
     )
     def get(self):
         """
         Get all orders
         
         """
-        orders = Order.query.all()
+        args = order_list_parser.parse_args()
+
+        router = get_shard_router()
+        gather = None
+
+        # Sharded: one customer's orders are on their shard, all orders are gathered from every shard
+        if args.get('customer') is not None:
+            route_customer(args['customer'])
+        elif router is not None:
+            gather = router.gather
 
-        return orders, HTTPStatus.OK
+        orders, headers = list_orders(Order.query, args, gather)
 
+        return json_response(orders, HTTPStatus.OK, headers)
 
+
+    @jwt_required()
+    @idempotent
     @order_namespace.expect(order_model)
-    @order_namespace.marshal_with(order_model)
+    @order_namespace.response(HTTPStatus.CREATED, 'Order placed', order_model)
+    @order_namespace.response(HTTPStatus.ACCEPTED, 'Order queued (write-behind mode)', queued_order_model)
     @order_namespace.doc(
-        description="Place an order"
+        description="Place an order", params=IDEMPOTENCY_KEY_PARAM
     )
-    @jwt_required()
     def post(self):
         """
         Create an order
     
         """
 
-        # To get user of order
-        username = get_jwt_identity()
-        current_user = User.query.filter_by(username=username).first()
-
         data = order_namespace.payload # Can use this instead of request.get_json()
 
+        error = validate_new_order(data)
+
+        if error:
+            abort(HTTPStatus.BAD_REQUEST, error)
+
+        order_queue = current_app.extensions.get('order_queue')
+
+        # Write-behind mode: store in the local journal, the database insert happens in a batch later
+        if order_queue is not None:
+            ref = order_queue.enqueue(
+                {'size': data['size'], 'quantity': data['quantity'], 'flavour': data['flavour']}, current_user_id()
+            )
+
+            status_url = url_for('orders_queued_order', ref=ref)
+
+            return {'ref': ref, 'status': 'queued', 'status_url': status_url}, HTTPStatus.ACCEPTED, {'Location': status_url}
+
         new_order = Order(
             size= data['size'],
             quantity = data['quantity'],
             flavour = data['flavour']   
         )
 
-        new_order.user = current_user
+        # To get user of order
+        new_order.customer = current_user_id()
+
+        # Sharded: the ID comes from the shard directory and the order goes to the customer's shard
+        new_order.id = new_order_ids(new_order.customer, 1)[0]
 
         new_order.save()
 
-        return new_order, HTTPStatus.CREATED
+        return marshal(new_order, order_model), HTTPStatus.CREATED
+
+
+
+
+@order_namespace.route('/queued/<string:ref>')
+class QueuedOrder(Resource):
+
+    @jwt_required()
+    @order_namespace.marshal_with(queued_order_model, skip_none=True)
+    @order_namespace.doc(
+        description="Check on an order accepted with 202: queued, stored with its ID, or failed"
+    )
+    def get(self, ref):
+        """
+        Get a queued order
+
+        """
+        order_queue = current_app.extensions.get('order_queue')
+        entry = order_queue.journal.get(ref) if order_queue is not None else None
+
+        if entry is None:
+            # already pruned from the journal
+            route_customer(current_user_id())
+            order = Order.query.filter_by(queue_ref=ref).first()
+            entry = order and {'customer': order.customer, 'order_id': order.id}
+
+        if not entry or entry['customer'] != current_user_id():
+            abort(HTTPStatus.NOT_FOUND, "Queued order not found")
+
+        status_url = url_for('orders_queued_order', ref=ref)
+
+        if entry['order_id'] is None:
+            return {
+                'ref': ref, 'status': 'failed' if entry.get('failed') else 'queued', 'status_url': status_url,
+                'attempts': entry.get('attempts') or None, 'error': entry.get('last_error')
+            }, HTTPStatus.OK
+
+        order_url = url_for('orders_get_update_delete', order_id=entry['order_id'])
+
+        return {
+            'ref': ref, 'status': 'stored', 'id': entry['order_id'], 'status_url': status_url, 'order_url': order_url
+        }, HTTPStatus.OK, {'Location': order_url}
+
+
+
+
+@order_namespace.route('/bulk')
+class BulkOrderCreate(Resource):
+
+    @jwt_required()
+    @idempotent
+    @order_namespace.expect([order_model])
+    @order_namespace.marshal_list_with(bulk_result_model)
+    @order_namespace.doc(
+        description="Place many orders in one transaction; returns a result per item", params=IDEMPOTENCY_KEY_PARAM
+    )
+    def post(self):
+        """
+        Create orders in bulk
+
+        """
+        data = bulk_payload()
+
+        # To get user of the orders (once for the whole batch)
+        customer = current_user_id()
+
+        results = []
+        mappings = []
+
+        for index, item in enumerate(data):
+            error = validate_new_order(item)
+
+            if error:
+                results.append({'index': index, 'status': HTTPStatus.BAD_REQUEST, 'error': error})
+                continue
+
+            result = {'index': index, 'status': HTTPStatus.CREATED}
+            results.append(result)
+            mappings.append((result, {
+                'size': Sizes[item['size']],
+                'order_status': OrderStatus.PENDING,
+                'quantity': item['quantity'],
+                'flavour': item['flavour'],
+                'date_created': datetime.utcnow(),
+                'customer': customer
+            }))
+
+        if mappings:
+            # Sharded: IDs come from the shard directory and the orders go to the customer's shard
+            for (_, mapping), order_id in zip(mappings, new_order_ids(customer, len(mappings))):
+                if order_id is not None:
+                    mapping['id'] = order_id
+
+            insert_many(Order, [mapping for _, mapping in mappings])
+            OrderSummary.record_created([mapping for _, mapping in mappings])
+            db.session.commit()
+
+            events = get_event_bus()
+
+            for result, mapping in mappings:
+                result['id'] = mapping['id']
+                events.publish_order(mapping['id'], customer, OrderStatus.PENDING)
+
+            get_response_cache().invalidate_order(customer=customer)
+
+        return results, HTTPStatus.CREATED if mappings else HTTPStatus.BAD_REQUEST
+
+
+
+
+@order_namespace.route('/status/bulk')
+class BulkUpdateOrdersStatus(Resource):
+
+    @order_namespace.expect([bulk_status_model])
+    @order_namespace.marshal_list_with(bulk_result_model)
+    @order_namespace.doc(
+        description="Update the status of many orders in one transaction; returns a result per item"
+    )
+    @jwt_required()
+    def patch(self):
+        """
+        Update order statuses in bulk
+
+        """
+        data = bulk_payload()
+
+        results = []
+        changes = []
+
+        for index, item in enumerate(data):
+            error = validate_status_change(item)
+
+            if error:
+                results.append({'index': index, 'status': HTTPStatus.BAD_REQUEST, 'error': error})
+                continue
+
+            result = {'index': index, 'id': item['id'], 'status': HTTPStatus.OK}
+            results.append(result)
+            changes.append((result, item))
+
+        # One query (per shard) to find which of the orders exist, whose they are and their status
+        ids = {item['id'] for _, item in changes}
+        found = {}
+
+        for _, shard_ids in shard_groups(ids):
+            if shard_ids:
+                found.update(
+                    (row.id, row) for row in
+                    db.session.query(Order.id, Order.customer, Order.order_status, Order.quantity).filter(Order.id.in_(shard_ids))
+                )
+
+        # Walk the items in order, so one request can move an order more than one step
+        current = {order_id: row.order_status for order_id, row in found.items()}
+        steps = []
+
+        for result, item in changes:
+            if item['id'] not in found:
+                result['status'] = HTTPStatus.NOT_FOUND
+                result['error'] = "Order not found"
+                continue
+
+            new_status = OrderStatus[item['order_status']]
+
+            if new_status.previous is None or current[item['id']] is not new_status.previous:
+                result['status'] = HTTPStatus.CONFLICT
+                result['error'] = f"Cannot move an order from {current[item['id']].name} to {new_status.name}"
+                continue
+
+            steps.append((item['id'], current[item['id']], new_status))
+            current[item['id']] = new_status
+
+        if steps:
+            # One conditional UPDATE per (from, to) pair, each order jumps straight to its final status
+            moves = defaultdict(list)
+
+            for order_id in {order_id for order_id, _, _ in steps}:
+                moves[(found[order_id].order_status, current[order_id])].append(order_id)
+
+            table = Order.__table__
+
+            for (from_status, to_status), order_ids in moves.items():
+                for _, shard_ids in shard_groups(order_ids):
+                    result = db.session.execute(
+                        table.update()
+                        .where(table.c.id.in_(shard_ids), table.c.order_status == from_status)
+                        .values(order_status=to_status, version=table.c.version + 1)
+                    )
+
+                    if result.rowcount != len(shard_ids):
+                        db.session.rollback()
+                        abort(HTTPStatus.CONFLICT, "Some orders were changed by another request, try again")
+
+            OrderSummary.record_status_changes([
+                (from_status, to_status, found[order_id].quantity)
+                for (from_status, to_status), order_ids in moves.items() for order_id in order_ids
+            ])
+
+            for _, shard_ids in shard_groups({order_id for order_id, _, _ in steps}):
+                OrderStatusHistory.record([step for step in steps if step[0] in shard_ids], current_user_id())
+
+            db.session.commit()
+
+            cache = get_response_cache()
+            events = get_event_bus()
+
+            for order_ids in moves.values():
+                for order_id in order_ids:
+                    cache.invalidate_order(order_id, found[order_id].customer)
+                    events.publish_order(order_id, found[order_id].customer, current[order_id])
+
+        return results, HTTPStatus.OK if steps else HTTPStatus.BAD_REQUEST
+
+
+
+
+@order_namespace.route('/export')
+class OrderExport(Resource):
+
+    @jwt_required()
+    @order_namespace.expect(order_export_parser)
+    @order_namespace.doc(
+        description="Stream all orders as NDJSON or CSV, oldest first; pass the last exported ID as after= to continue"
+    )
+    def get(self):
+        """
+        Export orders
+
+        """
+        args = order_export_parser.parse_args()
+
+        # Plain rows in batches through a server-side cursor, so memory stays flat
+        query = db.session.query(*[getattr(Order, name) for name in EXPORT_COLUMNS])
+
+        if args.get('since'):
+            query = query.filter(Order.date_created >= args['since'])
+
+        if args.get('after') is not None:
+            query = query.filter(Order.id > args['after'])
+
+        router = get_shard_router()
+
+        if router is None:
+            rows = query.order_by(Order.id).execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+        else:
+            # every shard streams its orders by ID, merged into one stream
+            rows = router.merge_stream(query.order_by(Order.id).statement, 'id', EXPORT_BATCH_SIZE)
+
+        if args['format'] == 'csv':
+            body, mimetype = generate_csv(rows), 'text/csv'
+        else:
+            body, mimetype = generate_ndjson(rows), 'application/x-ndjson'
+
+        return Response(
+            stream_with_context(body), mimetype=mimetype,
+            headers={'Content-Disposition': f"attachment; filename=orders.{args['format']}"}
+        )
+
+
+
+
+@order_namespace.route('/events')
+class OrderEvents(Resource):
+
+    @jwt_required()
+    @order_namespace.expect(order_events_parser)
+    @order_namespace.doc(
+        description="Server-Sent Events stream of status changes to your orders, instead of polling each order"
+    )
+    def get(self):
+        """
+        Stream order status changes
+
+        """
+        args = order_events_parser.parse_args()
+
+        user_id = current_user_id()
+
+        if user_id is None:
+            abort(HTTPStatus.NOT_FOUND, "User not found")
+
+        last_event_id = request.headers.get('Last-Event-ID') or args.get('last_event_id')
+
+        return Response(
+            get_event_bus().open_stream(user_id, last_event_id), mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+
+
+
+@order_namespace.route('/reports/<string:group_by>')
+@order_namespace.doc(params={'group_by': 'One of ' + ', '.join(REPORT_DIMENSIONS)})
+class OrderReport(Resource):
+
+    @jwt_required()
+    @cached_response('orders')
+    @order_namespace.expect(report_parser)
+    @order_namespace.marshal_list_with(report_model)
+    @order_namespace.doc(
+        description="Count orders and sum quantities by status, size, flavour, day, hour or customer"
+    )
+    def get(self, group_by):
+        """
+        Get an order report
+
+        """
+        if group_by not in REPORT_DIMENSIONS:
+            abort(HTTPStatus.NOT_FOUND, f"Reports are by {', '.join(REPORT_DIMENSIONS)}")
+
+        args = report_parser.parse_args()
+        source = args.get('source') or ('summary' if OrderSummary.enabled() else 'live')
+
+        if source == 'summary':
+            if not OrderSummary.enabled():
+                abort(HTTPStatus.BAD_REQUEST, "Materialized reports are turned off (REPORTS_MATERIALIZED)")
+
+            return OrderSummary.report(group_by), HTTPStatus.OK
+
+        # One GROUP BY per shard, added up
+        return merge_reports([
+            Order.report(group_by, args.get('created_from'), args.get('created_to')) for _ in each_shard()
+        ]), HTTPStatus.OK
 
 
 
@@ -99,16 +801,20 @@ class OrderGetCreate(Resource):
 @order_namespace.route('/order/<int:order_id>')
 class GetUpdateDelete(Resource):
  
+    @jwt_required()
+    @read_replica
+    @cached_response('order:{order_id}', etag=lambda order: order_etag(order['version']))
     @order_namespace.marshal_with(order_model)
     @order_namespace.doc(
         description="Get an order by ID"
     )
-    @jwt_required()
     def get(self, order_id):
         """
         Get an order by ID
    
         """
+        route_order(order_id)
+
         order = Order.get_by_id(order_id)
 
         return order, HTTPStatus.OK
@@ -125,18 +831,38 @@ class GetUpdateDelete(Resource):
         Update an order by ID
 
         """
+        data = order_namespace.payload
+
+        error = validate_new_order(data)
+
+        if error:
+            abort(HTTPStatus.BAD_REQUEST, error)
+
+        route_order(order_id)
+
         order_to_update = Order.get_by_id(order_id)
 
-        data = order_namespace.payload
+        check_if_match(order_to_update)
+
+        values = {
+            'quantity': data["quantity"],
+            'size': Sizes[data["size"]],
+            'flavour': data["flavour"]
+        }
+
+        if not Order.update_if_version(order_id, order_to_update.version, **values):
+            abort_conflict(order_id)
 
-        order_to_update.quantity = data["quantity"] 
-        order_to_update.size = data["size"]
-        order_to_update.flavour = data["flavour"]
+        old_row = order_to_update.summary_row()
 
+        OrderSummary.record_deleted([old_row])
+        OrderSummary.record_created([dict(old_row, **values)])
 
         db.session.commit()
 
-        return order_to_update, HTTPStatus.OK
+        get_response_cache().invalidate_order(order_to_update.id, order_to_update.customer)
+
+        return order_to_update, HTTPStatus.OK, {'ETag': order_etag(order_to_update.version)}
 
 
 
@@ -149,18 +875,20 @@ class GetUpdateDelete(Resource):
         Delete an order by ID 
 
         """ 
-        order_to_delete = Order.get_by_id(order_id)
+        route_order(order_id)
 
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
-        user_id = user.id
+        order_to_delete = Order.get_by_id(order_id)
 
-        user = order_to_delete.customer
+        user_id = current_user_id()
 
-        if user_id == user:
+        if user_id is not None and user_id == order_to_delete.customer:
+            OrderSummary.record_deleted([order_to_delete.summary_row()])
             db.session.delete(order_to_delete)
+            forget_orders([order_id])
             db.session.commit()
 
+            get_response_cache().invalidate_order(order_id, user_id)
+
             return {"message":"Order Deleted"}, HTTPStatus.OK
 
         else:
@@ -172,6 +900,7 @@ class GetUpdateDelete(Resource):
 class GetSpecificOrderByUser(Resource):
 
     @jwt_required()
+    @read_replica
     @order_namespace.marshal_with(order_model)
     @order_namespace.doc(
         description="Get a specific order by User ID and order ID"
@@ -181,9 +910,9 @@ class GetSpecificOrderByUser(Resource):
         Get specific order by user ID and order ID
 
         """
-        user = User.get_by_id(user_id)
+        route_customer(user_id)
 
-        order = Order.query.filter_by(id=order_id).filter_by(user=user).first()
+        order = Order.query.filter_by(id=order_id, customer=user_id).first_or_404()
        
         return order, HTTPStatus.OK
 
@@ -194,20 +923,26 @@ class GetSpecificOrderByUser(Resource):
 class UserOrders(Resource):
 
     @jwt_required()
-    @order_namespace.marshal_list_with(order_model)
+    @read_replica
+    @cached_response('user:{user_id}')
+    @order_namespace.expect(user_order_list_parser)
+    @order_namespace.response(HTTPStatus.OK, 'Success', [order_model])
     @order_namespace.doc(
-        description="Get all orders by a user through ID"
+        description="Get all orders by a user through ID, a page at a time"
     )
     def get(self, user_id):
         """
         Get all orders by a user through ID
 
         """
-        user = User.get_by_id(user_id)
+        args = user_order_list_parser.parse_args()
 
-        orders = user.orders
+        route_customer(user_id)
 
-        return orders, HTTPStatus.OK
+        # One indexed query on orders.customer, no lookup of the user first
+        orders, headers = list_orders(Order.query.filter_by(customer=user_id), args)
+
+        return json_response(orders, HTTPStatus.OK, headers)
 
 
    
@@ -227,10 +962,32 @@ class UpdateOrdersStatus(Resource):
         """
         data = order_namespace.payload
 
-        order_to_update = Order.get_by_id(order_id)
+        if not isinstance(data, dict):
+            abort(HTTPStatus.BAD_REQUEST, "Expected an object")
 
-        order_to_update.order_status = data["order_status"]
+        new_status = OrderStatus.__members__.get(data.get("order_status"))
+
+        if new_status is None:
+            abort(HTTPStatus.BAD_REQUEST, "order_status must be one of " + ', '.join(OrderStatus.__members__))
+
+        versions = if_match_versions()
+
+        route_order(order_id)
+
+        # No SELECT first: the UPDATE itself checks the order is in the previous status
+        if not Order.change_status(order_id, new_status, versions):
+            abort_status_conflict(order_id, new_status, versions)
+
+        order_to_update = Order.query.populate_existing().get(order_id)
+
+        OrderSummary.record_status_changes([(new_status.previous, new_status, order_to_update.quantity)])
+
+        OrderStatusHistory.record([(order_id, new_status.previous, new_status)], current_user_id())
 
         db.session.commit()
 
-        return order_to_update, HTTPStatus.OK
+        get_response_cache().invalidate_order(order_to_update.id, order_to_update.customer)
+
+        get_event_bus().publish_order(order_to_update.id, order_to_update.customer, new_status)
+
+        return order_to_update, HTTPStatus.OK, {'ETag': order_etag(order_to_update.version)}
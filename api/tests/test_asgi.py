@@ -0,0 +1,150 @@
+import asyncio
+import importlib.util
+import json
+import unittest
+from .. import create_asgi_app
+from ..config.config import config_dict
+from ..utils import db
+from ..models.orders import Order, Sizes
+from ..models.users import User
+from flask_jwt_extended import create_access_token
+
+
+@unittest.skipUnless(importlib.util.find_spec('a2wsgi'), 'a2wsgi is not installed')
+class AsgiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.asgi = create_asgi_app(config=config_dict['test'])
+
+        self.app = self.asgi.app
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        db.create_all()
+
+        self.user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        self.user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': self.user.id, 'is_staff': False})
+
+        self.headers = [(b'authorization', f'Bearer {token}'.encode())]
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.asgi.executor.shutdown()
+
+        self.appctx.pop()
+
+        self.app = None
+
+
+
+    # To run one request through the ASGI app, returns (status, headers, [body chunks])
+    async def request(self, method, path, body=b'', headers=(), query_string=b''):
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+            'headers': list(self.headers) + list(headers), 'http_version': '1.1', 'scheme': 'http',
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 5000)
+        }
+        incoming = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+        finished = asyncio.Event()
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                finished.set()
+
+        await self.asgi(scope, receive, send)
+
+        start = sent[0]
+
+        return start['status'], dict(start['headers']), [message['body'] for message in sent[1:] if message['body']]
+
+
+
+    def test_get_and_post(self):
+        body = json.dumps({"size": "LARGE", "quantity": 2, "flavour": "Apple"}).encode()
+
+        status, _, chunks = asyncio.run(self.request(
+            'POST', '/orders/orders', body, [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        ))
+
+        assert status == 201
+
+        assert json.loads(b''.join(chunks))['flavour'] == 'Apple'
+
+        status, headers, chunks = asyncio.run(self.request('GET', '/orders/order/1'))
+
+        assert status == 200
+
+        assert headers[b'content-type'] == b'application/json'
+
+        assert json.loads(b''.join(chunks))['id'] == 1
+
+
+
+    def test_streamed_response_keeps_its_request_context(self):
+        for _ in range(3):
+            db.session.add(Order(size=Sizes.SMALL, quantity=1, flavour='Apple', customer=self.user.id))
+
+        db.session.commit()
+
+        status, _, chunks = asyncio.run(self.request('GET', '/orders/export', query_string=b'format=csv'))
+
+        assert status == 200
+
+        assert len(b''.join(chunks).decode().splitlines()) == 4
+
+
+
+    def test_concurrent_requests(self):
+
+        async def many():
+            return await asyncio.gather(*[self.request('GET', f'/orders/user/{self.user.id}/orders') for _ in range(20)])
+
+        assert [status for status, _, _ in asyncio.run(many())] == [200] * 20
+
+
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.asgi({'type': 'lifespan'}, receive, send))
+
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+
+    def test_websocket_is_closed(self):
+        sent = []
+
+        async def receive():
+            return {'type': 'websocket.connect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.asgi({'type': 'websocket', 'path': '/orders/events', 'headers': []}, receive, send))
+
+        assert sent == [{'type': 'websocket.close', 'code': 1000}]
@@ -0,0 +1,197 @@
+import time
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.blocklist import LocalRevocationStore, RevocationCache, get_revocation_cache
+from ..models.blacklist import TokenBlocklist
+from ..commands import compact_blocklist
+from flask_jwt_extended import create_access_token, decode_token
+
+
+def in_an_hour():
+    return datetime.utcnow() + timedelta(hours=1)
+
+
+# Stand-in for redis.Redis with just the calls the revocation store makes
+class FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, time.time() + ex)
+
+    def exists(self, key):
+        item = self.data.get(key)
+        return int(item is not None and item[1] > time.time())
+
+
+
+class BlocklistTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def test_logout_revokes_token(self):
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.post('/auth/logout', headers=headers)
+
+        assert response.status_code == 200
+
+        row = TokenBlocklist.query.one()
+
+        assert row.expires_at == datetime.utcfromtimestamp(decode_token(token)['exp'])
+
+        response = self.client.get('orders/orders', headers=headers)
+
+        assert response.status_code == 401
+
+
+
+    def test_valid_token_does_not_query_blocklist(self):
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        # first request loads the blocklist once, and no periodic sync may fall into the measured request
+        get_revocation_cache().sync_interval = 0
+
+        self.client.get('orders/orders', headers=headers)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+
+        try:
+            response = self.client.get('orders/orders', headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 200
+
+        assert not [s for s in statements if 'token_blocklist' in s]
+
+
+
+    def test_revocations_from_other_workers_are_synced(self):
+        cache = get_revocation_cache()
+
+        assert cache.is_revoked('some-jti') is False
+
+        db.session.add(TokenBlocklist(jti='some-jti', type='access', expires_at=in_an_hour()))
+        db.session.commit()
+
+        cache.last_sync = 0
+
+        assert cache.is_revoked('some-jti') is True
+
+
+
+    def test_redis_backed_cache_is_shared(self):
+        client = FakeRedis()
+
+        worker_one = RevocationCache(redis_client=client)
+        worker_two = RevocationCache(redis_client=client)
+
+        worker_one.revoke('shared-jti', time.time() + 60)
+
+        assert worker_two.is_revoked('shared-jti') is True
+
+        assert worker_two.is_revoked('other-jti') is False
+
+
+
+    def test_local_cache_falls_back_to_db_after_eviction(self):
+        cache = RevocationCache(max_size=1, sync_interval=0)
+
+        db.session.add(TokenBlocklist(jti='first', type='refresh', expires_at=in_an_hour()))
+        db.session.add(TokenBlocklist(jti='second', type='refresh', expires_at=in_an_hour()))
+        db.session.commit()
+
+        assert cache.is_revoked('second', 'refresh') is True
+
+        assert cache.local['refresh'].complete is False
+
+        assert cache.is_revoked('first', 'refresh') is True
+
+        # evicting refresh tokens does not send access token misses to the database
+        assert cache.local['access'].complete is True
+
+
+
+    def test_local_store_is_complete_again_once_evicted_tokens_expire(self):
+        store = LocalRevocationStore(max_size=1)
+
+        now = time.time()
+
+        store.add('first', now + 60)
+        store.add('second', now + 120)
+
+        assert store.complete is False
+
+        with patch('time.time', return_value=now + 61):
+            assert store.complete is True
+
+            assert store.contains('second') is True
+
+
+
+    def test_compaction_deletes_only_expired_rows(self):
+        past = datetime.utcnow() - timedelta(minutes=1)
+
+        for n in range(5):
+            db.session.add(TokenBlocklist(jti=f'expired-{n}', type='access', expires_at=past))
+
+        db.session.add(TokenBlocklist(jti='live', type='refresh', expires_at=in_an_hour()))
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(compact_blocklist, ['--batch-size', '2'])
+
+        assert result.exit_code == 0
+
+        assert 'Deleted 5' in result.output
+
+        assert [row.jti for row in TokenBlocklist.query] == ['live']
+
+
+
+    def test_expired_rows_are_not_loaded(self):
+        db.session.add(TokenBlocklist(jti='old', type='access', expires_at=datetime.utcnow() - timedelta(minutes=1)))
+        db.session.commit()
+
+        assert get_revocation_cache().is_revoked('old') is False
@@ -0,0 +1,157 @@
+import gzip
+import json
+import unittest
+from flask import request
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.compression import BrotliEncoder, GzipEncoder, ResponseCompressor
+from ..models.orders import Order, Sizes
+from ..models.users import User
+from flask_jwt_extended import create_access_token
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        self.user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        self.user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': self.user.id, 'is_staff': False})
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def add_orders(self, count):
+        for _ in range(count):
+            db.session.add(Order(size=Sizes.LARGE, quantity=2, flavour='Pepperoni', customer=self.user.id))
+
+        db.session.commit()
+
+
+
+    def test_large_list_is_gzipped(self):
+        self.add_orders(50)
+
+        plain = self.client.get('orders/orders?limit=50', headers=self.headers)
+
+        response = self.client.get('orders/orders?limit=50', headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+        assert len(response.data) < len(plain.data)
+
+        assert json.loads(gzip.decompress(response.data)) == plain.json
+
+        # the compressed copy has different bytes, so its ETag is weak
+        assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+
+        revalidated = self.client.get('orders/orders?limit=50', headers=dict(
+            self.headers, **{'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']}
+        ))
+
+        assert revalidated.status_code == 304
+
+
+
+    def test_small_body_is_not_compressed(self):
+        response = self.client.get('orders/orders', headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+
+        assert 'Content-Encoding' not in response.headers
+
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+        assert response.json == []
+
+
+
+    def test_streamed_export_is_compressed_in_chunks(self):
+        self.add_orders(30)
+
+        response = self.client.get('orders/export?format=csv', headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+
+        assert 'Content-Length' not in response.headers
+
+        lines = gzip.decompress(response.data).decode().splitlines()
+
+        assert len(lines) == 31
+
+
+
+    def test_weak_etag_is_accepted_by_if_match(self):
+        self.add_orders(1)
+
+        response = self.client.put('orders/order/1', json={"size": "SMALL", "quantity": 3, "flavour": "Cheese"},
+                                   headers=dict(self.headers, **{'If-Match': 'W/"v1"'}))
+
+        assert response.status_code == 200
+
+
+
+    def test_spec_can_be_revalidated(self):
+        response = self.client.get('/swagger.json')
+
+        assert response.status_code == 200
+
+        assert response.headers['ETag']
+
+        assert response.headers['Last-Modified']
+
+        assert self.client.get('/swagger.json', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+        assert self.client.get('/swagger.json', headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+
+
+    def test_negotiation_follows_client_preference(self):
+        compressor = ResponseCompressor([GzipEncoder()])
+
+        with self.app.test_request_context(headers={'Accept-Encoding': 'br;q=1.0, gzip;q=0.5'}):
+            assert compressor.negotiate(request.accept_encodings).name == 'gzip'
+
+        with self.app.test_request_context(headers={'Accept-Encoding': 'identity'}):
+            assert compressor.negotiate(request.accept_encodings) is None
+
+
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_round_trip(self):
+        encoder = BrotliEncoder()
+        data = b'{"size": "LARGE", "order_status": "PENDING"}' * 100
+
+        assert brotli.decompress(encoder.compress(data)) == data
+
+        assert brotli.decompress(b''.join(encoder.compress_stream([data, data]))) == data * 2
@@ -0,0 +1,154 @@
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.events import EventBus, MemoryEventBackend
+from ..models.users import User
+from ..models.orders import OrderStatus
+from flask_jwt_extended import create_access_token
+
+
+class EventsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class EventsConfig(config_dict['test']):
+            EVENTS_HEARTBEAT_SECONDS = 1
+            EVENTS_STREAM_SECONDS = 1
+
+        self.app = create_app(config=EventsConfig)
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def test_memory_backend_filters_channels_and_resumes(self):
+        backend = MemoryEventBackend(max_events=10)
+
+        first = backend.publish('user:1', {'id': 1})
+        backend.publish('user:2', {'id': 2})
+        backend.publish('user:1', {'id': 3})
+
+        assert [data['id'] for _, data in backend.read('user:1', '0', 0)] == [1, 3]
+
+        assert [data['id'] for _, data in backend.read('user:1', first, 0)] == [3]
+
+        assert backend.read('user:1', backend.last_id('user:1'), 0.01) == []
+
+
+
+    def test_stream_sends_heartbeats_and_ends(self):
+        bus = EventBus(MemoryEventBackend(), heartbeat=0.05, stream_seconds=0.2)
+
+        chunks = list(bus.stream(1))
+
+        assert chunks[0] == 'retry: 50\n\n'
+
+        assert ': heartbeat\n\n' in chunks
+
+
+
+    def test_status_changes_are_streamed_to_the_owner(self):
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': user.id, 'is_staff': False})
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Apple"}, headers=headers)
+
+        order_id = response.json['id']
+
+        self.client.patch(f'orders/order/status/{order_id}', json={"order_status": "IN_TRANSIT"}, headers=headers)
+
+        response = self.client.get('orders/events', headers=dict(headers, **{'Last-Event-ID': '0'}))
+
+        assert response.status_code == 200
+
+        assert response.mimetype == 'text/event-stream'
+
+        body = response.get_data(as_text=True)
+
+        assert f'event: order_status\ndata: {{"id": {order_id}, "order_status": "PENDING"}}' in body
+
+        assert f'data: {{"id": {order_id}, "order_status": "IN_TRANSIT"}}' in body
+
+        # resuming after the last event only sends what came later
+        last_event_id = body.split('id: ')[-1].split('\n')[0]
+
+        self.app.extensions['event_bus'].publish_order(order_id, user.id, OrderStatus.DELIVERED)
+
+        body = self.client.get(f'orders/events?last_event_id={last_event_id}', headers=headers).get_data(as_text=True)
+
+        assert 'IN_TRANSIT' not in body
+
+        assert '"order_status": "DELIVERED"' in body
+
+
+
+    def test_bulk_created_orders_are_streamed(self):
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': user.id, 'is_staff': False})
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        data = [{"size": "SMALL", "quantity": 1, "flavour": "Apple"}, {"size": "LARGE", "quantity": 2, "flavour": "Pear"}]
+
+        response = self.client.post('orders/bulk', json=data, headers=headers)
+
+        body = self.client.get('orders/events', headers=dict(headers, **{'Last-Event-ID': '0'})).get_data(as_text=True)
+
+        for result in response.json:
+            assert f'data: {{"id": {result["id"]}, "order_status": "PENDING"}}' in body
+
+
+
+    def test_streams_beyond_the_cap_are_refused(self):
+        self.app.extensions['event_bus'] = EventBus(MemoryEventBackend(), heartbeat=1, stream_seconds=1, max_streams=1, retry_after=7)
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': user.id, 'is_staff': False})
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        # the first stream holds the only slot until the server closes it
+        first = self.client.get('orders/events', headers=headers)
+
+        assert first.status_code == 200
+
+        response = self.client.get('orders/events', headers=headers)
+
+        assert response.status_code == 503
+
+        assert response.headers['Retry-After'] == '7'
+
+        first.close()
+
+        assert self.client.get('orders/events', headers=headers).status_code == 200
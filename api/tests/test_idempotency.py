@@ -0,0 +1,197 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import g
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.idempotency import DatabaseIdempotencyStore, RedisIdempotencyStore, get_idempotency_store
+from ..models.orders import Order
+from ..models.idempotency import IdempotencyKey
+from ..commands import compact_idempotency_keys
+from flask_jwt_extended import create_access_token
+
+
+# Stand-in for redis.Redis with just the calls the idempotency store makes
+class FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+
+class IdempotencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        token = create_access_token(identity='TestUser')
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def post_order(self, key, data=None, path='orders/orders'):
+        data = data or {"size": "SMALL", "quantity": 1, "flavour": "Apple"}
+
+        return self.client.post(path, json=data, headers=dict(self.headers, **{'Idempotency-Key': key}))
+
+
+
+    def test_retry_returns_first_response_without_insert(self):
+        first = self.post_order('retry-1')
+        second = self.post_order('retry-1')
+
+        assert first.status_code == second.status_code == 201
+
+        assert second.json == first.json
+
+        assert second.headers['Idempotent-Replayed'] == 'true'
+
+        assert Order.query.count() == 1
+
+        assert self.post_order('retry-2').json['id'] != first.json['id']
+
+
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post_order('reused')
+
+        response = self.post_order('reused', {"size": "LARGE", "quantity": 3, "flavour": "Pear"})
+
+        assert response.status_code == 422
+
+        assert Order.query.count() == 1
+
+
+
+    def test_bulk_retry_is_replayed(self):
+        data = [{"size": "SMALL", "quantity": 1, "flavour": "Apple"}] * 3
+
+        first = self.post_order('bulk-1', data, 'orders/bulk')
+        second = self.post_order('bulk-1', data, 'orders/bulk')
+
+        assert second.json == first.json
+
+        assert Order.query.count() == 3
+
+
+
+    def test_failed_request_releases_key(self):
+        with patch.object(Order, 'save', side_effect=LookupError), self.assertRaises(LookupError):
+            self.post_order('broken')
+
+        assert IdempotencyKey.query.count() == 0
+
+        assert self.post_order('broken').status_code == 201
+
+
+
+    def test_key_commits_with_the_order(self):
+        # the worker dies after the order's commit, before the response is stored
+        with patch.object(DatabaseIdempotencyStore, 'complete', side_effect=SystemExit), self.assertRaises(SystemExit):
+            self.post_order('crash')
+
+        g.pop('idempotency_claim', None)
+
+        row = IdempotencyKey.query.one()
+
+        assert (Order.query.count(), row.status_code) == (1, None)
+
+        assert self.post_order('crash').status_code == 409
+
+        row.created_at -= timedelta(minutes=5)
+        db.session.commit()
+
+        response = self.post_order('crash')
+
+        assert response.status_code == 409
+
+        assert 'lost' in response.json['message']
+
+        assert Order.query.count() == 1
+
+
+
+    def test_concurrent_request_with_the_key_is_rolled_back(self):
+        first = self.post_order('race')
+
+        store = get_idempotency_store()
+        find = store.find
+
+        # both requests looked the key up before either committed
+        with patch.object(store, 'find', side_effect=[None, find('TestUser', 'race')]):
+            second = self.post_order('race')
+
+        assert second.json == first.json
+
+        assert second.headers['Idempotent-Replayed'] == 'true'
+
+        assert Order.query.count() == 1
+
+
+
+    def test_in_progress_and_expired_claims(self):
+        db.session.add(IdempotencyKey(
+            owner='TestUser', key='running', fingerprint='x', expires_at=datetime.utcnow() + timedelta(minutes=1)
+        ))
+        db.session.add(IdempotencyKey(
+            owner='TestUser', key='crashed', fingerprint='x', expires_at=datetime.utcnow() - timedelta(minutes=1)
+        ))
+        db.session.commit()
+
+        assert self.post_order('running').status_code == 409
+
+        assert self.post_order('crashed').status_code == 201
+
+        result = self.app.test_cli_runner().invoke(compact_idempotency_keys)
+
+        assert 'Deleted 0' in result.output
+
+
+
+    def test_redis_store_claims_once(self):
+        store = RedisIdempotencyStore(client=FakeRedis())
+
+        assert store.claim('user', 'key', 'abc') is None
+
+        assert store.claim('user', 'key', 'abc') == {'fingerprint': 'abc', 'status': None}
+
+        store.complete('user', 'key', 'abc', 201, json.dumps({'id': 1}), {})
+
+        assert store.claim('user', 'key', 'abc')['status'] == 201
@@ -0,0 +1,80 @@
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from flask_jwt_extended import create_access_token
+from ..models.orders import Order
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.app.config['METRICS_SERVER_TIMING'] = True
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        token = create_access_token(identity='TestUser')
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def test_server_timing_header_counts_queries(self):
+        Order(size='SMALL', quantity=1, flavour='Apple').save()
+
+        response = self.client.get('orders/order/1', headers=self.headers)
+
+        assert response.status_code == 200
+
+        # blocklist sync and the order itself
+        assert 'desc="2 queries"' in response.headers['Server-Timing']
+
+
+
+    def test_metrics_endpoint_reports_routes(self):
+        self.client.get('orders/orders', headers=self.headers)
+        self.client.get('orders/orders', headers=self.headers)
+
+        response = self.client.get('/metrics')
+
+        assert response.status_code == 200
+
+        body = response.data.decode()
+
+        assert 'http_request_duration_seconds_count{method="GET",route="/orders/orders",status="200"} 2' in body
+
+        assert 'http_request_sql_statements_total{method="GET",route="/orders/orders"}' in body
+
+        assert 'response_cache_hits_total 1' in body
+
+
+
+    def test_metrics_endpoint_can_require_a_token(self):
+        self.app.config['METRICS_TOKEN'] = 'scraper-secret'
+
+        assert self.client.get('/metrics').status_code == 401
+
+        assert self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+        assert self.client.get('/metrics', headers={'Authorization': 'Bearer scraper-secret'}).status_code == 200
@@ -1,12 +1,14 @@
 # pip install pytest to run test
 
+import json
 import unittest
+from sqlalchemy import event
 from .. import create_app
 from ..config.config import config_dict
 from ..utils import db
 from flask_jwt_extended import create_access_token
 from ..models.users import User
-from ..models.orders import Order
+from ..models.orders import Order, OrderStatus, OrderStatusHistory, Sizes
 
 
 class OrderTestCase(unittest.TestCase):
@@ -84,6 +86,24 @@ class OrderTestCase(unittest.TestCase):
 
 
 
+    # Test that an invalid order is rejected instead of stored
+    def test_create_order_rejects_invalid_payload(self):
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        for data in [{"size": "HUGE", "quantity": 1, "flavour": "Apple"}, {"size": "SMALL"}]:
+            response = self.client.post('orders/orders', json=data, headers=headers)
+
+            assert response.status_code == 400
+
+        assert Order.query.count() == 0
+
+
+
     
     # Test for get an order by ID
     def test_get_single_order(self):
@@ -111,3 +131,404 @@ class OrderTestCase(unittest.TestCase):
 
        
 
+
+    # Test to page through orders with a cursor
+    def test_get_orders_paginated(self):
+
+        for flavour in ['Apple', 'Banana', 'Cherry']:
+            Order(size='SMALL', quantity=1, flavour=flavour).save()
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.get('orders/orders?limit=2', headers=headers)
+
+        assert response.status_code == 200
+
+        assert [order['flavour'] for order in response.json] == ['Apple', 'Banana']
+
+        cursor = response.headers['X-Next-Cursor']
+
+        response = self.client.get(f'orders/orders?limit=2&after={cursor}', headers=headers)
+
+        assert [order['flavour'] for order in response.json] == ['Cherry']
+
+        assert 'X-Next-Cursor' not in response.headers
+
+
+
+    # Test to filter orders and select only some fields
+    def test_get_orders_filtered_with_fields(self):
+
+        Order(size='SMALL', quantity=1, flavour='Apple').save()
+        Order(size='LARGE', quantity=2, flavour='Banana', order_status='DELIVERED').save()
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.get('orders/orders?order_status=DELIVERED&fields=id,flavour', headers=headers)
+
+        assert response.status_code == 200
+
+        assert response.json == [{'id': 2, 'flavour': 'Banana'}]
+
+        response = self.client.get('orders/orders?fields=secret', headers=headers)
+
+        assert response.status_code == 400
+
+        response = self.client.get('orders/orders?fields=,%20', headers=headers)
+
+        assert response.status_code == 400
+
+
+
+    # Test to get a page of a user's orders
+    def test_get_user_orders_paginated(self):
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        for flavour in ['Apple', 'Banana']:
+            Order(size='SMALL', quantity=1, flavour=flavour, customer=user.id).save()
+
+        Order(size='SMALL', quantity=1, flavour='Cherry').save()
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.get(f'orders/user/{user.id}/orders?limit=1', headers=headers)
+
+        assert response.status_code == 200
+
+        assert [order['flavour'] for order in response.json] == ['Apple']
+
+        response = self.client.get(
+            f"orders/user/{user.id}/orders?after={response.headers['X-Next-Cursor']}", headers=headers
+        )
+
+        assert [order['flavour'] for order in response.json] == ['Banana']
+
+
+
+    # Test to export orders as NDJSON and CSV
+    def test_export_orders(self):
+
+        for flavour in ['Apple', 'Banana', 'Cherry']:
+            Order(size='SMALL', quantity=1, flavour=flavour).save()
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.get('orders/export', headers=headers)
+
+        assert response.status_code == 200
+
+        assert response.mimetype == 'application/x-ndjson'
+
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+
+        assert [row['flavour'] for row in rows] == ['Apple', 'Banana', 'Cherry']
+
+        response = self.client.get('orders/export?format=csv&after=1', headers=headers)
+
+        lines = response.data.decode().splitlines()
+
+        assert lines[0] == 'id,size,order_status,flavour,quantity,customer,date_created'
+
+        assert [line.split(',')[3] for line in lines[1:]] == ['Banana', 'Cherry']
+
+
+
+    # Test to create orders in bulk
+    def test_bulk_create_orders(self):
+
+        data = [
+            {"size": "SMALL", "quantity": 1, "flavour": "Apple"},
+            {"size": "HUGE", "quantity": 1, "flavour": "Apple"},
+            {"size": "LARGE", "quantity": 2, "flavour": "Banana"}
+        ]
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+
+        try:
+            response = self.client.post('orders/bulk', json=data, headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 201
+
+        assert [result['status'] for result in response.json] == [201, 400, 201]
+
+        # both orders go in with one INSERT
+        assert len([s for s in statements if s.startswith('INSERT INTO orders')]) == 1
+
+        orders = Order.query.order_by(Order.id).all()
+
+        assert [order.id for order in orders] == [response.json[0]['id'], response.json[2]['id']]
+
+
+
+    # Test to update order statuses in bulk
+    def test_bulk_update_order_status(self):
+
+        Order(size='SMALL', quantity=1, flavour='Apple').save()
+        Order(size='SMALL', quantity=1, flavour='Banana').save()
+
+        data = [
+            {"id": 1, "order_status": "IN_TRANSIT"},
+            {"id": 2, "order_status": "IN_TRANSIT"},
+            {"id": 2, "order_status": "DELIVERED"},
+            {"id": 99, "order_status": "DELIVERED"},
+            {"id": 1, "order_status": "LOST"},
+            {"id": 1, "order_status": "PENDING"}
+        ]
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.patch('orders/status/bulk', json=data, headers=headers)
+
+        assert response.status_code == 200
+
+        assert [result['status'] for result in response.json] == [200, 200, 200, 404, 400, 409]
+
+        db.session.expire_all()
+
+        assert [order.order_status.name for order in Order.query.order_by(Order.id)] == ['IN_TRANSIT', 'DELIVERED']
+
+        assert [order.version for order in Order.query.order_by(Order.id)] == [2, 2]
+
+        assert [
+            (row.order_id, row.from_status.name, row.to_status.name) for row in OrderStatusHistory.query.order_by(OrderStatusHistory.id)
+        ] == [(1, 'PENDING', 'IN_TRANSIT'), (2, 'PENDING', 'IN_TRANSIT'), (2, 'IN_TRANSIT', 'DELIVERED')]
+
+
+
+    # Test that creating and deleting an order uses the user id from the token
+    def test_create_and_delete_order_without_user_lookup(self):
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': user.id, 'is_staff': False})
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+
+        try:
+            response = self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Apple"}, headers=headers)
+
+            assert response.status_code == 201
+
+            response = self.client.delete(f"orders/order/{response.json['id']}", headers=headers)
+
+            assert response.json == {"message": "Order Deleted"}
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert not [s for s in statements if 'FROM users' in s]
+
+
+
+    # Test that tokens issued before the user_id claim still resolve the user
+    def test_create_order_with_legacy_token(self):
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        response = self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Apple"}, headers=headers)
+
+        assert response.status_code == 201
+
+        assert Order.query.first().customer == user.id
+
+
+
+    # Test that the compiled list serializer matches marshal with the Swagger model
+    def test_list_serializer_matches_marshal(self):
+
+        from flask_restx import marshal
+        from ..orders.views import order_model
+        from ..utils.serializers import order_serializer
+
+        orders = [
+            Order(id=1, size=Sizes.LARGE, order_status=OrderStatus.DELIVERED, flavour='Apple', quantity=2),
+            Order(id=2, size=None, order_status=OrderStatus.PENDING, flavour='Pear', quantity=1)
+        ]
+
+        assert order_serializer.many(orders) == marshal(orders, order_model)
+
+        assert order_serializer.many(orders, ['id', 'order_status']) == [
+            {'id': 1, 'order_status': 'DELIVERED'}, {'id': 2, 'order_status': 'PENDING'}
+        ]
+
+
+
+    # Test that stale If-Match headers and lost updates are rejected with 412
+    def test_update_order_with_if_match(self):
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        order = Order(size=Sizes.SMALL, quantity=1, flavour='Apple')
+        order.save()
+
+        response = self.client.get(f'orders/order/{order.id}', headers=headers)
+
+        assert response.headers['ETag'] == '"v1"'
+
+        assert response.json['version'] == 1
+
+        data = {"size": "LARGE", "quantity": 2, "flavour": "Pear"}
+
+        response = self.client.put(f'orders/order/{order.id}', json=data, headers=dict(headers, **{'If-Match': '"v1"'}))
+
+        assert response.status_code == 200
+
+        assert response.headers['ETag'] == '"v2"'
+
+        # a second writer still holding version 1
+        response = self.client.patch(
+            f'orders/order/status/{order.id}', json={"order_status": "IN_TRANSIT"}, headers=dict(headers, **{'If-Match': '"v1"'})
+        )
+
+        assert response.status_code == 412
+
+        response = self.client.patch(
+            f'orders/order/status/{order.id}', json={"order_status": "IN_TRANSIT"}, headers=dict(headers, **{'If-Match': '"v2"'})
+        )
+
+        assert response.status_code == 200
+
+        assert response.json['order_status'] == 'IN_TRANSIT'
+
+        assert response.json['version'] == 3
+
+
+
+    # Test that an invalid update is rejected before touching the order
+    def test_update_order_rejects_invalid_payload(self):
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        order = Order(size=Sizes.SMALL, quantity=1, flavour='Apple')
+        order.save()
+
+        response = self.client.put(f'orders/order/{order.id}', json={"size": "HUGE", "quantity": 2, "flavour": "Pear"}, headers=headers)
+
+        assert response.status_code == 400
+
+        response = self.client.put(f'orders/order/{order.id}', json={"size": "LARGE"}, headers=headers)
+
+        assert response.status_code == 400
+
+        db.session.refresh(order)
+
+        assert (order.size, order.version) == (Sizes.SMALL, 1)
+
+
+
+    # Test that the conditional update only applies once per version
+    def test_update_if_version(self):
+
+        order = Order(size=Sizes.SMALL, quantity=1, flavour='Apple')
+        order.save()
+
+        assert Order.update_if_version(order.id, 1, quantity=5) is True
+
+        assert Order.update_if_version(order.id, 1, quantity=9) is False
+
+        db.session.commit()
+
+        db.session.refresh(order)
+
+        assert (order.quantity, order.version) == (5, 2)
+
+
+
+
+    # Test that statuses only move forward, one step at a time, and every change is recorded
+    def test_order_status_transitions(self):
+
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        order = Order(size=Sizes.SMALL, quantity=1, flavour='Apple')
+        order.save()
+
+        response = self.client.patch(f'orders/order/status/{order.id}', json={"order_status": "DELIVERED"}, headers=headers)
+
+        assert response.status_code == 409
+
+        for status in ['IN_TRANSIT', 'DELIVERED']:
+            response = self.client.patch(f'orders/order/status/{order.id}', json={"order_status": status}, headers=headers)
+
+            assert response.status_code == 200
+
+            assert response.json['order_status'] == status
+
+        response = self.client.patch(f'orders/order/status/{order.id}', json={"order_status": "PENDING"}, headers=headers)
+
+        assert response.status_code == 409
+
+        response = self.client.patch('orders/order/status/99', json={"order_status": "IN_TRANSIT"}, headers=headers)
+
+        assert response.status_code == 404
+
+        response = self.client.patch(f'orders/order/status/{order.id}', json=[1], headers=headers)
+
+        assert response.status_code == 400
+
+        assert [(row.from_status.name, row.to_status.name) for row in OrderStatusHistory.query.order_by(OrderStatusHistory.id)] == [
+            ('PENDING', 'IN_TRANSIT'), ('IN_TRANSIT', 'DELIVERED')
+        ]
@@ -0,0 +1,103 @@
+import unittest
+from sqlalchemy import event
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from flask_jwt_extended import create_access_token
+from ..models.users import User
+from ..models.orders import Order
+
+
+class QueryPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        user.save()
+
+        Order(size='SMALL', quantity=1, flavour='Apple', customer=user.id).save()
+
+        self.user = user
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': user.id, 'is_staff': False})
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    # Function to get the SQLite query plan of every orders SELECT a request issues
+    def query_plans(self, url):
+        queries = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('SELECT') and 'FROM orders' in statement:
+                queries.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+
+        try:
+            response = self.client.get(url, headers=self.headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 200
+
+        with db.engine.connect() as connection:
+            return [
+                [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+                for statement, parameters in queries
+            ]
+
+
+
+    def test_user_orders_use_customer_index(self):
+        plans = self.query_plans(f'orders/user/{self.user.id}/orders?after=0')
+
+        assert len(plans) == 1
+
+        assert plans[0] == ['SEARCH orders USING INDEX ix_orders_customer (customer=? AND rowid>?)']
+
+
+
+    def test_user_orders_by_date_use_composite_index(self):
+        plans = self.query_plans(f'orders/user/{self.user.id}/orders?created_from=2020-01-01T00:00:00')
+
+        assert plans[0][0] == 'SEARCH orders USING INDEX ix_orders_customer_date_created (customer=? AND date_created>?)'
+
+
+
+    def test_specific_order_by_user_is_one_primary_key_lookup(self):
+        plans = self.query_plans(f'orders/user/{self.user.id}/order/1')
+
+        assert len(plans) == 1
+
+        assert plans[0] == ['SEARCH orders USING INTEGER PRIMARY KEY (rowid=?)']
+
+
+
+    def test_status_filter_uses_status_index(self):
+        plans = self.query_plans('orders/orders?order_status=PENDING')
+
+        assert plans[0][0].startswith('SEARCH orders USING INDEX ix_orders_order_status')
@@ -0,0 +1,129 @@
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.ratelimit import MemoryRateLimitBackend, RateLimiter
+from flask_jwt_extended import create_access_token
+
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class LimitedConfig(config_dict['test']):
+            RATELIMIT_ENABLED = True
+            RATELIMITS = {'auth': '2/minute', 'orders': '3/minute'}
+            TRUSTED_PROXY_HOPS = 1
+
+        self.app = create_app(config=LimitedConfig)
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def test_ip_is_limited_per_namespace(self):
+        data = {
+            "email": "test@gmail.com",
+            "password": "password"
+        }
+
+        first = self.client.post('/auth/login', json=data)
+        second = self.client.post('/auth/login', json=data)
+        third = self.client.post('/auth/login', json=data)
+
+        assert first.headers['X-RateLimit-Limit'] == '2'
+
+        assert first.headers['X-RateLimit-Remaining'] == '1'
+
+        assert second.status_code != 429
+
+        assert third.status_code == 429
+
+        assert int(third.headers['Retry-After']) >= 1
+
+        # other namespaces have their own buckets
+        token = create_access_token(identity='TestUser')
+
+        response = self.client.get('orders/orders', headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 200
+
+
+
+    def test_user_is_limited_across_ips(self):
+        token = create_access_token(identity='TestUser')
+
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        statuses = [
+            self.client.get('orders/orders', headers=headers, environ_base={'REMOTE_ADDR': f'10.0.0.{n}'}).status_code
+            for n in range(4)
+        ]
+
+        assert statuses == [200, 200, 200, 429]
+
+        other = create_access_token(identity='OtherUser')
+
+        response = self.client.get('orders/orders', headers={"Authorization": f"Bearer {other}"}, environ_base={'REMOTE_ADDR': '10.0.0.9'})
+
+        assert response.status_code == 200
+
+
+
+    def test_bucket_refills_over_time(self):
+        limiter = RateLimiter(MemoryRateLimitBackend(), {'orders': '1/second'})
+
+        assert limiter.hit('orders', ['ip:1'])['allowed'] is True
+
+        assert limiter.hit('orders', ['ip:1'])['allowed'] is False
+
+        # pretend a second went by
+        tokens, updated = limiter.backend._buckets['orders:ip:1']
+        limiter.backend._buckets['orders:ip:1'] = (tokens, updated - 1)
+
+        assert limiter.hit('orders', ['ip:1'])['allowed'] is True
+
+
+
+    def test_memory_backend_drops_least_recently_used_buckets(self):
+        backend = MemoryRateLimitBackend(max_keys=2)
+
+        backend.take('a', 1, 1)
+        backend.take('b', 1, 1)
+        backend.take('a', 1, 1)
+        backend.take('c', 1, 1)
+
+        assert list(backend._buckets) == ['a', 'c']
+
+
+
+    def test_clients_behind_a_proxy_get_their_own_buckets(self):
+        data = {
+            "email": "test@gmail.com",
+            "password": "password"
+        }
+
+        for _ in range(2):
+            self.client.post('/auth/login', json=data, headers={'X-Forwarded-For': '203.0.113.1'})
+
+        assert self.client.post('/auth/login', json=data, headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 429
+
+        assert self.client.post('/auth/login', json=data, headers={'X-Forwarded-For': '203.0.113.2'}).status_code != 429
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+from flask import g
+from sqlalchemy import text
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..models.orders import Order, OrderStatus, Sizes
+from ..models.users import User
+from flask_jwt_extended import create_access_token
+
+
+class ReadReplicaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = []
+
+        for _ in range(2):
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            self.paths.append(path)
+
+        primary, replica = self.paths
+
+        class ReplicaConfig(config_dict['test']):
+            SQLALCHEMY_ECHO = False
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+            SQLALCHEMY_BINDS = {'replica_0': 'sqlite:///' + replica}
+
+        self.app = create_app(config=ReplicaConfig)
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+        db.metadata.create_all(bind=db.engines['replica_0'])
+
+        self.user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        self.user.save()
+
+        # the replica lags behind: same order, older flavour
+        for engine, flavour in [(db.engines[None], 'Primary'), (db.engines['replica_0'], 'Replica')]:
+            with engine.begin() as connection:
+                connection.execute(Order.__table__.insert(), {
+                    'id': 1, 'size': Sizes.LARGE, 'order_status': OrderStatus.PENDING,
+                    'flavour': flavour, 'quantity': 1, 'customer': self.user.id
+                })
+
+        self.router = self.app.extensions['replica_router']
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        # init_app registered an (empty) metadata for the bind on the shared db object
+        db.metadatas.pop('replica_0', None)
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+        for path in self.paths:
+            os.remove(path)
+
+
+
+    def headers(self, identity='TestUser'):
+        token = create_access_token(identity=identity, additional_claims={'user_id': self.user.id, 'is_staff': False})
+
+        return {"Authorization": f"Bearer {token}"}
+
+
+
+    def test_read_only_endpoints_read_from_replica(self):
+        assert self.client.get('orders/order/1', headers=self.headers()).json['flavour'] == 'Replica'
+
+        assert self.client.get(f'orders/user/{self.user.id}/order/1', headers=self.headers()).json['flavour'] == 'Replica'
+
+        assert self.client.get(f'orders/user/{self.user.id}/orders', headers=self.headers()).json[0]['flavour'] == 'Replica'
+
+
+
+    def test_writer_reads_own_write_from_primary(self):
+        response = self.client.put('orders/order/1', json={"size": "SMALL", "quantity": 3, "flavour": "Updated"}, headers=self.headers())
+
+        assert response.status_code == 200
+
+        assert self.client.get('orders/order/1', headers=self.headers()).json['flavour'] == 'Updated'
+
+        # other users still read from the (lagging) replica
+        assert self.client.get('orders/user/1/order/1', headers=self.headers('OtherUser')).json['flavour'] == 'Replica'
+
+
+
+    def test_falls_back_to_primary_when_replica_fails(self):
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(text('DROP TABLE orders'))
+
+        response = self.client.get('orders/order/1', headers=self.headers())
+
+        assert response.status_code == 200
+
+        assert response.json['flavour'] == 'Primary'
+
+        # skipped until REPLICA_RETRY_SECONDS pass
+        assert self.router.choose() is None
+
+
+
+    def test_writes_go_to_primary(self):
+        g.db_replica = 'replica_0'
+
+        try:
+            db.session.add(Order(size=Sizes.SMALL, quantity=1, flavour='Written', customer=self.user.id))
+            db.session.commit()
+        finally:
+            g.pop('db_replica')
+
+        with db.engines[None].connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM orders WHERE flavour = 'Written'")).scalar() == 1
+
+        with db.engines['replica_0'].connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM orders WHERE flavour = 'Written'")).scalar() == 0
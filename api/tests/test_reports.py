@@ -0,0 +1,122 @@
+import unittest
+from datetime import datetime
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from flask_jwt_extended import create_access_token
+from ..models.orders import Order
+from ..models.reports import OrderSummary, REPORT_DIMENSIONS
+from ..commands import rebuild_reports
+
+
+class ReportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.app.config['REPORTS_MATERIALIZED'] = True
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': 7, 'is_staff': True})
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Apple"}, headers=self.headers)
+        self.client.post('orders/orders', json={"size": "LARGE", "quantity": 3, "flavour": "Apple"}, headers=self.headers)
+        self.client.post('orders/bulk', json=[{"size": "SMALL", "quantity": 2, "flavour": "Banana"}], headers=self.headers)
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def report(self, group_by, source):
+        response = self.client.get(f'orders/reports/{group_by}?source={source}', headers=self.headers)
+
+        assert response.status_code == 200
+
+        return response.json
+
+
+
+    def test_live_report_groups_in_sql(self):
+        assert self.report('flavour', 'live') == [
+            {'bucket': 'Apple', 'orders': 2, 'quantity': 4},
+            {'bucket': 'Banana', 'orders': 1, 'quantity': 2}
+        ]
+
+        assert self.report('size', 'live') == [
+            {'bucket': 'SMALL', 'orders': 2, 'quantity': 3},
+            {'bucket': 'LARGE', 'orders': 1, 'quantity': 3}
+        ]
+
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+
+        assert self.report('day', 'live') == [{'bucket': today, 'orders': 3, 'quantity': 6}]
+
+
+
+    def test_summary_follows_status_changes_and_deletes(self):
+        self.client.patch('orders/order/status/1', json={"order_status": "IN_TRANSIT"}, headers=self.headers)
+        self.client.patch('orders/status/bulk', json=[
+            {"id": 2, "order_status": "IN_TRANSIT"}, {"id": 2, "order_status": "DELIVERED"}
+        ], headers=self.headers)
+        self.client.delete('orders/order/3', headers=self.headers)
+
+        for group_by in REPORT_DIMENSIONS:
+            assert self.report(group_by, 'summary') == self.report(group_by, 'live')
+
+        assert self.report('order_status', 'summary') == [
+            {'bucket': 'DELIVERED', 'orders': 1, 'quantity': 3},
+            {'bucket': 'IN_TRANSIT', 'orders': 1, 'quantity': 1}
+        ]
+
+
+
+    def test_rebuild_command_matches_live_reports(self):
+        OrderSummary.query.delete()
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(rebuild_reports)
+
+        assert result.exit_code == 0
+
+        for group_by in REPORT_DIMENSIONS:
+            assert self.report(group_by, 'summary') == self.report(group_by, 'live')
+
+
+
+    def test_long_flavours_are_summarized(self):
+        flavour = 'Apple ' * 20
+
+        response = self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": flavour}, headers=self.headers)
+
+        assert response.status_code == 201
+
+        assert {'bucket': flavour, 'orders': 1, 'quantity': 1} in self.report('flavour', 'summary')
+
+        assert OrderSummary.__table__.c.bucket.type.length is None
+
+
+
+    def test_unknown_report_is_404(self):
+        response = self.client.get('orders/reports/colour', headers=self.headers)
+
+        assert response.status_code == 404
@@ -0,0 +1,106 @@
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.cache import get_response_cache
+from flask_jwt_extended import create_access_token
+from ..models.orders import Order
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=config_dict['test'])
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        token = create_access_token(identity='TestUser')
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+
+
+    def test_repeated_read_is_served_from_cache(self):
+        Order(size='SMALL', quantity=1, flavour='Apple').save()
+
+        first = self.client.get('orders/order/1', headers=self.headers)
+        second = self.client.get('orders/order/1', headers=self.headers)
+
+        assert first.headers['X-Cache'] == 'MISS'
+
+        assert second.headers['X-Cache'] == 'HIT'
+
+        assert second.json == first.json
+
+        cache = get_response_cache()
+
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get('orders/orders', headers=self.headers)
+
+        headers = dict(self.headers, **{'If-None-Match': response.headers['ETag']})
+
+        response = self.client.get('orders/orders', headers=headers)
+
+        assert response.status_code == 304
+
+        assert response.data == b''
+
+
+
+    def test_writes_invalidate_cached_reads(self):
+        self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Apple"}, headers=self.headers)
+
+        assert len(self.client.get('orders/orders', headers=self.headers).json) == 1
+
+        self.client.post('orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": "Banana"}, headers=self.headers)
+
+        response = self.client.get('orders/orders', headers=self.headers)
+
+        assert response.headers['X-Cache'] == 'MISS'
+
+        assert len(response.json) == 2
+
+        assert self.client.get('orders/order/1', headers=self.headers).json['order_status'] == 'PENDING'
+
+        self.client.patch('orders/order/status/1', json={"order_status": "IN_TRANSIT"}, headers=self.headers)
+
+        assert self.client.get('orders/order/1', headers=self.headers).json['order_status'] == 'IN_TRANSIT'
+
+        # an unrelated order's cached entry survives
+        self.client.get('orders/order/2', headers=self.headers)
+
+        self.client.patch('orders/order/status/1', json={"order_status": "DELIVERED"}, headers=self.headers)
+
+        assert self.client.get('orders/order/2', headers=self.headers).headers['X-Cache'] == 'HIT'
+
+
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.client.get('orders/orders?limit=1', headers=self.headers)
+
+        response = self.client.get('orders/orders?limit=2', headers=self.headers)
+
+        assert response.headers['X-Cache'] == 'MISS'
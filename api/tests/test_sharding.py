@@ -0,0 +1,270 @@
+import json
+import os
+import tempfile
+import unittest
+from flask import g
+from sqlalchemy import func, select
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.sharding import create_shard_tables
+from ..models.orders import Order
+from ..models.shards import ShardCustomer, ShardOrder
+from ..models.users import User
+from flask_jwt_extended import create_access_token
+
+
+class ShardingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = []
+
+        for _ in range(3):
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            self.paths.append(path)
+
+        primary, shard_0, shard_1 = self.paths
+
+        class ShardConfig(config_dict['test']):
+            SQLALCHEMY_ECHO = False
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+            SQLALCHEMY_BINDS = {'shard_0': 'sqlite:///' + shard_0, 'shard_1': 'sqlite:///' + shard_1}
+
+        self.app = create_app(config=ShardConfig)
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        for shard in ['shard_0', 'shard_1']:
+            create_shard_tables(db.engines[shard])
+
+        self.first = User(username='First', email='first@gmail.com', password_hash='hash')
+        self.first.save()
+
+        self.second = User(username='Second', email='second@gmail.com', password_hash='hash')
+        self.second.save()
+
+        # the first user is placed by hash (shard_1) on their first order, the second is pinned
+        db.session.add(ShardCustomer(customer=self.second.id, shard='shard_0'))
+        db.session.commit()
+
+        self.router = self.app.extensions['shard_router']
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        # init_app registered an (empty) metadata for each bind on the shared db object
+        db.metadatas.pop('shard_0', None)
+        db.metadatas.pop('shard_1', None)
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+        for path in self.paths:
+            os.remove(path)
+
+
+
+    def headers(self, user):
+        # the test client shares this app context, so the cached user id must not leak between users
+        g.pop('current_user_id', None)
+
+        token = create_access_token(identity=user.username, additional_claims={'user_id': user.id, 'is_staff': True})
+
+        return {"Authorization": f"Bearer {token}"}
+
+
+
+    # To count the orders stored on a shard
+    def stored(self, shard):
+        with db.engines[shard].connect() as connection:
+            return connection.execute(select(func.count()).select_from(Order.__table__)).scalar()
+
+
+
+    def create(self, user, flavour):
+        response = self.client.post(
+            'orders/orders', json={"size": "SMALL", "quantity": 1, "flavour": flavour}, headers=self.headers(user)
+        )
+
+        assert response.status_code == 201
+
+        return response.json['id']
+
+
+
+    # Test that orders are written to their customer's shard and every handler finds them there
+    def test_orders_follow_their_customer(self):
+
+        first_id = self.create(self.first, 'Apple')
+        second_id = self.create(self.second, 'Banana')
+
+        assert first_id != second_id
+
+        assert (self.stored('shard_0'), self.stored('shard_1')) == (1, 1)
+
+        assert db.session.get(ShardCustomer, self.first.id).shard == 'shard_1'
+
+        assert self.router.order_shards([first_id, second_id]) == {first_id: 'shard_1', second_id: 'shard_0'}
+
+        headers = self.headers(self.first)
+
+        assert self.client.get(f'orders/order/{first_id}', headers=headers).json['flavour'] == 'Apple'
+
+        assert self.client.get(f'orders/user/{self.first.id}/order/{first_id}', headers=headers).status_code == 200
+
+        assert [order['id'] for order in self.client.get(f'orders/user/{self.second.id}/orders', headers=headers).json] == [second_id]
+
+        response = self.client.put(
+            f'orders/order/{first_id}', json={"size": "LARGE", "quantity": 2, "flavour": "Cherry"}, headers=headers
+        )
+
+        assert response.status_code == 200
+
+        response = self.client.patch(f'orders/order/status/{first_id}', json={"order_status": "IN_TRANSIT"}, headers=headers)
+
+        assert response.json['order_status'] == 'IN_TRANSIT'
+
+        assert self.client.delete(f'orders/order/{second_id}', headers=self.headers(self.second)).status_code == 200
+
+        assert self.stored('shard_0') == 0
+
+        assert self.router.order_shards([second_id]) == {}
+
+
+
+    # Test that the admin listing, bulk status update and export cover every shard
+    def test_cross_shard_operations(self):
+
+        ids = [
+            self.create(user, flavour)
+            for user, flavour in [(self.first, 'Apple'), (self.second, 'Banana'), (self.first, 'Cherry')]
+        ]
+
+        headers = self.headers(self.first)
+
+        response = self.client.get('orders/orders?limit=2', headers=headers)
+
+        assert [order['id'] for order in response.json] == ids[:2]
+
+        cursor = response.headers['X-Next-Cursor']
+
+        response = self.client.get(f'orders/orders?limit=2&after={cursor}', headers=headers)
+
+        assert [order['id'] for order in response.json] == ids[2:]
+
+        assert 'X-Next-Cursor' not in response.headers
+
+        response = self.client.get(f'orders/orders?customer={self.second.id}', headers=headers)
+
+        assert [order['id'] for order in response.json] == [ids[1]]
+
+        data = [{"id": order_id, "order_status": "IN_TRANSIT"} for order_id in ids]
+
+        response = self.client.patch('orders/status/bulk', json=data, headers=headers)
+
+        assert [result['status'] for result in response.json] == [200, 200, 200]
+
+        response = self.client.get('orders/export', headers=headers)
+
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+
+        assert [(row['id'], row['order_status']) for row in rows] == [(order_id, 'IN_TRANSIT') for order_id in ids]
+
+
+
+    # Test that rebalancing moves whole customers and their orders stay reachable
+    def test_rebalance_moves_customers(self):
+
+        ids = [self.create(self.first, flavour) for flavour in ['Apple', 'Banana']]
+
+        extra = User(username='Third', email='third@gmail.com', password_hash='hash')
+        extra.save()
+
+        db.session.add(ShardCustomer(customer=extra.id, shard='shard_1'))
+        db.session.commit()
+
+        ids.append(self.create(extra, 'Cherry'))
+
+        assert (self.stored('shard_0'), self.stored('shard_1')) == (0, 3)
+
+        # moving the biggest customer that does not overshoot
+        assert self.router.plan_rebalance() == [(self.first.id, 'shard_1', 'shard_0', 2)]
+
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=['shards', 'rebalance'])
+
+        assert 'Made 1 moves' in result.output
+
+        assert (self.stored('shard_0'), self.stored('shard_1')) == (2, 1)
+
+        assert set(self.router.order_shards(ids[:2]).values()) == {'shard_0'}
+
+        headers = self.headers(self.first)
+
+        assert self.client.get(f'orders/order/{ids[0]}', headers=headers).json['flavour'] == 'Apple'
+
+        result = runner.invoke(args=['shards', 'move', str(self.first.id), 'shard_1'])
+
+        assert 'Moved 2 orders' in result.output
+
+        assert self.client.get(f'orders/order/{ids[0]}', headers=headers).json['flavour'] == 'Apple'
+
+
+
+    # Test that a move only deletes source rows exactly as they were copied
+    def test_move_keeps_orders_changed_during_the_copy(self):
+
+        ids = [self.create(self.first, flavour) for flavour in ['Apple', 'Banana']]
+
+        copied = self.router.copy_orders(self.first.id, 'shard_1', 'shard_0', {})
+
+        # a request routed to the source before the switch changes an order after it was copied
+        with db.engines['shard_1'].begin() as connection:
+            orders = Order.__table__
+            connection.execute(orders.update().where(orders.c.id == ids[0]).values(flavour='Cherry', version=orders.c.version + 1))
+
+        assert self.router.delete_copied('shard_1', copied) == {ids[1]}
+
+        assert self.stored('shard_1') == 1
+
+        assert self.router.move_customer(self.first.id, 'shard_0') == 1
+
+        assert (self.stored('shard_0'), self.stored('shard_1')) == (2, 0)
+
+        headers = self.headers(self.first)
+
+        assert self.client.get(f'orders/order/{ids[0]}', headers=headers).json['flavour'] == 'Cherry'
+
+
+
+    # Test that an order whose directory row was never committed is still found on its shard
+    def test_orders_missing_from_the_directory_are_found(self):
+
+        order_id = self.create(self.second, 'Apple')
+
+        # the shard committed the order, the primary lost the directory row
+        ShardOrder.query.filter_by(id=order_id).delete()
+        db.session.commit()
+
+        assert self.router.locate([order_id, order_id + 100]) == {order_id: 'shard_0'}
+
+        headers = self.headers(self.second)
+
+        assert self.client.get(f'orders/order/{order_id}', headers=headers).json['flavour'] == 'Apple'
+
+        response = self.client.patch('orders/status/bulk', json=[{"id": order_id, "order_status": "IN_TRANSIT"}], headers=headers)
+
+        assert [result['status'] for result in response.json] == [200]
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+
+
+# Seconds `import api` may take in a fresh interpreter, raise it on slow CI machines
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', 2.0))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Function to run `code` in a new interpreter and return what it prints as JSON
+def run_fresh(code):
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, env=os.environ, capture_output=True, text=True, check=True
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def test_import_time_is_within_budget(self):
+        result = run_fresh(
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import api\n"
+            "print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))"
+        )
+
+        assert result['seconds'] < IMPORT_TIME_BUDGET, f"import api took {result['seconds']:.2f}s"
+
+        # only imported by the backends that use them
+        assert 'redis' not in result['modules']
+
+        assert 'flask_migrate' not in result['modules']
+
+
+
+    def test_migrate_is_only_loaded_when_enabled(self):
+        result = run_fresh(
+            "import json, sys\n"
+            "from api import create_app\n"
+            "from api.config.config import config_dict\n"
+            "create_app(config=config_dict['test'])\n"
+            "print(json.dumps('alembic' in sys.modules))"
+        )
+
+        assert result is False
+
+
+
+    def test_docs_and_shell_context_can_be_disabled(self):
+        class LeanConfig(config_dict['test']):
+            SWAGGER_DOCS_ENABLED = False
+            SHELL_CONTEXT_ENABLED = False
+
+        app = create_app(config=LeanConfig)
+
+        client = app.test_client()
+
+        assert client.get('/swagger.json').status_code == 404
+
+        assert 'make_shell_context' not in [processor.__name__ for processor in app.shell_context_processors]
+
+        assert create_app(config=config_dict['test']).test_client().get('/swagger.json').status_code == 200
+
+
+
+    def test_startup_profile_records_phases(self):
+        class ProfiledConfig(config_dict['test']):
+            STARTUP_PROFILE = True
+
+        with self.assertLogs('api', level='INFO') as logs:
+            app = create_app(config=ProfiledConfig)
+
+        phases = [name for name, _ in app.extensions['startup_profile'].phases]
+
+        assert phases == ['imports', 'config', 'database', 'extensions', 'jwt', 'cli', 'routes']
+
+        assert 'startup total' in logs.output[-1]
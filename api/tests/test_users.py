@@ -6,6 +6,8 @@ from ..config.config import config_dict
 from ..utils import db
 from werkzeug.security import generate_password_hash
 from ..models.users import User
+from flask_jwt_extended import decode_token
+from ..utils.hashing import PasswordHasher
 
 class UserTestCase(unittest.TestCase):
 
@@ -66,5 +68,83 @@ class UserTestCase(unittest.TestCase):
         assert response.status_code == 200
 
 
-    
-    
\ No newline at end of file
+
+    def test_login_token_carries_user_claims(self):
+        user = User(username='TestUser', email='test@gmail.com', password_hash=generate_password_hash('password'))
+        user.save()
+
+        data = {
+            "email": "test@gmail.com",
+            "password": "password"
+        }
+
+        response = self.client.post('/auth/login', json=data)
+
+        assert response.status_code == 201
+
+        claims = decode_token(response.json['access_token'])
+
+        assert claims['sub'] == 'TestUser'
+
+        assert claims['user_id'] == user.id
+
+        assert claims['is_staff'] is False
+
+        headers = {
+            "Authorization": f"Bearer {response.json['refresh_token']}"
+        }
+
+        response = self.client.post('/auth/refresh', headers=headers)
+
+        assert decode_token(response.json['access_token'])['user_id'] == user.id
+
+
+
+    def test_login_rehashes_outdated_password_hash(self):
+        old_hash = generate_password_hash('password', 'pbkdf2:sha256:1000')
+
+        user = User(username='TestUser', email='test@gmail.com', password_hash=old_hash)
+        user.save()
+
+        data = {
+            "email": "test@gmail.com",
+            "password": "password"
+        }
+
+        response = self.client.post('/auth/login', json=data)
+
+        assert response.status_code == 201
+
+        assert user.password_hash != old_hash
+
+        assert user.password_hash.startswith('pbkdf2:sha256:260000$')
+
+
+
+    def test_signup_returns_503_when_hashing_pool_is_saturated(self):
+        hasher = PasswordHasher(max_pending=1, retry_after=3)
+        self.app.extensions['password_hasher'] = hasher
+
+        # another request holds the only slot
+        hasher._slots.acquire()
+
+        data = {
+            "username": "TestUser",
+            "email": "test@gmail.com",
+            "password": "password"
+        }
+
+        response = self.client.post('/auth/signup', json=data)
+
+        assert response.status_code == 503
+
+        assert response.headers['Retry-After'] == '3'
+
+        assert User.query.count() == 0
+
+
+
+    def test_hashing_without_cap(self):
+        hasher = PasswordHasher(iterations=1000, max_pending=0)
+
+        assert hasher.verify(hasher.hash('password'), 'password')
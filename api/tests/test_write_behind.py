@@ -0,0 +1,162 @@
+import os
+import tempfile
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..utils.write_behind import OrderJournal, OrderWriteBehind
+from ..models.orders import Order, Sizes
+from ..models.users import User
+from flask_jwt_extended import create_access_token
+
+
+class WriteBehindTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+
+        class WriteBehindConfig(config_dict['test']):
+            ORDER_WRITE_BEHIND = True
+            ORDER_QUEUE_WORKER = False
+            ORDER_QUEUE_PATH = self.path
+
+        self.app = create_app(config=WriteBehindConfig)
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+        self.user = User(username='TestUser', email='test@gmail.com', password_hash='hash')
+        self.user.save()
+
+        token = create_access_token(identity='TestUser', additional_claims={'user_id': self.user.id, 'is_staff': False})
+
+        self.headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        self.queue = self.app.extensions['order_queue']
+
+
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.queue.journal.close()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+
+    def test_order_is_accepted_then_flushed(self):
+        response = self.client.post('orders/orders', json={"size": "LARGE", "quantity": 2, "flavour": "Apple"}, headers=self.headers)
+
+        assert response.status_code == 202
+
+        ref = response.json['ref']
+
+        assert response.headers['Location'].endswith(f'/orders/queued/{ref}')
+
+        assert Order.query.count() == 0
+
+        assert self.client.get(f'orders/queued/{ref}', headers=self.headers).json['status'] == 'queued'
+
+        assert self.queue.drain() == 1
+
+        order = Order.query.one()
+
+        assert (order.size, order.quantity, order.customer, order.queue_ref) == (Sizes.LARGE, 2, self.user.id, ref)
+
+        response = self.client.get(f'orders/queued/{ref}', headers=self.headers)
+
+        assert response.json['status'] == 'stored'
+
+        assert response.json['id'] == order.id
+
+        assert response.headers['Location'].endswith(f'/orders/order/{order.id}')
+
+
+
+    def test_invalid_order_is_rejected_before_queueing(self):
+        response = self.client.post('orders/orders', json={"size": "HUGE", "quantity": 1, "flavour": "Apple"}, headers=self.headers)
+
+        assert response.status_code == 400
+
+        assert self.queue.journal.pending_count() == 0
+
+
+
+    def test_replay_after_crash_does_not_insert_twice(self):
+        first = self.queue.enqueue({"size": "SMALL", "quantity": 1, "flavour": "Apple"}, self.user.id)
+        self.queue.enqueue({"size": "SMALL", "quantity": 1, "flavour": "Pear"}, self.user.id)
+
+        # the first entry reached the database, then the process died before marking it flushed
+        Order(size=Sizes.SMALL, quantity=1, flavour='Apple', customer=self.user.id, queue_ref=first).save()
+
+        restarted = OrderWriteBehind(OrderJournal(self.path))
+
+        try:
+            assert restarted.drain() == 2
+        finally:
+            restarted.journal.close()
+
+        assert sorted(order.flavour for order in Order.query) == ['Apple', 'Pear']
+
+        assert self.queue.journal.get(first)['order_id'] == Order.query.filter_by(queue_ref=first).one().id
+
+
+
+    def test_other_users_cannot_see_queued_orders(self):
+        ref = self.queue.enqueue({"size": "SMALL", "quantity": 1, "flavour": "Apple"}, self.user.id)
+
+        token = create_access_token(identity='Other', additional_claims={'user_id': self.user.id + 1, 'is_staff': False})
+
+        response = self.client.get(f'orders/queued/{ref}', headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 404
+
+
+
+    def test_bad_entry_is_dead_lettered_without_blocking_others(self):
+        self.queue.enqueue({"size": "SMALL", "quantity": 1, "flavour": "Apple"}, self.user.id)
+        bad = self.queue.enqueue({"size": "HUGE", "quantity": 1, "flavour": "Pear"}, self.user.id)
+        self.queue.enqueue({"size": "LARGE", "quantity": 1, "flavour": "Plum"}, self.user.id)
+
+        assert self.queue.drain() == 3
+
+        assert sorted(order.flavour for order in Order.query) == ['Apple', 'Plum']
+
+        # retried later, with backoff
+        response = self.client.get(f'orders/queued/{bad}', headers=self.headers)
+
+        assert (response.json['status'], response.json['attempts']) == ('queued', 1)
+
+        assert 'HUGE' in response.json['error']
+
+        self.queue.max_attempts = 2
+        self.queue.journal._connection.execute('UPDATE queued_orders SET claimed_until = NULL')
+
+        assert self.queue.drain() == 1
+
+        response = self.client.get(f'orders/queued/{bad}', headers=self.headers)
+
+        assert (response.json['status'], response.json['attempts']) == ('failed', 2)
+
+        assert self.queue.journal.pending_count() == 0
+
+        assert self.queue.journal.retry_failed() == 1
+
+        assert self.queue.journal.pending_count() == 1
@@ -1,3 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from .routing import RoutingSession
 
-db = SQLAlchemy()
\ No newline at end of file
+# RoutingSession sends order statements to their shard and the reads of @read_replica handlers to a replica
+db = SQLAlchemy(session_options={'class_': RoutingSession})
@@ -0,0 +1,176 @@
+import time
+from collections import OrderedDict
+from datetime import timezone
+from threading import Lock
+from flask import current_app
+from ..models.blacklist import TokenBlocklist
+
+
+# Bounded in-process set of revoked JTIs, each kept until its token expires
+class LocalRevocationStore:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        # While an evicted JTI has not expired this set does not hold every
+        # revoked token, so until then a miss has to be confirmed against the database
+        self._incomplete_until = 0
+
+
+    @property
+    def complete(self):
+        return time.time() >= self._incomplete_until
+
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._entries[jti] = expires_at
+            self._entries.move_to_end(jti)
+
+            if len(self._entries) > self.max_size:
+                self._evict()
+
+
+    def contains(self, jti):
+        with self._lock:
+            expires_at = self._entries.get(jti)
+
+            if expires_at is None:
+                return False
+
+            if expires_at <= time.time():
+                del self._entries[jti]
+                return False
+
+            return True
+
+
+    def _evict(self):
+        now = time.time()
+
+        for jti in [jti for jti, expires_at in self._entries.items() if expires_at <= now]:
+            del self._entries[jti]
+
+        # tokens of one type share a lifetime, so the oldest revocation is about the first to expire
+        while len(self._entries) > self.max_size:
+            _, expires_at = self._entries.popitem(last=False)
+            self._incomplete_until = max(self._incomplete_until, expires_at)
+
+
+
+# Shared store so every worker sees a logout as soon as it happens
+class RedisRevocationStore:
+
+    complete = True
+
+    def __init__(self, url=None, client=None, prefix='revoked:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+
+
+    def add(self, jti, expires_at):
+        ttl = max(int(expires_at - time.time()), 1)
+        self.client.set(self.prefix + jti, 1, ex=ttl)
+
+
+    def contains(self, jti):
+        return bool(self.client.exists(self.prefix + jti))
+
+
+
+class RevocationCache:
+    """
+    Answers "is this token revoked?" without a query for tokens that are not.
+
+    Revoked JTIs are loaded from the token_blocklist table on first use and
+    written through on logout. Without Redis, other workers' logouts are picked
+    up by an incremental sync (one indexed query) every `sync_interval`
+    seconds, so a revoked token keeps working that long on other workers.
+
+    Access and refresh JTIs are kept apart, so evicting a refresh token (which
+    stays valid for weeks) only sends refresh token misses to the database.
+
+    """
+
+    def __init__(self, max_size=10000, default_ttl=3600, sync_interval=1, redis_url=None, redis_client=None):
+        self.local = {'access': LocalRevocationStore(max_size), 'refresh': LocalRevocationStore(max_size)}
+        self.remote = None
+        self.default_ttl = default_ttl
+        self.sync_interval = sync_interval
+        self.last_id = None
+        self.last_sync = 0
+
+        if redis_url or redis_client is not None:
+            self.remote = RedisRevocationStore(url=redis_url, client=redis_client)
+
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_size=config['REVOCATION_CACHE_SIZE'],
+            default_ttl=int(config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds()),
+            sync_interval=config['REVOCATION_CACHE_SYNC_SECONDS'],
+            redis_url=config['REDIS_URL']
+        )
+
+
+    # To record a revoked token until it expires
+    def revoke(self, jti, expires_at=None, token_type='access'):
+        if expires_at is None:
+            expires_at = time.time() + self.default_ttl
+
+        self.local[token_type].add(jti, expires_at)
+
+        if self.remote is not None:
+            self.remote.add(jti, expires_at)
+
+
+    # To load unexpired blocklist rows added since the last sync (all of them on first use)
+    def sync(self):
+        query = TokenBlocklist.active().with_entities(
+            TokenBlocklist.id, TokenBlocklist.jti, TokenBlocklist.type, TokenBlocklist.expires_at
+        )
+
+        if self.last_id is not None:
+            query = query.filter(TokenBlocklist.id > self.last_id)
+
+        for row_id, jti, token_type, expires_at in query.order_by(TokenBlocklist.id):
+            self.revoke(jti, expires_at.replace(tzinfo=timezone.utc).timestamp(), token_type)
+            self.last_id = row_id
+
+        if self.last_id is None:
+            self.last_id = 0
+
+        self.last_sync = time.time()
+
+
+    def is_revoked(self, jti, token_type='access'):
+        local = self.local[token_type]
+
+        if self.last_id is None or (
+            self.remote is None and self.sync_interval and time.time() - self.last_sync > self.sync_interval
+        ):
+            self.sync()
+
+        if local.contains(jti):
+            return True
+
+        if self.remote is not None:
+            return self.remote.contains(jti)
+
+        if local.complete:
+            return False
+
+        return TokenBlocklist.active().filter_by(jti=jti, type=token_type).first() is not None
+
+
+
+# Function to get the revocation cache of the running app
+def get_revocation_cache():
+    return current_app.extensions['revocation_cache']
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from flask import Response, current_app, g, request
+from flask_jwt_extended import get_jwt_identity
+from flask_restx.representations import output_json
+from flask_restx.utils import unpack
+
+
+# In-process LRU store, only safe for a single worker process
+class LRUCacheBackend:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+
+            if item is None:
+                return None
+
+            value, expires_at = item
+
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def incr(self, key):
+        with self._lock:
+            value = (self._entries.get(key, (0, None))[0] or 0) + 1
+            self._entries[key] = (value, None)
+            self._entries.move_to_end(key)
+            return value
+
+
+
+# Shared store for multi-worker deployments
+class RedisCacheBackend:
+
+    def __init__(self, url=None, client=None, prefix='cache:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+
+    def get_many(self, keys):
+        return [None if value is None else json.loads(value) for value in self.client.mget([self.prefix + key for key in keys])]
+
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+
+class ResponseCache:
+    """
+    Caches rendered GET responses keyed on route, user and query parameters.
+
+    Each entry also depends on the version of its tags ('orders', 'order:<id>',
+    'user:<id>'); bumping a tag's version on write makes every entry built from
+    it unreachable, so invalidation is exact without tracking keys.
+
+    """
+
+    def __init__(self, backend, ttl=300, replica_ttl=5):
+        self.backend = backend
+        self.ttl = ttl
+        self.replica_ttl = replica_ttl
+        self.hits = 0
+        self.misses = 0
+
+
+    @classmethod
+    def from_config(cls, config):
+        if config['RESPONSE_CACHE_BACKEND'] == 'redis':
+            backend = RedisCacheBackend(url=config['REDIS_URL'])
+        else:
+            backend = LRUCacheBackend(max_entries=config['RESPONSE_CACHE_SIZE'])
+
+        return cls(backend, ttl=config['RESPONSE_CACHE_TTL'], replica_ttl=config['REPLICA_CACHE_TTL'])
+
+
+    def key(self, tags):
+        versions = self.backend.get_many([f'tag:{tag}' for tag in tags])
+
+        parts = [
+            request.path,
+            str(get_jwt_identity()),
+            json.dumps(sorted(request.args.items(multi=True))),
+            json.dumps(list(zip(tags, versions)))
+        ]
+
+        return 'response:' + hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(f'tag:{tag}')
+
+
+    # To drop every cached response that could include this order
+    def invalidate_order(self, order_id=None, customer=None):
+        tags = ['orders']
+
+        if order_id is not None:
+            tags.append(f'order:{order_id}')
+
+        if customer is not None:
+            tags.append(f'user:{customer}')
+
+        self.invalidate(*tags)
+
+
+
+# Function to get the response cache of the running app
+def get_response_cache():
+    return current_app.extensions['response_cache']
+
+
+
+def strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+
+# Function to tell whether an If-None-Match header matches an ETag (weak comparison)
+def etag_matches(header, etag):
+    if not header:
+        return False
+
+    candidates = [strip_weak(candidate.strip()) for candidate in header.split(',')]
+
+    return '*' in candidates or strip_weak(etag) in candidates
+
+
+
+# Function to turn what a handler returned into (response, data), data is None for ready-made responses
+def render_result(result):
+    if isinstance(result, Response):
+        return result, None
+
+    data, code, headers = unpack(result)
+
+    response = output_json(data, code, headers)
+    response.mimetype = 'application/json'
+
+    return response, data
+
+
+
+# Decorator to cache a GET handler's 200 responses, tags are formatted with the view arguments
+def cached_response(*tags, etag=None):
+
+    def decorator(fn):
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+
+            # versions are read before the handler runs, so a write racing with
+            # it leaves the new entry under the old versions where nobody looks
+            key = cache.key([tag.format(**kwargs) for tag in tags])
+            entry = cache.backend.get(key)
+
+            if entry is None:
+                cache.misses += 1
+
+                response, data = render_result(fn(*args, **kwargs))
+
+                if response.status_code != 200:
+                    return response
+
+                body = response.get_data(as_text=True)
+
+                entry = {
+                    'body': body,
+                    'etag': etag(data) if etag and data is not None else '"%s"' % hashlib.sha1(body.encode()).hexdigest(),
+                    'headers': {
+                        name: value for name, value in response.headers.items()
+                        if name not in ('Content-Type', 'Content-Length')
+                    }
+                }
+
+                # a replica may not have the write that bumped the versions yet
+                cache.backend.set(key, entry, cache.replica_ttl if g.get('db_replica') else cache.ttl)
+                status = 'MISS'
+            else:
+                cache.hits += 1
+                status = 'HIT'
+
+            headers = dict(entry['headers'], ETag=entry['etag'])
+            headers['X-Cache'] = status
+
+            if etag_matches(request.headers.get('If-None-Match'), entry['etag']):
+                return Response(status=304, headers=headers)
+
+            return Response(entry['body'], 200, headers=headers, mimetype='application/json')
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,179 @@
+import time
+import zlib
+from flask import current_app, request
+
+
+# gzip through zlib, sync-flushed per chunk when streaming so clients get each chunk as it is produced
+class GzipEncoder:
+
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+
+    def compressor(self):
+        # wbits 31: deflate with a gzip header and trailer
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+
+    def compress(self, data):
+        compressor = self.compressor()
+
+        return compressor.compress(data) + compressor.flush()
+
+
+    def compress_stream(self, chunks):
+        compressor = self.compressor()
+
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+            if data:
+                yield data
+
+        yield compressor.flush()
+
+
+
+# Brotli, needs the optional brotli package
+class BrotliEncoder:
+
+    name = 'br'
+
+    def __init__(self, quality=4):
+        import brotli
+        self.brotli = brotli
+        self.quality = quality
+
+
+    def compress(self, data):
+        return self.brotli.compress(data, quality=self.quality)
+
+
+    def compress_stream(self, chunks):
+        compressor = self.brotli.Compressor(quality=self.quality)
+
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+
+            if data:
+                yield data
+
+        yield compressor.finish()
+
+
+
+class ResponseCompressor:
+    """
+    Compresses responses for clients that send Accept-Encoding.
+
+    Bodies under `min_size` bytes are sent as they are, compressing them
+    costs more CPU than the bytes it saves. Streamed responses (the CSV
+    export) are compressed chunk by chunk instead of being buffered.
+
+    The same representation has different bytes per encoding, so ETags of
+    compressed responses are made weak; If-None-Match compares weakly.
+
+    """
+
+    def __init__(self, encoders, min_size=1024, mimetypes=('application/json',)):
+        self.encoders = {encoder.name: encoder for encoder in encoders}
+        self.min_size = min_size
+        self.mimetypes = set(mimetypes)
+
+
+    @classmethod
+    def from_config(cls, config):
+        encoders = []
+
+        if config['COMPRESSION_BROTLI_QUALITY'] is not None:
+            try:
+                encoders.append(BrotliEncoder(config['COMPRESSION_BROTLI_QUALITY']))
+            except ImportError:
+                # brotli is optional, gzip only without it
+                pass
+
+        encoders.append(GzipEncoder(config['COMPRESSION_GZIP_LEVEL']))
+
+        return cls(encoders, min_size=config['COMPRESSION_MIN_SIZE'], mimetypes=config['COMPRESSION_MIMETYPES'])
+
+
+    # To pick the encoder the client prefers among ours, None for identity
+    def negotiate(self, accept_encodings):
+        name = accept_encodings.best_match(list(self.encoders))
+
+        return self.encoders.get(name)
+
+
+    def compress(self, response, accept_encodings):
+        if response.mimetype not in self.mimetypes or 'Content-Encoding' in response.headers:
+            return response
+
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+
+        # caches must keep one copy per encoding, even of responses sent uncompressed
+        response.vary.add('Accept-Encoding')
+
+        encoder = self.negotiate(accept_encodings)
+
+        if encoder is None:
+            return response
+
+        if response.is_streamed:
+            response.response = encoder.compress_stream(response.iter_encoded())
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+
+            if len(data) < self.min_size:
+                return response
+
+            response.set_data(encoder.compress(data))
+
+        response.headers['Content-Encoding'] = encoder.name
+
+        etag = response.headers.get('ETag')
+
+        if etag and not etag.startswith('W/'):
+            response.headers['ETag'] = 'W/' + etag
+
+        return response
+
+
+
+# Function to compress responses of the app (COMPRESSION_ENABLED)
+def init_compression(app):
+    compressor = ResponseCompressor.from_config(app.config)
+    app.extensions['response_compressor'] = compressor
+
+
+    @app.after_request
+    def compress_response(response):
+        return compressor.compress(response, request.accept_encodings)
+
+
+
+# Function to let clients revalidate /swagger.json instead of downloading it again,
+# the spec only changes when the app is restarted
+def init_spec_revalidation(app):
+    started_at = time.time()
+
+
+    @app.after_request
+    def conditional_spec(response):
+        if request.endpoint != 'specs' or response.status_code != 200:
+            return response
+
+        response.add_etag()
+        response.last_modified = started_at
+        response.cache_control.no_cache = True
+
+        return response.make_conditional(request)
+
+
+
+# Function to get the response compressor of the running app
+def get_response_compressor():
+    return current_app.extensions['response_compressor']
@@ -0,0 +1,70 @@
+from sqlalchemy import event, func, select
+from . import db
+
+
+# Function to apply the configured PRAGMAs to every new SQLite connection
+def sqlite_pragma_listener(pragmas):
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+
+        cursor.close()
+
+    return set_pragmas
+
+
+
+# Function to hook engine connect events for the app's engines
+def configure_engines(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+
+    if not pragmas:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
+
+
+
+# Function to insert rows of `model` in a few statements instead of one per row, fills in each mapping's id
+def insert_many(model, mappings, chunk_size=100):
+    table = model.__table__
+
+    if not mappings:
+        return []
+
+    if all(mapping.get('id') is not None for mapping in mappings):
+        # one executemany, batched into multi-row INSERTs on PostgreSQL
+        db.session.execute(table.insert(), mappings)
+
+        return [mapping['id'] for mapping in mappings]
+
+    if db.session.get_bind(clause=table.insert()).dialect.name == 'postgresql':
+        # reserve every ID in one query, then insert as above
+        sequence = func.pg_get_serial_sequence(table.name, 'id')
+        new_ids = db.session.execute(
+            select(func.nextval(sequence)).select_from(func.generate_series(1, len(mappings)))
+        ).scalars().all()
+
+        for mapping, new_id in zip(mappings, new_ids):
+            mapping['id'] = new_id
+
+        return insert_many(model, mappings)
+
+    # SQLite numbers the rows of one INSERT consecutively (writers are serialised),
+    # chunked to stay under its limit of bound parameters per statement
+    for start in range(0, len(mappings), chunk_size):
+        chunk = mappings[start:start + chunk_size]
+        last_id = db.session.execute(table.insert().values(chunk)).lastrowid
+
+        for offset, mapping in enumerate(chunk, start=1 - len(chunk)):
+            mapping['id'] = last_id + offset
+
+    return [mapping['id'] for mapping in mappings]
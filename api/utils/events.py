@@ -0,0 +1,210 @@
+import json
+import time
+from collections import deque
+from threading import BoundedSemaphore, Condition
+from flask import current_app
+
+
+# Ring buffer of recent events in this process, only reaches streams served by the same worker
+class MemoryEventBackend:
+
+    def __init__(self, max_events=1000):
+        self._events = deque(maxlen=max_events)
+        self._last_id = 0
+        self._condition = Condition()
+
+
+    def publish(self, channel, data):
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, channel, data))
+            self._condition.notify_all()
+
+            return str(self._last_id)
+
+
+    def last_id(self, channel):
+        return str(self._last_id)
+
+
+    # To wait up to `timeout` seconds for events of a channel after `after`, returns [(id, data)]
+    def read(self, channel, after, timeout):
+        after = int(after) if str(after).isdigit() else 0
+        deadline = time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                events = [(str(event_id), data) for event_id, name, data in self._events if event_id > after and name == channel]
+
+                remaining = deadline - time.monotonic()
+
+                if events or remaining <= 0:
+                    return events
+
+                self._condition.wait(remaining)
+
+
+
+# Redis stream per channel, so every worker sees every event and clients can resume
+class RedisEventBackend:
+
+    def __init__(self, url=None, client=None, prefix='events:', max_events=1000):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self.max_events = max_events
+
+
+    def publish(self, channel, data):
+        event_id = self.client.xadd(
+            self.prefix + channel, {'data': json.dumps(data)}, maxlen=self.max_events, approximate=True
+        )
+
+        return event_id.decode() if isinstance(event_id, bytes) else event_id
+
+
+    def last_id(self, channel):
+        entries = self.client.xrevrange(self.prefix + channel, count=1)
+
+        if not entries:
+            return '0-0'
+
+        event_id = entries[0][0]
+
+        return event_id.decode() if isinstance(event_id, bytes) else event_id
+
+
+    def read(self, channel, after, timeout):
+        response = self.client.xread({self.prefix + channel: after or '0-0'}, block=max(int(timeout * 1000), 1))
+        events = []
+
+        for _, entries in response or []:
+            for event_id, fields in entries:
+                event_id = event_id.decode() if isinstance(event_id, bytes) else event_id
+                payload = fields.get(b'data', fields.get('data'))
+                events.append((event_id, json.loads(payload)))
+
+        return events
+
+
+
+class EventBus:
+    """
+    Publishes order status changes per customer and turns them into
+    Server-Sent Events streams.
+
+    Each open stream holds a worker thread, so at most `max_streams` are
+    open per worker (0 for no cap) and further ones are refused with a 503,
+    leaving threads for the other endpoints. Streams end after
+    `stream_seconds` and the client reconnects with Last-Event-ID, so no
+    change is missed in between.
+
+    """
+
+    def __init__(self, backend, heartbeat=15, stream_seconds=300, max_streams=5, retry_after=5):
+        self.backend = backend
+        self.heartbeat = heartbeat
+        self.stream_seconds = stream_seconds
+        self.retry_after = retry_after
+        self._slots = BoundedSemaphore(max_streams) if max_streams else None
+
+
+    @classmethod
+    def from_config(cls, config):
+        if config['EVENTS_BACKEND'] == 'redis':
+            backend = RedisEventBackend(url=config['REDIS_URL'], max_events=config['EVENTS_BUFFER_SIZE'])
+        else:
+            backend = MemoryEventBackend(max_events=config['EVENTS_BUFFER_SIZE'])
+
+        return cls(
+            backend,
+            heartbeat=config['EVENTS_HEARTBEAT_SECONDS'],
+            stream_seconds=config['EVENTS_STREAM_SECONDS'],
+            max_streams=config['EVENTS_MAX_STREAMS'],
+            retry_after=config['EVENTS_RETRY_AFTER']
+        )
+
+
+    # To tell the owner of an order that its status changed
+    def publish_order(self, order_id, customer, order_status):
+        if customer is None:
+            return None
+
+        return self.backend.publish(f'user:{customer}', {'id': order_id, 'order_status': order_status.name})
+
+
+    # To stream a user's events as SSE text, starting after `last_event_id` (or from now)
+    def stream(self, customer, last_event_id=None):
+        channel = f'user:{customer}'
+        after = last_event_id or self.backend.last_id(channel)
+        deadline = time.monotonic() + self.stream_seconds
+
+        yield f'retry: {int(self.heartbeat * 1000)}\n\n'
+
+        while time.monotonic() < deadline:
+            events = self.backend.read(channel, after, min(self.heartbeat, max(deadline - time.monotonic(), 0)))
+
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+
+            for event_id, data in events:
+                after = event_id
+                yield f'id: {event_id}\nevent: order_status\ndata: {json.dumps(data)}\n\n'
+
+
+
+    # To take a stream slot for the response of an SSE request, raises EventStreamsSaturated when none is free
+    def open_stream(self, customer, last_event_id=None):
+        if self._slots is None:
+            return self.stream(customer, last_event_id)
+
+        if not self._slots.acquire(blocking=False):
+            raise EventStreamsSaturated(self.retry_after)
+
+        return StreamSlot(self.stream(customer, last_event_id), self._slots.release)
+
+
+
+class EventStreamsSaturated(Exception):
+    """Raised when every event stream slot of this worker is taken."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many open event streams')
+        self.retry_after = retry_after
+
+
+
+# Response body that gives its slot back when the server closes it, whether or not it was read
+class StreamSlot:
+
+    def __init__(self, chunks, release):
+        self.chunks = chunks
+        self._release = release
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        return next(self.chunks)
+
+
+    def close(self):
+        release, self._release = self._release, None
+
+        try:
+            self.chunks.close()
+        finally:
+            if release is not None:
+                release()
+
+
+
+# Function to get the event bus of the running app
+def get_event_bus():
+    return current_app.extensions['event_bus']
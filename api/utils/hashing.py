@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when every password hashing slot of this worker is taken."""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+
+class PasswordHasher:
+    """
+    Caps how many password hashes a worker runs at once.
+
+    Hashes run on a small thread pool (PBKDF2 in hashlib releases the GIL)
+    while the request thread waits for the result, so the pool bounds the
+    CPU spent on hashing rather than freeing the request. When `max_pending`
+    hashes are already in flight new ones are refused with a 503 instead of
+    queueing; 0 means no cap.
+
+    """
+
+    def __init__(self, method='pbkdf2:sha256', iterations=260000, workers=2, max_pending=4, retry_after=1):
+        self.method = f'{method}:{iterations}'
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = BoundedSemaphore(max_pending) if max_pending else None
+
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            method=config['PASSWORD_HASH_METHOD'],
+            iterations=config['PASSWORD_HASH_ITERATIONS'],
+            workers=config['PASSWORD_HASH_WORKERS'],
+            max_pending=config['PASSWORD_HASH_MAX_PENDING'],
+            retry_after=config['PASSWORD_HASH_RETRY_AFTER']
+        )
+
+
+    def _run(self, fn, *args):
+        if self._slots is None:
+            return self._executor.submit(fn, *args).result()
+
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated(self.retry_after)
+
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+    # To hash a new password with the configured method and iterations
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+
+    # To tell whether a stored hash was made with other settings than the current ones
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+
+
+# Function to get the password hasher of the running app
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,268 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, g, has_app_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_restx import abort
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .cache import render_result
+from ..models.idempotency import IdempotencyKey
+
+
+class DatabaseIdempotencyStore:
+    """
+    Keys in the idempotency_keys table, written with the request's own changes.
+
+    A claim is one indexed SELECT. The key row is added to the first
+    transaction the handler commits, so it commits (or rolls back) together
+    with the order, and a concurrent request with the same key fails that
+    commit on the unique index. The response is stored by one UPDATE after
+    the handler returns; if that never happens the key answers 409 instead
+    of letting a retry place the order twice.
+
+    """
+
+    def __init__(self, ttl=86400, lock_seconds=60):
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+
+
+    # To look a key up, returns None when it is free (and claims it for this request) or the stored record otherwise
+    def claim(self, owner, key, fingerprint):
+        record = self.find(owner, key)
+
+        if record is None:
+            g.idempotency_claim = {
+                'owner': owner, 'key': key, 'fingerprint': fingerprint, 'ttl': self.ttl, 'committed': False
+            }
+
+        return record
+
+
+    def find(self, owner, key):
+        row = IdempotencyKey.query.filter_by(owner=owner, key=key).first()
+        now = datetime.utcnow()
+
+        if row is None:
+            return None
+
+        if row.expires_at <= now:
+            # not compacted yet, the key can be used again
+            db.session.delete(row)
+            db.session.commit()
+
+            return None
+
+        if row.status_code is None and row.created_at <= now - timedelta(seconds=self.lock_seconds):
+            # the handler committed but died before its response was stored
+            return {
+                'fingerprint': row.fingerprint,
+                'status': 409,
+                'body': json.dumps({'message': 'A request with this Idempotency-Key was processed but its response was lost'}),
+                'headers': {}
+            }
+
+        return {
+            'fingerprint': row.fingerprint,
+            'status': row.status_code,
+            'body': row.body,
+            'headers': json.loads(row.headers) if row.headers else {}
+        }
+
+
+    def complete(self, owner, key, fingerprint, status, body, headers):
+        claim = g.pop('idempotency_claim', None)
+        values = {
+            'status_code': status,
+            'body': body,
+            'headers': json.dumps(headers)
+        }
+
+        if claim is not None and claim['committed']:
+            IdempotencyKey.query.filter_by(owner=owner, key=key).update(values)
+        else:
+            # the handler committed nothing (an error, or a write-behind order), the response is all there is
+            now = datetime.utcnow()
+            db.session.add(IdempotencyKey(
+                owner=owner, key=key, fingerprint=fingerprint, created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl), **values
+            ))
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent request with the same key stored its response first
+            db.session.rollback()
+
+
+    # To give the key up after a failure, unless the handler's changes (and with them the key) were committed
+    def release(self, owner, key):
+        db.session.rollback()
+        g.pop('idempotency_claim', None)
+
+
+
+# To add the key row of the request's claim to the first transaction its handler commits
+@event.listens_for(db.session, 'before_commit')
+def add_claimed_key(session):
+    claim = g.get('idempotency_claim') if has_app_context() else None
+
+    if claim is None or claim['committed']:
+        return
+
+    now = datetime.utcnow()
+
+    session.add(IdempotencyKey(
+        owner=claim['owner'], key=claim['key'], fingerprint=claim['fingerprint'], created_at=now,
+        expires_at=now + timedelta(seconds=claim['ttl'])
+    ))
+
+
+
+# To mark the claim as stored once that transaction went through
+@event.listens_for(db.session, 'after_commit')
+def mark_claimed_key(session):
+    claim = g.get('idempotency_claim') if has_app_context() else None
+
+    if claim is not None:
+        claim['committed'] = True
+
+
+
+# Keys in Redis, claimed with SET NX
+class RedisIdempotencyStore:
+
+    def __init__(self, url=None, client=None, prefix='idempotency:', ttl=86400, lock_seconds=60):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+
+
+    def claim(self, owner, key, fingerprint):
+        name = f'{self.prefix}{owner}:{key}'
+        claim = json.dumps({'fingerprint': fingerprint, 'status': None})
+
+        if self.client.set(name, claim, nx=True, ex=self.lock_seconds):
+            return None
+
+        value = self.client.get(name)
+
+        # expired between the two calls
+        if value is None:
+            return self.claim(owner, key, fingerprint)
+
+        return json.loads(value)
+
+
+    def find(self, owner, key):
+        value = self.client.get(f'{self.prefix}{owner}:{key}')
+
+        return json.loads(value) if value is not None else None
+
+
+    def complete(self, owner, key, fingerprint, status, body, headers):
+        record = {'fingerprint': fingerprint, 'status': status, 'body': body, 'headers': headers}
+        self.client.set(f'{self.prefix}{owner}:{key}', json.dumps(record), ex=self.ttl)
+
+
+    def release(self, owner, key):
+        self.client.delete(f'{self.prefix}{owner}:{key}')
+
+
+
+# Function to build the configured idempotency store
+def idempotency_store_from_config(config):
+    if config['IDEMPOTENCY_BACKEND'] == 'redis':
+        return RedisIdempotencyStore(
+            url=config['REDIS_URL'], ttl=config['IDEMPOTENCY_KEY_TTL'], lock_seconds=config['IDEMPOTENCY_LOCK_SECONDS']
+        )
+
+    return DatabaseIdempotencyStore(ttl=config['IDEMPOTENCY_KEY_TTL'], lock_seconds=config['IDEMPOTENCY_LOCK_SECONDS'])
+
+
+
+# Function to get the idempotency store of the running app
+def get_idempotency_store():
+    return current_app.extensions['idempotency_store']
+
+
+
+# Function to hash what makes two requests "the same": method, path and body
+def request_fingerprint():
+    return hashlib.sha256(b'|'.join([request.method.encode(), request.path.encode(), request.get_data()])).hexdigest()
+
+
+
+# Function to answer a request whose Idempotency-Key is already taken
+def replay(record, fingerprint):
+    if record['status'] is None:
+        abort(409, "A request with this Idempotency-Key is still in progress")
+
+    if record['fingerprint'] != fingerprint:
+        abort(422, "Idempotency-Key was already used for a different request")
+
+    response = Response(record['body'], record['status'], headers=record['headers'], mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+
+# Decorator to replay the first response to requests repeating an Idempotency-Key header,
+# must sit directly under @jwt_required() (keys are per user)
+def idempotent(fn):
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+
+        if not key:
+            return fn(*args, **kwargs)
+
+        if len(key) > 255:
+            abort(400, "Idempotency-Key must be at most 255 characters")
+
+        store = get_idempotency_store()
+        owner = str(get_jwt_identity())
+        fingerprint = request_fingerprint()
+
+        record = store.claim(owner, key, fingerprint)
+
+        if record is not None:
+            return replay(record, fingerprint)
+
+        try:
+            response, _ = render_result(fn(*args, **kwargs))
+        except Exception:
+            # nothing was stored, let the client retry with the same key
+            store.release(owner, key)
+
+            # unless a concurrent request with the key committed first and this one was rolled back
+            record = store.find(owner, key)
+
+            if record is None:
+                raise
+
+            return replay(record, fingerprint)
+
+        if response.status_code >= 500:
+            store.release(owner, key)
+            return response
+
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name not in ('Content-Type', 'Content-Length')
+        }
+
+        store.complete(owner, key, fingerprint, response.status_code, response.get_data(as_text=True), headers)
+
+        return response
+
+    return wrapper
@@ -0,0 +1,27 @@
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from ..models.users import User
+
+
+# Function to build the extra JWT claims carried by a user's tokens
+def user_claims(user):
+    return {
+        'user_id': user.id,
+        'is_staff': bool(user.is_staff)
+    }
+
+
+
+# Function to get the ID of the user making the request, resolved once per request
+def current_user_id():
+    if 'current_user_id' not in g:
+        claims = get_jwt()
+
+        if 'user_id' in claims:
+            g.current_user_id = claims['user_id']
+        else:
+            # Tokens issued before the user_id claim only carry the username
+            user = User.query.with_entities(User.id).filter_by(username=get_jwt_identity()).first()
+            g.current_user_id = user.id if user else None
+
+    return g.current_user_id
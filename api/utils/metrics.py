@@ -0,0 +1,183 @@
+import hmac
+import time
+from threading import Lock
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from . import db
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+
+
+class Metrics:
+    """
+    Per-route request latency, SQL statement counts and SQL time of this process.
+
+    Each gunicorn worker keeps its own numbers; Prometheus should scrape every
+    worker (or sum them) rather than expect one global view.
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.latency = {}
+        self.sql_statements = {}
+        self.sql_seconds = {}
+        self._lock = Lock()
+
+
+    def observe(self, method, route, status, seconds, sql_statements, sql_seconds):
+        with self._lock:
+            labels = (('method', method), ('route', route), ('status', status))
+
+            if labels not in self.latency:
+                self.latency[labels] = Histogram(self.buckets)
+
+            self.latency[labels].observe(seconds)
+
+            route_labels = (('method', method), ('route', route))
+            self.sql_statements[route_labels] = self.sql_statements.get(route_labels, 0) + sql_statements
+            self.sql_seconds[route_labels] = self.sql_seconds.get(route_labels, 0.0) + sql_seconds
+
+
+    # To render everything in the Prometheus text exposition format
+    def render(self, extra=()):
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+
+        with self._lock:
+            for labels, histogram in sorted(self.latency.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'http_request_duration_seconds_bucket{{{format_labels(labels + (("le", bound),))}}} {count}')
+
+                lines.append(f'http_request_duration_seconds_bucket{{{format_labels(labels + (("le", "+Inf"),))}}} {histogram.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{format_labels(labels)}}} {histogram.sum}')
+                lines.append(f'http_request_duration_seconds_count{{{format_labels(labels)}}} {histogram.count}')
+
+            lines.append('# HELP http_request_sql_statements_total SQL statements issued by route')
+            lines.append('# TYPE http_request_sql_statements_total counter')
+
+            for labels, count in sorted(self.sql_statements.items()):
+                lines.append(f'http_request_sql_statements_total{{{format_labels(labels)}}} {count}')
+
+            lines.append('# HELP http_request_sql_seconds_total Time spent in SQL by route')
+            lines.append('# TYPE http_request_sql_seconds_total counter')
+
+            for labels, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'http_request_sql_seconds_total{{{format_labels(labels)}}} {seconds}')
+
+        for name, kind, help_text, value in extra:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.perf_counter() - started
+
+
+
+# Function to hook request timing, SQL counting and the /metrics endpoint into the app
+def init_metrics(app):
+    metrics = Metrics()
+    app.extensions['metrics'] = metrics
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+
+    # Streaming bodies are still being sent here, so their latency is time to first byte
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+
+        seconds = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        metrics.observe(request.method, route, response.status_code, seconds, g.sql_statements, g.sql_seconds)
+
+        if app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={seconds * 1000:.2f}, '
+                f'db;dur={g.sql_seconds * 1000:.2f};desc="{g.sql_statements} queries"'
+            )
+
+        return response
+
+
+    def metrics_view():
+        token = app.config.get('METRICS_TOKEN')
+
+        # the scraper sends the token as a bearer token (Prometheus: authorization.credentials)
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+
+        extra = []
+        cache = app.extensions.get('response_cache')
+
+        if cache is not None:
+            extra.append(('response_cache_hits_total', 'counter', 'Order reads served from cache', cache.hits))
+            extra.append(('response_cache_misses_total', 'counter', 'Order reads that missed the cache', cache.misses))
+
+        return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    return metrics
@@ -0,0 +1,42 @@
+import heapq
+from operator import attrgetter
+from urllib.parse import urlencode
+from flask import request
+
+
+# Function to get one page of a query ordered by an increasing key (keyset/cursor pagination);
+# with `gather` (ShardRouter.gather) the page is read from every shard and merged
+def keyset_page(query, key_column, limit, after=None, gather=None):
+    if after is not None:
+        query = query.filter(key_column > after)
+
+    # one extra row tells us whether there is a next page without a COUNT
+    query = query.order_by(key_column).limit(limit + 1)
+
+    if gather is None:
+        rows = query.all()
+    else:
+        rows = list(heapq.merge(*gather(query.statement).values(), key=attrgetter(key_column.key)))[:limit + 1]
+
+    next_cursor = None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], key_column.key)
+
+    return rows, next_cursor
+
+
+
+# Function to build the response headers pointing at the next page
+def next_page_headers(next_cursor):
+    if next_cursor is None:
+        return {}
+
+    args = request.args.to_dict()
+    args['after'] = next_cursor
+
+    return {
+        'X-Next-Cursor': str(next_cursor),
+        'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    }
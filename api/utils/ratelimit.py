@@ -0,0 +1,198 @@
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import g, jsonify, request
+from flask_jwt_extended import decode_token
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+
+# Token bucket per key in this process, for single worker runs; the least recently used
+# buckets are dropped beyond `max_keys` (a dropped bucket starts full again)
+class MemoryRateLimitBackend:
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+
+    # To take one token from a bucket, returns (allowed, tokens left)
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+
+            allowed = tokens >= 1
+
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+            return allowed, tokens
+
+
+
+# Token bucket kept in Redis so all workers share the same limits
+class RedisRateLimitBackend:
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url=None, client=None, prefix='ratelimit:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+
+    def take(self, key, capacity, rate):
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate])
+        return bool(int(allowed)), float(tokens)
+
+
+
+# Function to turn '10/minute' into (capacity, tokens added per second)
+def parse_limit(limit):
+    count, period = limit.split('/')
+    seconds = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}[period.strip()]
+
+    return int(count), int(count) / seconds
+
+
+
+class RateLimiter:
+    """
+    Token-bucket limits per namespace, applied to the client IP and, when the
+    request carries a valid JWT, to the user as well.
+
+    """
+
+    def __init__(self, backend, limits):
+        self.backend = backend
+        self.limits = {namespace: parse_limit(limit) for namespace, limit in limits.items()}
+
+
+    @classmethod
+    def from_config(cls, config):
+        if config['RATELIMIT_BACKEND'] == 'redis':
+            backend = RedisRateLimitBackend(url=config['REDIS_URL'])
+        else:
+            backend = MemoryRateLimitBackend()
+
+        return cls(backend, config['RATELIMITS'])
+
+
+    # To check every bucket the request counts against, returns the tightest state
+    def hit(self, namespace, keys):
+        capacity, rate = self.limits[namespace]
+        state = None
+
+        for key in keys:
+            allowed, tokens = self.backend.take(f'{namespace}:{key}', capacity, rate)
+
+            if state is None or not allowed or (state[0] and tokens < state[1]):
+                state = (allowed, tokens)
+
+            if not allowed:
+                break
+
+        allowed, tokens = state
+
+        return {
+            'allowed': allowed,
+            'limit': capacity,
+            'remaining': max(0, math.floor(tokens)),
+            'reset': math.ceil((capacity - tokens) / rate),
+            'retry_after': 0 if allowed else max(1, math.ceil((1 - tokens) / rate))
+        }
+
+
+
+# Function to get the JWT identity of the request without rejecting anything
+def request_identity():
+    header = request.headers.get('Authorization', '')
+
+    if not header.startswith('Bearer '):
+        return None
+
+    try:
+        return decode_token(header[len('Bearer '):])['sub']
+    except Exception:
+        # invalid tokens are rejected by jwt_required later, here they just count per IP
+        return None
+
+
+
+# Function to limit requests per namespace (first path segment) before they reach a view
+def init_rate_limiting(app):
+    limiter = RateLimiter.from_config(app.config)
+    app.extensions['rate_limiter'] = limiter
+
+    # behind proxies remote_addr is the proxy's, take the client from the headers they add
+    hops = app.config.get('TRUSTED_PROXY_HOPS', 0)
+
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+
+    @app.before_request
+    def check_rate_limit():
+        namespace = request.path.strip('/').split('/')[0]
+
+        if namespace not in limiter.limits:
+            return None
+
+        keys = [f'ip:{request.remote_addr}']
+        identity = request_identity()
+
+        if identity is not None:
+            keys.append(f'user:{identity}')
+
+        g.rate_limit = limiter.hit(namespace, keys)
+
+        if not g.rate_limit['allowed']:
+            response = jsonify(error="Too many requests, slow down")
+            response.status_code = 429
+            response.headers['Retry-After'] = str(g.rate_limit['retry_after'])
+            return response
+
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        state = g.get('rate_limit')
+
+        if state is not None:
+            response.headers['X-RateLimit-Limit'] = str(state['limit'])
+            response.headers['X-RateLimit-Remaining'] = str(state['remaining'])
+            response.headers['X-RateLimit-Reset'] = str(state['reset'])
+
+        return response
+
+
+    return limiter
@@ -0,0 +1,131 @@
+import itertools
+import time
+from functools import wraps
+from threading import Lock
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import InterfaceError, OperationalError
+from .cache import LRUCacheBackend, RedisCacheBackend
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica for read-only handlers, round robin.
+
+    A user who just wrote reads from the primary for `sticky_seconds`, so
+    they see their own change whatever the replication lag. A replica that
+    fails a query is skipped for `retry_seconds`.
+
+    """
+
+    def __init__(self, keys, backend, sticky_seconds=5, retry_seconds=30):
+        self.keys = list(keys)
+        self.backend = backend
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._down_until = {}
+        self._next = itertools.count()
+        self._lock = Lock()
+
+
+    @classmethod
+    def from_config(cls, config):
+        if config['REPLICA_STICKY_BACKEND'] == 'redis':
+            backend = RedisCacheBackend(url=config['REDIS_URL'], prefix='replica:')
+        else:
+            backend = LRUCacheBackend(max_entries=config['REPLICA_STICKY_SIZE'])
+
+        return cls(
+            replica_keys(config),
+            backend,
+            sticky_seconds=config['REPLICA_STICKY_SECONDS'],
+            retry_seconds=config['REPLICA_RETRY_SECONDS']
+        )
+
+
+    # To pick the next healthy replica, None when all of them are down
+    def choose(self):
+        now = time.monotonic()
+
+        with self._lock:
+            healthy = [key for key in self.keys if self._down_until.get(key, 0) <= now]
+
+            if not healthy:
+                return None
+
+            return healthy[next(self._next) % len(healthy)]
+
+
+    def mark_down(self, key):
+        with self._lock:
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+
+
+    # To send a user's reads to the primary for a while after they wrote
+    def stick(self, identity):
+        self.backend.set(f'sticky:{identity}', 1, self.sticky_seconds)
+
+
+    def is_sticky(self, identity):
+        return self.backend.get(f'sticky:{identity}') is not None
+
+
+
+# Function to list the SQLALCHEMY_BINDS keys that are read replicas
+def replica_keys(config):
+    return sorted(key for key in (config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('replica_'))
+
+
+
+# Function to turn on replica reads when replicas are configured
+def init_read_replicas(app):
+    router = ReplicaRouter.from_config(app.config)
+    app.extensions['replica_router'] = router
+
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return response
+
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            # not a JWT protected endpoint
+            return response
+
+        if identity is not None:
+            router.stick(identity)
+
+        return response
+
+
+
+# Decorator to run a read-only handler against a replica, goes under @jwt_required();
+# retries on the primary if the replica fails
+def read_replica(fn):
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get('replica_router')
+        key = router.choose() if router is not None else None
+
+        if key is None or router.is_sticky(get_jwt_identity()):
+            return fn(*args, **kwargs)
+
+        g.db_replica = key
+
+        try:
+            return fn(*args, **kwargs)
+        except (OperationalError, InterfaceError):
+            current_app.logger.warning('Read replica %s failed, reading from the primary', key, exc_info=True)
+            router.mark_down(key)
+
+            g.pop('db_replica', None)
+            current_app.extensions['sqlalchemy'].session.rollback()
+
+            return fn(*args, **kwargs)
+        finally:
+            g.pop('db_replica', None)
+
+    return wrapper
@@ -0,0 +1,62 @@
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Table, inspect
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.util import find_tables
+
+
+# Tables that live on the order shards (SHARD_URLS); everything else stays on the primary
+SHARDED_TABLES = frozenset(['orders', 'order_status_history'])
+
+
+
+# Function to tell whether a statement (or the mapper it is run for) touches a sharded table
+def touches_sharded_table(mapper=None, clause=None):
+    if mapper is not None:
+        return getattr(inspect(mapper).persist_selectable, 'name', None) in SHARDED_TABLES
+
+    table = getattr(clause, 'table', None)
+
+    # INSERT/UPDATE/DELETE name their table, SELECTs are searched
+    if isinstance(table, Table):
+        return table.name in SHARDED_TABLES
+
+    if clause is None:
+        return False
+
+    return any(getattr(table, 'name', None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+
+
+
+class RoutingSession(Session):
+    """
+    Picks the database of each statement for the current request.
+
+    Statements on sharded tables go to the shard chosen for the request
+    (g.db_shard), flushes included. SELECTs of @read_replica handlers go to
+    their replica (g.db_replica). Everything else goes to the primary.
+    With SHARD_TWO_PHASE the databases of a commit are committed with
+    two-phase commit.
+
+    """
+
+    def __init__(self, db, **kwargs):
+        if has_app_context() and current_app.config.get('SHARD_TWO_PHASE'):
+            kwargs.setdefault('twophase', True)
+
+        super().__init__(db, **kwargs)
+
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard = g.get('db_shard')
+
+            if shard is not None and touches_sharded_table(mapper, clause):
+                return self._db.engines[shard]
+
+            replica = g.get('db_replica')
+
+            if replica is not None and not self._flushing and isinstance(clause, Select):
+                return self._db.engines[replica]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,83 @@
+from enum import Enum
+from functools import lru_cache
+from operator import attrgetter
+import orjson
+from flask import Response
+from flask_restx import fields
+
+
+# Swagger/marshal field for enum columns, renders the member name ('PENDING')
+class EnumName(fields.String):
+
+    def format(self, value):
+        if isinstance(value, Enum):
+            return value.name
+
+        return super().format(value)
+
+
+
+def enum_name(value):
+    return value.name if isinstance(value, Enum) else value
+
+
+
+class ModelSerializer:
+    """
+    Precompiled row -> dict conversion for list responses.
+
+    flask_restx's marshal walks a field object per key per row; here the
+    attribute getter and the few converters a field set needs are built once
+    and reused for every row (ORM objects or plain result rows).
+
+    """
+
+    def __init__(self, columns):
+        # key -> converter (None when the value is used as is)
+        self.columns = dict(columns)
+
+
+    @lru_cache(maxsize=64)
+    def compile(self, keys):
+        getter = attrgetter(*keys)
+        converters = [(index, self.columns[key]) for index, key in enumerate(keys) if self.columns[key]]
+
+        if len(keys) == 1:
+            converter = self.columns[keys[0]]
+            key = keys[0]
+
+            return lambda row: {key: converter(getter(row)) if converter else getter(row)}
+
+        def serialize(row):
+            values = list(getter(row))
+
+            for index, converter in converters:
+                values[index] = converter(values[index])
+
+            return dict(zip(keys, values))
+
+        return serialize
+
+
+    def many(self, rows, keys=None):
+        serialize = self.compile(tuple(self.columns if keys is None else keys))
+
+        return [serialize(row) for row in rows]
+
+
+
+# Columns of order_model, in the same order
+order_serializer = ModelSerializer([
+    ('id', None),
+    ('size', enum_name),
+    ('order_status', enum_name),
+    ('flavour', None),
+    ('quantity', None),
+    ('version', None)
+])
+
+
+
+# Function to build a JSON response with orjson
+def json_response(data, code=200, headers=None):
+    return Response(orjson.dumps(data) + b'\n', code, headers=headers, mimetype='application/json')
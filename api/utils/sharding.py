@@ -0,0 +1,397 @@
+import heapq
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from operator import attrgetter
+from flask import current_app, g
+from sqlalchemy import func, inspect, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+from . import db
+from .database import insert_many
+from .routing import SHARDED_TABLES
+from ..models.orders import Order, OrderStatusHistory
+from ..models.shards import ShardCustomer, ShardOrder
+
+
+class ShardMoveError(Exception):
+    """Raised when a customer's orders could not all be moved off their old shard."""
+
+
+
+class ShardRouter:
+    """
+    Spreads orders over the shard databases (SHARD_URLS) by customer.
+
+    All orders of a customer live on one shard: picked by hash on their
+    first order and kept in shard_customers on the primary, so adding a
+    shard moves nobody until `flask shards rebalance`. Order IDs are handed
+    out by shard_orders, which also records where each order is, so a
+    lookup by ID asks the directory instead of every shard (unless the
+    directory does not list the order).
+
+    """
+
+    def __init__(self, keys, move_passes=5):
+        self.keys = list(keys)
+        self.move_passes = move_passes
+        self.executor = ThreadPoolExecutor(max_workers=len(self.keys), thread_name_prefix='shard')
+
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(shard_keys(config))
+
+
+    def default_shard(self, customer):
+        return self.keys[zlib.crc32(str(customer).encode()) % len(self.keys)]
+
+
+    # To get the shard of a customer's orders; `assign` records it for a customer placing their first order
+    def customer_shard(self, customer, assign=False):
+        shard = db.session.query(ShardCustomer.shard).filter_by(customer=customer).scalar()
+
+        if shard is not None or customer is None:
+            return shard or self.keys[0]
+
+        if not assign:
+            # no orders anywhere yet, any shard answers the same
+            return self.default_shard(customer)
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        # a concurrent first order may assign the customer too, whoever inserts first wins
+        db.session.execute(
+            insert(ShardCustomer.__table__).values(customer=customer, shard=self.default_shard(customer)).on_conflict_do_nothing()
+        )
+
+        return db.session.query(ShardCustomer.shard).filter_by(customer=customer).scalar()
+
+
+    # To get {order_id: shard} of the orders the directory knows
+    def order_shards(self, order_ids):
+        if not order_ids:
+            return {}
+
+        return dict(db.session.query(ShardOrder.id, ShardOrder.shard).filter(ShardOrder.id.in_(list(order_ids))))
+
+
+    # To get {order_id: shard} of orders, asking every shard for the ones the directory does not know
+    def locate(self, order_ids):
+        order_ids = list(order_ids)
+        found = self.order_shards(order_ids)
+        missing = [order_id for order_id in order_ids if order_id not in found]
+
+        if missing:
+            # an order commits on its shard and in the directory separately, a crash in between leaves it unlisted
+            orders = Order.__table__
+            statement = select(orders.c.id).where(orders.c.id.in_(missing))
+
+            for shard, rows in self.gather(statement).items():
+                found.update((order_id, shard) for order_id, in rows)
+
+        return found
+
+
+    # To reserve one order ID on `shard` per entry of `customers`, in the current transaction
+    def allocate(self, shard, customers):
+        mappings = [{'shard': shard, 'customer': customer} for customer in customers]
+
+        return insert_many(ShardOrder, mappings)
+
+
+    # To run one SELECT on every shard at once (each on its own connection), returns {shard: rows}
+    def gather(self, statement):
+        engines = {key: db.engines[key] for key in self.keys}
+
+        def run(key):
+            with engines[key].connect() as connection:
+                return connection.execute(statement).all()
+
+        return dict(zip(self.keys, self.executor.map(run, self.keys)))
+
+
+    # To stream a SELECT ordered by `key` from every shard as one ordered stream
+    def merge_stream(self, statement, key, batch_size=1000):
+        connections = [db.engines[shard].connect() for shard in self.keys]
+
+        try:
+            results = [
+                connection.execution_options(stream_results=True).execute(statement).yield_per(batch_size)
+                for connection in connections
+            ]
+
+            yield from heapq.merge(*results, key=attrgetter(key))
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+    # To count orders per customer on every shard, returns {shard: {customer: orders}}
+    def customer_loads(self):
+        orders = Order.__table__
+        statement = select(orders.c.customer, func.count()).group_by(orders.c.customer)
+
+        return {shard: dict(rows) for shard, rows in self.gather(statement).items()}
+
+
+    # To plan customer moves that even out the orders per shard, returns [(customer, source, target, orders)]
+    def plan_rebalance(self, tolerance=0.1):
+        customers = self.customer_loads()
+        loads = {shard: sum(counts.values()) for shard, counts in customers.items()}
+        allowed = max(1, tolerance * sum(loads.values()) / len(self.keys))
+        moves = []
+
+        while True:
+            heavy = max(self.keys, key=loads.get)
+            light = min(self.keys, key=loads.get)
+            gap = loads[heavy] - loads[light]
+
+            # moving fewer orders than the gap always narrows it, so this ends
+            candidates = [(count, customer) for customer, count in customers[heavy].items() if count < gap]
+
+            if gap <= allowed or not candidates:
+                return moves
+
+            count, customer = max(candidates)
+
+            del customers[heavy][customer]
+            customers[light][customer] = count
+            loads[heavy] -= count
+            loads[light] += count
+
+            moves.append((customer, heavy, light, count))
+
+
+    # To move a customer's orders (and their status history) to `target`, returns how many orders moved.
+    # Orders are copied and the directory switched. Requests routed to the source just before the
+    # switch may still write there, so the copy is repeated and only rows exactly as copied are deleted,
+    # until the source holds none of the customer's orders.
+    def move_customer(self, customer, target):
+        source = self.customer_shard(customer)
+
+        if source == target:
+            return 0
+
+        copied = self.copy_orders(customer, source, target, {})
+
+        db.session.merge(ShardCustomer(customer=customer, shard=target))
+        ShardOrder.query.filter_by(customer=customer).update({'shard': target}, synchronize_session=False)
+        db.session.commit()
+
+        moved = set()
+
+        for _ in range(self.move_passes):
+            copied = self.copy_orders(customer, source, target, copied)
+
+            if not copied:
+                return len(moved)
+
+            deleted = self.delete_copied(source, copied)
+            moved.update(deleted)
+            copied = {order_id: state for order_id, state in copied.items() if order_id not in deleted}
+
+        raise ShardMoveError(
+            f"Orders of customer {customer} kept changing on {source}, {len(copied)} left there; run the move again"
+        )
+
+
+    # To copy a customer's orders that are new or changed since `copied`, with their status history.
+    # `copied` and the result map order IDs to (version, history IDs) as the source holds them.
+    def copy_orders(self, customer, source, target, copied):
+        orders = Order.__table__
+        history = OrderStatusHistory.__table__
+
+        with db.engines[source].connect() as connection:
+            rows = connection.execute(select(orders).where(orders.c.customer == customer)).mappings().all()
+            steps = connection.execute(
+                select(history).where(history.c.order_id.in_([row['id'] for row in rows]))
+            ).mappings().all() if rows else []
+
+        steps_by_order = defaultdict(list)
+
+        for step in steps:
+            steps_by_order[step['order_id']].append(step)
+
+        current = {
+            row['id']: (row['version'], tuple(sorted(step['id'] for step in steps_by_order[row['id']])))
+            for row in rows
+        }
+        changed = [order_id for order_id, state in current.items() if copied.get(order_id) != state]
+
+        # deleted on the source meanwhile
+        stale = [order_id for order_id in copied if order_id not in current]
+
+        with db.engines[target].begin() as connection:
+            replaced = changed + stale
+
+            if replaced:
+                connection.execute(history.delete().where(history.c.order_id.in_(replaced)))
+                connection.execute(orders.delete().where(orders.c.id.in_(replaced)))
+
+            if changed:
+                connection.execute(orders.insert(), [dict(row) for row in rows if row['id'] in changed])
+
+            changed_steps = [dict(step) for order_id in changed for step in steps_by_order[order_id]]
+
+            if changed_steps:
+                connection.execute(history.insert(), changed_steps)
+
+        return current
+
+
+    # To delete from `source` the orders still at the version they were copied at, with the history
+    # rows that were copied; returns the IDs of the orders deleted
+    def delete_copied(self, source, copied):
+        orders = Order.__table__
+        history = OrderStatusHistory.__table__
+        deleted = set()
+
+        with db.engines[source].begin() as connection:
+            for order_id, (version, step_ids) in copied.items():
+                # a status change bumps the version and adds history in one transaction, so an order
+                # still at the copied version has no history that was not copied
+                result = connection.execute(
+                    orders.delete().where(orders.c.id == order_id, orders.c.version == version)
+                )
+
+                if not result.rowcount:
+                    continue
+
+                deleted.add(order_id)
+
+                if step_ids:
+                    connection.execute(history.delete().where(history.c.id.in_(step_ids)))
+
+        return deleted
+
+
+
+# Function to list the SQLALCHEMY_BINDS keys that are order shards
+def shard_keys(config):
+    return sorted(key for key in (config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('shard_'))
+
+
+
+# Function to create the sharded tables on a shard database, without the foreign keys to primary tables
+def create_shard_tables(engine):
+    existing = set(inspect(engine).get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in SHARDED_TABLES or table.name in existing:
+                continue
+
+            local_keys = [key for key in table.foreign_key_constraints if key.referred_table.name in SHARDED_TABLES]
+            connection.execute(CreateTable(table, include_foreign_key_constraints=local_keys))
+
+            for index in table.indexes:
+                connection.execute(CreateIndex(index))
+
+
+
+# Function to turn on order sharding when shards are configured
+def init_sharding(app):
+    app.extensions['shard_router'] = ShardRouter.from_config(app.config)
+
+
+    @app.teardown_request
+    def forget_shard(error=None):
+        g.pop('db_shard', None)
+
+
+
+# Function to get the shard router of the running app, None when orders are not sharded
+def get_shard_router():
+    return current_app.extensions.get('shard_router')
+
+
+
+# Context manager to send order statements to `shard` (None: the primary) for the duration
+@contextmanager
+def on_shard(shard):
+    previous = g.get('db_shard')
+    g.db_shard = shard
+
+    try:
+        yield shard
+    finally:
+        g.db_shard = previous
+
+
+
+# Function to send the rest of the request's order statements to a customer's shard
+def route_customer(customer, assign=False):
+    router = get_shard_router()
+
+    if router is None:
+        return None
+
+    g.db_shard = router.customer_shard(customer, assign)
+
+    return g.db_shard
+
+
+
+# Function to send the rest of the request's order statements to the shard of an order;
+# IDs no shard has go to any shard, where they are not found either
+def route_order(order_id):
+    router = get_shard_router()
+
+    if router is None:
+        return None
+
+    g.db_shard = router.locate([order_id]).get(order_id, router.keys[0])
+
+    return g.db_shard
+
+
+
+# Function to get IDs for `count` new orders of a customer and route to their shard, Nones when not sharded
+def new_order_ids(customer, count):
+    router = get_shard_router()
+
+    if router is None:
+        return [None] * count
+
+    return router.allocate(route_customer(customer, assign=True), [customer] * count)
+
+
+
+# Function to drop deleted orders from the shard directory, in the current transaction
+def forget_orders(order_ids):
+    if get_shard_router() is not None:
+        ShardOrder.query.filter(ShardOrder.id.in_(list(order_ids))).delete(synchronize_session=False)
+
+
+
+# Function to split order IDs by shard, yields (shard, ids) with order statements routed to that shard;
+# IDs no shard has are left out
+def shard_groups(order_ids):
+    router = get_shard_router()
+
+    if router is None:
+        yield None, list(order_ids)
+        return
+
+    groups = defaultdict(list)
+
+    for order_id, shard in router.locate(order_ids).items():
+        groups[shard].append(order_id)
+
+    for shard, ids in groups.items():
+        with on_shard(shard):
+            yield shard, ids
+
+
+
+# Function to run something once per shard (once on the primary when not sharded), yields the shard
+def each_shard():
+    router = get_shard_router()
+
+    for shard in (router.keys if router is not None else [None]):
+        with on_shard(shard):
+            yield shard
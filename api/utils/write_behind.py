@@ -0,0 +1,408 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import InterfaceError, OperationalError
+from . import db
+from .database import insert_many
+from .cache import get_response_cache
+from .events import get_event_bus
+from .sharding import get_shard_router, on_shard
+from ..models.orders import Order, OrderStatus, Sizes
+from ..models.reports import OrderSummary
+
+
+# Durable queue of accepted orders in a local SQLite file (stdlib sqlite3, outside SQLAlchemy)
+class OrderJournal:
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queued_orders (
+        ref TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        customer INTEGER,
+        accepted_at REAL NOT NULL,
+        claimed_until REAL,
+        order_id INTEGER,
+        flushed_at REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        failed_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS ix_queued_orders_pending ON queued_orders (flushed_at, accepted_at);
+    """
+
+    # columns added after the first release, for journals created before them
+    COLUMNS = {
+        'attempts': 'INTEGER NOT NULL DEFAULT 0',
+        'last_error': 'TEXT',
+        'failed_at': 'REAL'
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        # one connection per process, shared by request threads and the flusher under the lock
+        self._connection = sqlite3.connect(path, timeout=15, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # an accepted order must survive a crash, so every append is synced
+        self._connection.execute('PRAGMA synchronous=FULL')
+        self._connection.executescript(self.SCHEMA)
+
+        existing = {row[1] for row in self._connection.execute('PRAGMA table_info(queued_orders)')}
+
+        for name, definition in self.COLUMNS.items():
+            if name not in existing:
+                self._connection.execute(f'ALTER TABLE queued_orders ADD COLUMN {name} {definition}')
+
+
+    # To durably record an order, returns its provisional reference
+    def append(self, payload, customer):
+        ref = uuid.uuid4().hex
+
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO queued_orders (ref, payload, customer, accepted_at) VALUES (?, ?, ?, ?)',
+                (ref, json.dumps(payload), customer, time.time())
+            )
+
+        return ref
+
+
+    # To lease up to `limit` unflushed entries for `lease` seconds, oldest first; other
+    # processes sharing the file skip them until the lease runs out (e.g. their flusher died).
+    # Dead-lettered entries are never taken
+    def claim(self, limit, lease=60):
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                rows = self._connection.execute(
+                    'SELECT ref, payload, customer, accepted_at, attempts FROM queued_orders '
+                    'WHERE flushed_at IS NULL AND failed_at IS NULL AND (claimed_until IS NULL OR claimed_until < ?) '
+                    'ORDER BY accepted_at LIMIT ?',
+                    (now, limit)
+                ).fetchall()
+
+                self._connection.executemany(
+                    'UPDATE queued_orders SET claimed_until = ? WHERE ref = ?', [(now + lease, row[0]) for row in rows]
+                )
+                self._connection.execute('COMMIT')
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+
+        return [
+            {'ref': ref, 'payload': json.loads(payload), 'customer': customer, 'accepted_at': accepted_at, 'attempts': attempts}
+            for ref, payload, customer, accepted_at, attempts in rows
+        ]
+
+
+    # To record which order row each entry became
+    def mark_flushed(self, order_ids):
+        now = time.time()
+
+        with self._lock:
+            self._connection.executemany(
+                'UPDATE queued_orders SET order_id = ?, flushed_at = ?, claimed_until = NULL WHERE ref = ?',
+                [(order_id, now, ref) for ref, order_id in order_ids.items()]
+            )
+
+
+    # To give leased entries back, e.g. after a failed flush
+    def release(self, refs):
+        with self._lock:
+            self._connection.executemany(
+                'UPDATE queued_orders SET claimed_until = NULL WHERE ref = ?', [(ref,) for ref in refs]
+            )
+
+
+    # To record that an entry failed on its own: it is retried after `retry_after` seconds,
+    # or dead-lettered once it has failed `max_attempts` times
+    def record_failure(self, ref, error, max_attempts, retry_after):
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                'UPDATE queued_orders SET attempts = attempts + 1, last_error = ?, claimed_until = ?, '
+                'failed_at = CASE WHEN attempts + 1 >= ? THEN ? END WHERE ref = ?',
+                (error, now + retry_after, max_attempts, now, ref)
+            )
+
+
+    # To put dead-lettered entries back in the queue (e.g. once the cause is fixed), returns how many
+    def retry_failed(self):
+        with self._lock:
+            return self._connection.execute(
+                'UPDATE queued_orders SET failed_at = NULL, attempts = 0, claimed_until = NULL '
+                'WHERE failed_at IS NOT NULL AND flushed_at IS NULL'
+            ).rowcount
+
+
+    def get(self, ref):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT customer, order_id, attempts, last_error, failed_at FROM queued_orders WHERE ref = ?', (ref,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        customer, order_id, attempts, last_error, failed_at = row
+
+        return {
+            'ref': ref, 'customer': customer, 'order_id': order_id,
+            'attempts': attempts, 'last_error': last_error, 'failed': failed_at is not None
+        }
+
+
+    def pending_count(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM queued_orders WHERE flushed_at IS NULL AND failed_at IS NULL'
+            ).fetchone()[0]
+
+
+    def failed_count(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM queued_orders WHERE failed_at IS NOT NULL').fetchone()[0]
+
+
+    # To forget entries flushed more than `retention` seconds ago
+    def prune(self, retention):
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM queued_orders WHERE flushed_at IS NOT NULL AND flushed_at < ?', (time.time() - retention,)
+            )
+
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+
+class OrderWriteBehind:
+    """
+    Accepts orders into the journal and writes them to the orders table in
+    batches from a background thread.
+
+    Each order row keeps its journal reference in orders.queue_ref (unique),
+    so replaying entries after a crash between the database commit and
+    marking them flushed finds the rows instead of inserting them again.
+    Entries left over from a previous run are flushed when the worker starts.
+
+    When a batch fails for any reason but the database being unreachable,
+    it is split in halves until the failing entries are alone; those are
+    retried with backoff and dead-lettered after `max_attempts`, so one bad
+    entry does not hold back the orders queued after it.
+
+    """
+
+    def __init__(self, journal, batch_size=500, interval=0.2, retention=86400, max_attempts=5, max_backoff=300):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            OrderJournal(config['ORDER_QUEUE_PATH']),
+            batch_size=config['ORDER_QUEUE_BATCH_SIZE'],
+            interval=config['ORDER_QUEUE_FLUSH_SECONDS'],
+            retention=config['ORDER_QUEUE_RETENTION_SECONDS'],
+            max_attempts=config['ORDER_QUEUE_MAX_ATTEMPTS']
+        )
+
+
+    # To accept a validated order, returns its provisional reference
+    def enqueue(self, payload, customer):
+        # the flusher picks it up on its next tick, so orders arriving together share a transaction
+        return self.journal.append(payload, customer)
+
+
+    # To write one batch of queued orders, returns how many entries it took
+    def flush(self):
+        entries = self.journal.claim(self.batch_size)
+
+        if not entries:
+            return 0
+
+        handled = set()
+
+        try:
+            self.write(entries, handled)
+        except Exception:
+            self.journal.release([entry['ref'] for entry in entries if entry['ref'] not in handled])
+            raise
+
+        return len(entries)
+
+
+    # To write entries in a single transaction, splitting them when that fails to find the bad ones;
+    # adds the refs it stored or recorded a failure for to `handled`
+    def write(self, entries, handled):
+        try:
+            mappings, order_ids = self.insert(entries)
+        except (OperationalError, InterfaceError):
+            # the database is unreachable, every entry would fail the same way
+            db.session.rollback()
+            raise
+        except Exception as error:
+            db.session.rollback()
+
+            if len(entries) > 1:
+                half = len(entries) // 2
+                self.write(entries[:half], handled)
+                self.write(entries[half:], handled)
+                return
+
+            entry = entries[0]
+            retry_after = min(self.interval * 2 ** entry['attempts'], self.max_backoff)
+            self.journal.record_failure(entry['ref'], f'{type(error).__name__}: {error}', self.max_attempts, retry_after)
+            handled.add(entry['ref'])
+
+            current_app.logger.warning('Queued order %s failed (attempt %s): %s', entry['ref'], entry['attempts'] + 1, error)
+            return
+
+        order_ids.update({mapping['queue_ref']: mapping['id'] for mapping in mappings})
+        self.journal.mark_flushed(order_ids)
+        handled.update(order_ids)
+
+        cache = get_response_cache()
+        events = get_event_bus()
+
+        for mapping in mappings:
+            cache.invalidate_order(mapping['id'], mapping['customer'])
+            events.publish_order(mapping['id'], mapping['customer'], OrderStatus.PENDING)
+
+
+    # To insert the entries not written yet and commit, returns (new mappings, {ref: order id} of earlier ones)
+    def insert(self, entries):
+        router = get_shard_router()
+        order_ids = {}
+        mappings = []
+
+        # Sharded: each customer's entries go to their shard, with IDs from the shard directory
+        for shard, group in self.shard_groups(router, entries):
+            with on_shard(shard):
+                # rows of entries already written before a crash
+                refs = [entry['ref'] for entry in group]
+                order_ids.update(db.session.query(Order.queue_ref, Order.id).filter(Order.queue_ref.in_(refs)))
+
+                shard_mappings = [
+                    {
+                        'size': Sizes[entry['payload']['size']],
+                        'order_status': OrderStatus.PENDING,
+                        'quantity': entry['payload']['quantity'],
+                        'flavour': entry['payload']['flavour'],
+                        'date_created': datetime.utcfromtimestamp(entry['accepted_at']),
+                        'customer': entry['customer'],
+                        'queue_ref': entry['ref']
+                    }
+                    for entry in group if entry['ref'] not in order_ids
+                ]
+
+                if shard_mappings:
+                    if router is not None:
+                        new_ids = router.allocate(shard, [mapping['customer'] for mapping in shard_mappings])
+
+                        for mapping, order_id in zip(shard_mappings, new_ids):
+                            mapping['id'] = order_id
+
+                    insert_many(Order, shard_mappings)
+
+                mappings += shard_mappings
+
+        if mappings:
+            OrderSummary.record_created(mappings)
+
+        db.session.commit()
+
+        return mappings, order_ids
+
+
+    # To group entries by the shard of their customer (assigning first-time customers), one group when not sharded
+    def shard_groups(self, router, entries):
+        if router is None:
+            return [(None, entries)]
+
+        shards = {}
+        groups = defaultdict(list)
+
+        for entry in entries:
+            if entry['customer'] not in shards:
+                shards[entry['customer']] = router.customer_shard(entry['customer'], assign=True)
+
+            groups[shards[entry['customer']]].append(entry)
+
+        return groups.items()
+
+
+    # To flush until no entry is left to take
+    def drain(self):
+        total = 0
+
+        while True:
+            flushed = self.flush()
+
+            if not flushed:
+                return total
+
+            total += flushed
+
+
+    # To start the background flusher of this process (also replays what a crash left behind)
+    def start(self, app):
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, args=(app,), name='order-write-behind', daemon=True)
+        self._thread.start()
+
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+    def _run(self, app):
+        last_prune = 0
+
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    while self.flush() == self.batch_size:
+                        pass
+
+                    if time.time() - last_prune > 3600:
+                        self.journal.prune(self.retention)
+                        last_prune = time.time()
+                except Exception:
+                    app.logger.exception('Flushing queued orders failed, retrying')
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+
+# Function to get the order write-behind queue of the running app
+def get_order_queue():
+    return current_app.extensions['order_queue']
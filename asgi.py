@@ -0,0 +1,6 @@
+from api import create_asgi_app
+from api.config.config import config_dict
+
+
+# Serve with an ASGI server, e.g. uvicorn asgi:app --workers 4
+app = create_asgi_app(config=config_dict['prod'])
@@ -0,0 +1,69 @@
+"""
+pytest-benchmark suite for the auth and orders namespaces on a seeded database.
+
+    JWT_SECRET_KEY=secret python -m pytest benchmarks/bench_api.py --benchmark-json=bench.json
+    python -m pytest benchmarks/bench_api.py --benchmark-compare   # against the last saved run
+
+"""
+import itertools
+import random
+import pytest
+from .conftest import BENCH_ORDERS, BENCH_USERS
+from .seed import PASSWORD, user_email
+
+pytest.importorskip('pytest_benchmark')
+
+
+
+def test_login(benchmark, client):
+    users = itertools.cycle(random.Random(1).sample(range(BENCH_USERS), min(50, BENCH_USERS)))
+
+    def login():
+        return client.post('/auth/login', json={'email': user_email(next(users)), 'password': PASSWORD})
+
+    response = benchmark(login)
+
+    assert response.status_code == 201
+
+
+
+def test_create_order(benchmark, client, auth_headers):
+    order = {'size': 'SMALL', 'quantity': 1, 'flavour': 'Margherita'}
+
+    response = benchmark(client.post, '/orders/orders', json=order, headers=auth_headers)
+
+    assert response.status_code == 201
+
+
+
+def test_list_orders(benchmark, client, auth_headers):
+    cursors = itertools.cycle(random.Random(2).sample(range(BENCH_ORDERS), min(1000, BENCH_ORDERS)))
+
+    def list_page():
+        return client.get(f'/orders/orders?limit=100&after={next(cursors)}', headers=auth_headers)
+
+    response = benchmark(list_page)
+
+    assert response.status_code == 200
+
+
+
+def test_get_order(benchmark, client, auth_headers):
+    ids = itertools.cycle(random.Random(3).sample(range(1, BENCH_ORDERS + 1), min(1000, BENCH_ORDERS)))
+
+    response = benchmark(lambda: client.get(f'/orders/order/{next(ids)}', headers=auth_headers))
+
+    assert response.status_code == 200
+
+
+
+def test_patch_order_status(benchmark, client, auth_headers):
+    ids = itertools.cycle(random.Random(4).sample(range(1, BENCH_ORDERS + 1), min(1000, BENCH_ORDERS)))
+
+    def patch():
+        return client.patch(f'/orders/order/status/{next(ids)}', json={'order_status': 'IN_TRANSIT'}, headers=auth_headers)
+
+    response = benchmark(patch)
+
+    # seeded orders have random statuses, those not PENDING are refused by the state machine
+    assert response.status_code in (200, 409)
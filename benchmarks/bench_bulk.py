@@ -0,0 +1,63 @@
+"""
+Compare N single order requests against one bulk request.
+
+    JWT_SECRET_KEY=secret python -m benchmarks.bench_bulk --orders 500
+
+"""
+import argparse
+import json
+import time
+from flask_jwt_extended import create_access_token
+from api.utils import db
+from .common import bench_app, remove_database
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+
+def run(orders):
+    # A file database so every commit really hits the disk
+    app, path = bench_app()
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+            client = app.test_client()
+            headers = {"Authorization": f"Bearer {create_access_token(identity='BenchUser')}"}
+            order = {"size": "SMALL", "quantity": 1, "flavour": "Apple"}
+
+            results = {'orders': orders}
+
+            results['single_create_s'] = timed(lambda: [
+                client.post('/orders/orders', json=order, headers=headers) for _ in range(orders)
+            ])
+            results['bulk_create_s'] = timed(lambda: client.post('/orders/bulk', json=[order] * orders, headers=headers))
+
+            results['single_status_s'] = timed(lambda: [
+                client.patch(f'/orders/order/status/{order_id}', json={"order_status": "IN_TRANSIT"}, headers=headers)
+                for order_id in range(1, orders + 1)
+            ])
+            results['bulk_status_s'] = timed(lambda: client.patch('/orders/status/bulk', json=[
+                {"id": order_id, "order_status": "IN_TRANSIT"} for order_id in range(orders + 1, 2 * orders + 1)
+            ], headers=headers))
+
+            db.session.remove()
+            db.drop_all()
+    finally:
+        remove_database(path)
+
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=500, help='Orders per run (max 1000 for the bulk call)')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.orders), indent=2))
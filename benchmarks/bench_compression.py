@@ -0,0 +1,109 @@
+"""
+Measure bytes on the wire and compression CPU per encoder and level for order pages and swagger.json.
+
+    JWT_SECRET_KEY=secret python -m benchmarks.bench_compression --orders 1000 --page 100
+
+"""
+import argparse
+import json
+import time
+from flask_jwt_extended import create_access_token
+from api.models.orders import Order, OrderStatus, Sizes
+from api.models.users import User
+from api.utils import db
+from api.utils.compression import BrotliEncoder, GzipEncoder
+from .common import bench_app, remove_database
+
+
+def best_of(fn, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+
+# Function to list the encoders to compare, brotli only when installed
+def encoders(gzip_levels, brotli_qualities):
+    found = [GzipEncoder(level) for level in gzip_levels]
+
+    try:
+        found += [BrotliEncoder(quality) for quality in brotli_qualities]
+    except ImportError:
+        pass
+
+    return found
+
+
+
+def measure(body, repeat, gzip_levels, brotli_qualities):
+    results = [{'encoding': 'identity', 'bytes': len(body)}]
+
+    for encoder in encoders(gzip_levels, brotli_qualities):
+        compressed = encoder.compress(body)
+        seconds = best_of(lambda: encoder.compress(body), repeat)
+
+        results.append({
+            'encoding': f"{encoder.name}-{getattr(encoder, 'level', getattr(encoder, 'quality', ''))}",
+            'bytes': len(compressed),
+            'ratio': round(len(body) / len(compressed), 1),
+            'compress_ms': round(seconds * 1000, 3),
+            'mb_per_s': round(len(body) / seconds / 1e6, 1)
+        })
+
+    return results
+
+
+
+def run(orders, page, repeat, gzip_levels, brotli_qualities):
+    app, path = bench_app(COMPRESSION_ENABLED=False)
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+            user = User(username='bench', email='bench@example.com', password_hash='hash')
+            user.save()
+
+            db.session.bulk_insert_mappings(Order, [
+                {
+                    'size': list(Sizes)[n % 4], 'order_status': list(OrderStatus)[n % 3],
+                    'flavour': 'Apple', 'quantity': n % 5 + 1, 'customer': user.id
+                }
+                for n in range(orders)
+            ])
+            db.session.commit()
+
+            token = create_access_token(identity='bench', additional_claims={'user_id': user.id, 'is_staff': True})
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        bodies = {
+            f'orders_page_{page}': client.get(f'/orders/orders?limit={page}', headers=headers).data,
+            f'user_orders_page_{page}': client.get(f'/orders/user/1/orders?limit={page}', headers=headers).data,
+            'swagger_json': client.get('/swagger.json').data
+        }
+
+        return {
+            name: measure(body, repeat, gzip_levels, brotli_qualities) for name, body in bodies.items()
+        }
+    finally:
+        remove_database(path)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000, help='Orders in the database')
+    parser.add_argument('--page', type=int, default=100, help='Orders per list page (limit=)')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per encoder, the best is reported')
+    parser.add_argument('--gzip-levels', type=int, nargs='+', default=[1, 6, 9])
+    parser.add_argument('--brotli-qualities', type=int, nargs='+', default=[1, 4, 11])
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.orders, args.page, args.repeat, args.gzip_levels, args.brotli_qualities), indent=2))
@@ -0,0 +1,222 @@
+"""
+Compare how serving modes hold up under many concurrent connections: gunicorn sync and gthread
+workers, plus gevent workers and the ASGI entry point (uvicorn asgi:app) when those are installed.
+
+    JWT_SECRET_KEY=secret python -m benchmarks.bench_concurrency --connections 500 --seconds 10
+
+Each mode is started as a real server on a seeded SQLite file; the client keeps `connections`
+keep-alive connections busy from one asyncio loop and reports throughput and p50/p99 latency.
+
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from flask_jwt_extended import create_access_token
+from api.utils import db
+from .common import bench_app, percentile, remove_database
+from .seed import seed
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+# Function to get the command and extra environment that start a serving mode, None if it is not installed
+def server_command(mode, port, workers, threads):
+    gunicorn = [sys.executable, '-m', 'gunicorn', 'runserver:app']
+    env = {'WEB_BIND': f'127.0.0.1:{port}', 'WEB_WORKERS': str(workers), 'WEB_THREADS': str(threads)}
+
+    if mode in ('sync', 'gthread'):
+        return gunicorn, dict(env, WEB_WORKER_CLASS=mode)
+
+    if mode == 'gevent' and importlib.util.find_spec('gevent'):
+        return gunicorn, dict(env, WEB_WORKER_CLASS='gevent')
+
+    if mode == 'asgi' and importlib.util.find_spec('uvicorn'):
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--no-access-log']
+        return command, {'ASGI_THREADS': str(threads)}
+
+    return None
+
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+
+    return False
+
+
+
+# Function to send one request on an open connection, returns (status, keep_alive)
+async def exchange(reader, writer, path, auth):
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: bench\r\nAuthorization: {auth}\r\nConnection: keep-alive\r\n\r\n'.encode()
+    )
+    await writer.drain()
+
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:] if line)}
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+
+            if size == 0:
+                break
+
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+
+# Function to keep one connection busy until `deadline`, reconnecting when the server closes it
+async def client(port, paths, auth, deadline, latencies, counts):
+    connection = None
+
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+
+            status, keep_alive = await asyncio.wait_for(exchange(*connection, random.choice(paths), auth), 30)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            counts['errors'] += 1
+
+            if connection is not None:
+                connection[1].close()
+                connection = None
+
+            await asyncio.sleep(0.05)
+            continue
+
+        latencies.append(time.perf_counter() - started)
+        counts['errors' if status >= 400 else 'ok'] += 1
+
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+
+    if connection is not None:
+        connection[1].close()
+
+
+
+async def drive(port, paths, auth, connections, seconds):
+    latencies = []
+    counts = {'ok': 0, 'errors': 0}
+    deadline = time.monotonic() + seconds
+    started = time.perf_counter()
+
+    await asyncio.gather(*[client(port, paths, auth, deadline, latencies, counts) for _ in range(connections)])
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': counts['ok'],
+        'errors': counts['errors'],
+        'throughput_rps': round(counts['ok'] / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None
+    }
+
+
+
+def run(args):
+    app, path = bench_app()
+
+    # 500 client sockets plus the servers' own
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.connections * 4)), hard))
+
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(args.users, args.orders)
+            token = create_access_token(identity='user1', additional_claims={'user_id': 2, 'is_staff': True})
+
+        paths = [f'/orders/order/{random.randrange(1, args.orders + 1)}' for _ in range(1000)]
+        paths += [f'/orders/user/{random.randrange(1, args.users + 1)}/orders?limit=20' for _ in range(1000)]
+
+        results = {'meta': {'connections': args.connections, 'seconds': args.seconds, 'workers': args.workers,
+                            'threads': args.threads, 'orders': args.orders}}
+
+        for mode in args.modes:
+            port = free_port()
+            found = server_command(mode, port, args.workers, args.threads)
+
+            if found is None:
+                print(f'{mode:>8}: skipped, not installed')
+                continue
+
+            command, extra = found
+
+            env = dict(os.environ, **extra, DATABASE_URL='sqlite:///' + path, DEBUG='False',
+                       RATELIMIT_ENABLED='False', MIGRATIONS_ENABLED='False', SWAGGER_DOCS_ENABLED='False')
+
+            server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+            try:
+                if not wait_for_port(port):
+                    print(f'{mode:>8}: server did not start')
+                    continue
+
+                results[mode] = asyncio.run(drive(port, paths, f'Bearer {token}', args.connections, args.seconds))
+            finally:
+                server.terminate()
+                server.wait(10)
+
+            print(f"{mode:>8}: {results[mode]['throughput_rps']:8.1f} req/s  p50 {results[mode]['p50_ms']} ms  "
+                  f"p99 {results[mode]['p99_ms']} ms  errors {results[mode]['errors']}")
+    finally:
+        remove_database(path)
+
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gthread', 'gevent', 'asgi'])
+    parser.add_argument('--connections', type=int, default=500, help='Concurrent client connections')
+    parser.add_argument('--seconds', type=float, default=10, help='Load duration per mode')
+    parser.add_argument('--workers', type=int, default=4, help='Server processes per mode')
+    parser.add_argument('--threads', type=int, default=15, help='Threads per process (gthread, asgi)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,66 @@
+"""
+Compare marshal + json against the compiled order serializer + orjson.
+
+    JWT_SECRET_KEY=secret python -m benchmarks.bench_serialization --orders 10000
+
+"""
+import argparse
+import json
+import time
+from flask_restx import marshal
+from api.models.orders import Order, OrderStatus, Sizes
+from api.orders.views import order_model
+from api.utils.serializers import order_serializer, json_response
+from .common import bench_app, remove_database
+
+
+def best_of(fn, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+
+def run(orders, repeat):
+    app, path = bench_app()
+
+    try:
+        with app.test_request_context():
+            rows = [
+                Order(
+                    id=n, size=list(Sizes)[n % 4], order_status=list(OrderStatus)[n % 3],
+                    flavour='Apple', quantity=n % 5 + 1
+                )
+                for n in range(1, orders + 1)
+            ]
+
+            marshalled = json.dumps(marshal(rows, order_model)).encode()
+            compiled = json_response(order_serializer.many(rows)).get_data()
+
+            assert json.loads(marshalled) == json.loads(compiled)
+
+            results = {'orders': orders}
+            results['marshal_json_s'] = best_of(lambda: json.dumps(marshal(rows, order_model)), repeat)
+            results['serializer_orjson_s'] = best_of(
+                lambda: json_response(order_serializer.many(rows)).get_data(), repeat
+            )
+            results['speedup'] = round(results['marshal_json_s'] / results['serializer_orjson_s'], 1)
+    finally:
+        remove_database(path)
+
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=10000, help='Orders serialized per run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per variant, the best is reported')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.orders, args.repeat), indent=2))
@@ -0,0 +1,92 @@
+"""
+Compare accepted orders per second: synchronous inserts against write-behind.
+
+    JWT_SECRET_KEY=secret python -m benchmarks.bench_write_behind --orders 1000 --concurrency 8
+
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask_jwt_extended import create_access_token
+from api.utils import db
+from .common import bench_app, remove_database
+
+
+# Function to post `orders` orders from `concurrency` threads, returns (seconds, status codes)
+def place_orders(app, orders, concurrency):
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity='BenchUser')}"}
+
+    order = {"size": "SMALL", "quantity": 1, "flavour": "Apple"}
+
+    def post(n):
+        return app.test_client().post('/orders/orders', json=order, headers=headers).status_code
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(post, range(orders)))
+
+    return time.perf_counter() - started, statuses
+
+
+
+def run(orders, concurrency):
+    results = {'orders': orders, 'concurrency': concurrency}
+
+    app, path = bench_app()
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+        seconds, statuses = place_orders(app, orders, concurrency)
+
+        results['sync_orders_per_s'] = orders / seconds
+        results['sync_errors'] = sum(status != 201 for status in statuses)
+    finally:
+        remove_database(path)
+
+    fd, queue_path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+
+    # the flusher is left off while accepting, then timed on its own
+    app, path = bench_app(ORDER_WRITE_BEHIND=True, ORDER_QUEUE_WORKER=False, ORDER_QUEUE_PATH=queue_path)
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+        seconds, statuses = place_orders(app, orders, concurrency)
+
+        results['write_behind_orders_per_s'] = orders / seconds
+        results['write_behind_errors'] = sum(status != 202 for status in statuses)
+
+        with app.app_context():
+            queue = app.extensions['order_queue']
+
+            started = time.perf_counter()
+            queue.drain()
+            results['flush_orders_per_s'] = orders / (time.perf_counter() - started)
+
+            queue.journal.close()
+    finally:
+        remove_database(path)
+        remove_database(queue_path)
+
+    results['accept_speedup'] = round(results['write_behind_orders_per_s'] / results['sync_orders_per_s'], 1)
+
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000, help='Orders placed per mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.orders, args.concurrency), indent=2))
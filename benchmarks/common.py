@@ -0,0 +1,41 @@
+import os
+import tempfile
+from api import create_app
+from api.config.config import TestConfig
+
+
+# Function to create an app on a fresh file database (no SQL echo) and return it with the file path
+def bench_app(path=None, **settings):
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_ECHO = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'busy_timeout': 15000, 'synchronous': 'NORMAL'}
+
+    for name, value in settings.items():
+        setattr(BenchConfig, name, value)
+
+    return create_app(config=BenchConfig), path
+
+
+
+# Function to delete a benchmark database and its WAL files
+def remove_database(path):
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+
+# Function to get the p-th percentile (0-100) of a list of numbers
+def percentile(values, p):
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+
+    return ordered[index]
@@ -0,0 +1,41 @@
+import os
+import pytest
+from flask_jwt_extended import create_access_token
+from api.utils import db
+from .common import bench_app, remove_database
+from .seed import seed
+
+
+# Volumes can be lowered for a quick local run, e.g. BENCH_ORDERS=100000
+BENCH_USERS = int(os.environ.get('BENCH_USERS', 10000))
+BENCH_ORDERS = int(os.environ.get('BENCH_ORDERS', 1000000))
+
+
+
+@pytest.fixture(scope='session')
+def seeded_app():
+    app, path = bench_app()
+
+    with app.app_context():
+        db.create_all()
+        seed(BENCH_USERS, BENCH_ORDERS)
+
+    yield app
+
+    remove_database(path)
+
+
+
+@pytest.fixture
+def client(seeded_app):
+    with seeded_app.app_context():
+        yield seeded_app.test_client()
+
+
+
+@pytest.fixture
+def auth_headers(seeded_app):
+    with seeded_app.app_context():
+        token = create_access_token(identity='user1', additional_claims={'user_id': 2, 'is_staff': False})
+
+    return {"Authorization": f"Bearer {token}"}
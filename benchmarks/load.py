@@ -0,0 +1,243 @@
+"""
+Drive concurrent load at the API and report throughput and p50/p99 latency per scenario.
+
+In-process against the Flask test client (seeds its own database):
+
+    JWT_SECRET_KEY=secret python -m benchmarks.load --users 10000 --orders 1000000 --output run.json
+
+Against a running server (seed its database first with benchmarks.seed):
+
+    python -m benchmarks.load --url http://127.0.0.1:8000 --users 10000 --orders 1000000 --output run.json
+
+Compare two runs:
+
+    python -m benchmarks.load --compare before.json after.json
+
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+from .common import bench_app, percentile, remove_database
+from .seed import PASSWORD, seed, user_email
+
+
+SCENARIOS = ['login', 'create', 'list', 'get', 'patch']
+
+
+
+# Sends requests through a Flask test client, one client per thread
+class TestClientTarget:
+
+    def __init__(self, app):
+        self.app = app
+        self._local = local()
+
+
+    def request(self, method, path, body=None, headers=None):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+
+        response = self._local.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.json if response.is_json else None
+
+
+
+# Sends real HTTP requests to a running server
+class HTTPTarget:
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+
+        try:
+            with urllib.request.urlopen(request) as response:
+                payload = response.read()
+                return response.status, json.loads(payload) if payload else None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+
+# Function to log in a few seeded users and return their auth headers
+def login_headers(target, users, count):
+    headers = []
+
+    for n in random.sample(range(users), min(count, users)):
+        status, body = target.request('POST', '/auth/login', {'email': user_email(n), 'password': PASSWORD})
+
+        if status == 201:
+            headers.append({'Authorization': f"Bearer {body['access_token']}"})
+
+    if not headers:
+        sys.exit('Could not log in any seeded user, is the database seeded?')
+
+    return headers
+
+
+
+# Function to build the request sender of a scenario
+def scenario_request(name, target, users, orders, headers):
+
+    def send(n):
+        auth = random.choice(headers)
+
+        if name == 'login':
+            user = random.randrange(users)
+            return target.request('POST', '/auth/login', {'email': user_email(user), 'password': PASSWORD})
+
+        if name == 'create':
+            return target.request('POST', '/orders/orders', {'size': 'SMALL', 'quantity': 1, 'flavour': 'Margherita'}, auth)
+
+        if name == 'list':
+            return target.request('GET', f'/orders/orders?limit=100&after={random.randrange(orders)}', headers=auth)
+
+        if name == 'get':
+            return target.request('GET', f'/orders/order/{random.randrange(1, orders + 1)}', headers=auth)
+
+        if name == 'patch':
+            return target.request(
+                'PATCH', f'/orders/order/status/{random.randrange(1, orders + 1)}', {'order_status': 'IN_TRANSIT'}, auth
+            )
+
+    return send
+
+
+
+# Function to run `requests` requests of one scenario with `concurrency` threads
+def run_scenario(send, requests, concurrency):
+    latencies = []
+    errors = 0
+    conflicts = 0
+
+    def timed(n):
+        started = time.perf_counter()
+        status, _ = send(n)
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, status in pool.map(timed, range(requests)):
+            latencies.append(seconds)
+
+            # 409: status change refused by the order state machine, an expected outcome
+            if status == 409:
+                conflicts += 1
+            elif status >= 400:
+                errors += 1
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'conflicts': conflicts,
+        'seconds': elapsed,
+        'throughput_rps': requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+
+def run(args):
+    random.seed(args.seed)
+    path = None
+
+    if args.url:
+        target = HTTPTarget(args.url)
+    else:
+        app, path = bench_app()
+
+        with app.app_context():
+            from api.utils import db
+            db.create_all()
+            seed(args.users, args.orders)
+
+        target = TestClientTarget(app)
+
+    try:
+        headers = login_headers(target, args.users, 20)
+
+        results = {
+            'meta': {
+                'target': args.url or 'test-client', 'users': args.users, 'orders': args.orders,
+                'concurrency': args.concurrency, 'started': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+        }
+
+        for name in args.scenarios:
+            requests = args.login_requests if name == 'login' else args.requests
+            send = scenario_request(name, target, args.users, args.orders, headers)
+            results[name] = run_scenario(send, requests, args.concurrency)
+
+            print(f"{name:>8}: {results[name]['throughput_rps']:8.1f} req/s  "
+                  f"p50 {results[name]['p50_ms']:7.2f} ms  p99 {results[name]['p99_ms']:7.2f} ms  "
+                  f"errors {results[name]['errors']}")
+    finally:
+        if path:
+            remove_database(path)
+
+    return results
+
+
+
+# Function to print how each scenario moved between two saved runs
+def compare(before_path, after_path, tolerance):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+
+    regressed = False
+
+    for name in SCENARIOS:
+        if name not in before or name not in after:
+            continue
+
+        ratio = after[name]['p99_ms'] / before[name]['p99_ms']
+        throughput = after[name]['throughput_rps'] / before[name]['throughput_rps']
+        flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+        regressed = regressed or bool(flag)
+
+        print(f'{name:>8}: p99 x{ratio:.2f}  throughput x{throughput:.2f}  {flag}')
+
+    return 1 if regressed else 0
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='Base URL of a running server, default is the in-process test client')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario')
+    parser.add_argument('--login-requests', type=int, default=200, help='Login requests (each one hashes a password)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two saved runs and exit')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed p99 increase when comparing')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.tolerance))
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,85 @@
+"""
+Fill a database with benchmark users and orders.
+
+    JWT_SECRET_KEY=secret DATABASE_URL=sqlite:////tmp/bench.sqlite3 python -m benchmarks.seed --users 10000 --orders 1000000
+
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from api.utils import db
+from api.models.users import User
+from api.models.orders import Order, OrderStatus, Sizes
+
+
+# Every seeded user logs in with this password
+PASSWORD = 'password'
+
+FLAVOURS = ['Margherita', 'Pepperoni', 'Hawaiian', 'Veggie', 'BBQ Chicken', 'Four Cheese', 'Meat Feast', 'Mushroom']
+
+CHUNK_SIZE = 10000
+
+
+
+# Function to get the email of the n-th seeded user
+def user_email(n):
+    return f'user{n}@bench.example'
+
+
+
+# Function to insert `users` users and `orders` orders spread over the last 90 days (needs an app context)
+def seed(users=10000, orders=1000000, seed_value=42):
+    rng = random.Random(seed_value)
+
+    # one hash for everyone, hashing 10k passwords would dominate seeding time
+    password_hash = generate_password_hash(PASSWORD)
+
+    for start in range(0, users, CHUNK_SIZE):
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': f'user{n}', 'email': user_email(n), 'password_hash': password_hash,
+                'is_staff': n == 0, 'is_active': True
+            }
+            for n in range(start, min(start + CHUNK_SIZE, users))
+        ])
+        db.session.commit()
+
+    # date_created grows with the id, as it does in production
+    first_day = datetime.utcnow() - timedelta(days=90)
+    step = timedelta(days=90) / max(orders, 1)
+    sizes = list(Sizes)
+    statuses = list(OrderStatus)
+
+    for start in range(0, orders, CHUNK_SIZE):
+        db.session.execute(Order.__table__.insert(), [
+            {
+                'size': rng.choice(sizes), 'order_status': rng.choice(statuses),
+                'flavour': rng.choice(FLAVOURS), 'quantity': rng.randint(1, 5),
+                'date_created': first_day + step * n, 'customer': rng.randint(1, users)
+            }
+            for n in range(start, min(start + CHUNK_SIZE, orders))
+        ])
+        db.session.commit()
+
+
+
+if __name__ == '__main__':
+    from api import create_app
+    from api.config.config import config_dict
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    args = parser.parse_args()
+
+    app = create_app(config=config_dict['prod'])
+
+    with app.app_context():
+        db.create_all()
+
+        started = time.perf_counter()
+        seed(args.users, args.orders)
+
+        print(f'Seeded {args.users} users and {args.orders} orders in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings from the environment, gunicorn reads this file from the working directory.
+
+    gunicorn runserver:app                           # gthread workers
+    WEB_WORKER_CLASS=sync gunicorn runserver:app     # one request per worker process
+    WEB_WORKER_CLASS=gevent gunicorn runserver:app   # needs gevent (and psycogreen for PostgreSQL)
+
+"""
+import multiprocessing
+# not `from decouple import config`: gunicorn reads every name here as a setting, and config is one
+import decouple
+
+
+bind = decouple.config('WEB_BIND', '0.0.0.0:' + decouple.config('PORT', '8000'))
+worker_class = decouple.config('WEB_WORKER_CLASS', 'gthread')
+workers = decouple.config('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1, cast=int)
+
+# gthread: requests in flight per worker while others wait on the database or a password hash;
+# each holds a database connection, so by default as many as the pool hands out
+threads = decouple.config('WEB_THREADS', decouple.config('DB_POOL_SIZE', 5, cast=int) + decouple.config('DB_MAX_OVERFLOW', 10, cast=int), cast=int)
+
+worker_connections = decouple.config('WEB_WORKER_CONNECTIONS', 1000, cast=int) # gevent
+keepalive = decouple.config('WEB_KEEPALIVE', 5, cast=int)
+timeout = decouple.config('WEB_TIMEOUT', 30, cast=int)
+accesslog = decouple.config('WEB_ACCESS_LOG', None)
+
+
+
+# To make psycopg2 cooperative under gevent, other drivers block the whole worker
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed, PostgreSQL queries block gevent workers')
+        return
+
+    patch_psycopg()
+
+
+
+# Without Redis each worker learns about logouts on other workers only at its next blocklist sync
+def when_ready(server):
+    if workers > 1 and not decouple.config('REDIS_URL', None):
+        server.log.warning(
+            'Running %s workers without REDIS_URL: a revoked token stays valid on other workers '
+            'for up to REVOCATION_CACHE_SYNC_SECONDS', workers
+        )